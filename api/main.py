@@ -1,17 +1,41 @@
+import json
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
 from api.schemas import (
     IngestRequest, IngestResponse,
-    QueryRequest, QueryResponse,
-    EvaluateRequest, EvaluateResponse
+    QueryFilters, QueryRequest, QueryResponse,
+    BatchQueryRequest, BatchQueryResponse,
+    EvaluateRequest, EvaluationJobResponse
 )
-from src.pipeline import run_ingestion_pipeline, run_query_pipeline
-from src.evaluation.evaluator import evaluate_pipeline
-from src.logger import get_logger
+from src.pipeline import run_ingestion_pipeline, arun_query_pipeline, arun_query_pipeline_batch, astream_query_pipeline
+from src.evaluation.evaluator import start_evaluation_job, get_evaluation_job
+from src.clients import init_clients, aclose_clients, get_pool_stats
+from src.cache.semantic_cache import get_cache_stats
+from src.retrieval.reranker import get_reranker_stats
+from src.metrics import start_trace, finish_trace, current_trace_id, get_trace, observe, render_metrics
+from src.config_loader import get_config
+from src.logger import get_logger, get_logging_stats
 
 logger = get_logger(__name__)
+config = get_config()
 
-app = FastAPI(title="RAG Pipeline API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # clients are built on first use unless a warm-up is configured, so startup doesn't import the SDKs
+    if config['clients']['warm_up']:
+        logger.info("Initialising shared clients")
+        init_clients()
+    yield
+    logger.info("Shutting down shared clients")
+    await aclose_clients()
+
+
+app = FastAPI(title="RAG Pipeline API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,35 +45,148 @@ app.add_middleware(
 )
 
 
+class _TraceRequests:
+    """Trace each request and record its latency once the whole response, streamed bodies included, is sent.
+
+    A plain ASGI middleware rather than @app.middleware("http"): that one returns as soon as the headers are
+    ready, before a streamed body, and the spans it produces, have been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # scrapes are not traced, so they neither fill the trace history nor skew request latency
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        trace_id = start_trace(f"{scope['method']} {scope['path']}")
+        # a route that raises never starts its response, and the server answers 500
+        status = 500
+
+        async def send_traced(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Trace-Id", trace_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            # the route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe("rag_request_duration_seconds", time.perf_counter() - start, route=route, status=str(status))
+            finish_trace()
+
+
+app.add_middleware(_TraceRequests)
+
+
 @app.get("/health")
 def health_check():
-    logger.info("Health check endpoint called")
+    logger.debug("Health check endpoint called")
     return {"status": "healthy"}
 
 
+@app.get("/stats/clients")
+def client_stats():
+    return get_pool_stats()
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    return get_cache_stats()
+
+
+@app.get("/stats/reranker")
+def reranker_stats():
+    return get_reranker_stats()
+
+
+@app.get("/stats/logging")
+def logging_stats():
+    return get_logging_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/traces/{trace_id}")
+def trace(trace_id: str):
+    recorded = get_trace(trace_id)
+    if recorded is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return recorded
+
+
 @app.post("/ingest", response_model=IngestResponse)
 def ingest(request: IngestRequest):
     logger.info(f"Ingest request received for directory: {request.directory}")
     result = run_ingestion_pipeline(request.directory)
     if result['status'] == 'failed':
         raise HTTPException(status_code=500, detail="Ingestion pipeline failed")
-    return IngestResponse(**result)
+    return IngestResponse(**result, trace_id=current_trace_id())
+
+
+def _filters(filters: QueryFilters | None) -> dict | None:
+    # the pipeline takes plain dicts with dates as unix seconds, as stored in the `ingested_at` payload field
+    if filters is None:
+        return None
+    values = filters.model_dump(exclude_none=True)
+    for key in ("ingested_after", "ingested_before"):
+        if key in values:
+            values[key] = values[key].timestamp()
+    return values
 
 
 @app.post("/query", response_model=QueryResponse)
-def query(request: QueryRequest):
+async def query(request: QueryRequest):
     logger.info(f"Query request received: {request.query[:50]}...")
-    result = run_query_pipeline(request.query)
+    result = await arun_query_pipeline(request.query, filters=_filters(request.filters))
     if not result.get('answer'):
         raise HTTPException(status_code=500, detail="Query pipeline failed")
-    return QueryResponse(**result)
+    return QueryResponse(**result, trace_id=current_trace_id())
 
 
-@app.post("/evaluate", response_model=EvaluateResponse)
-def evaluate(request: EvaluateRequest):
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    logger.info(f"Streaming query request received: {request.query[:50]}...")
+
+    async def event_stream():
+        async for event in astream_query_pipeline(request.query, _filters(request.filters)):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(request: BatchQueryRequest):
+    logger.info(f"Batch query request received for {len(request.queries)} queries")
+    if len(request.queries) > config['query_batch']['max_queries']:
+        raise HTTPException(status_code=413, detail=f"At most {config['query_batch']['max_queries']} queries per batch")
+    results = await arun_query_pipeline_batch(request.queries, _filters(request.filters))
+    return BatchQueryResponse(
+        results=[{"query": query, **result} for query, result in zip(request.queries, results)], trace_id=current_trace_id()
+    )
+
+
+@app.post("/evaluate", response_model=EvaluationJobResponse, status_code=202)
+async def evaluate(request: EvaluateRequest):
     logger.info(f"Evaluate request received for {len(request.eval_dataset)} samples")
+    if not request.eval_dataset:
+        raise HTTPException(status_code=400, detail="No evaluation samples provided")
     eval_dataset = [item.model_dump() for item in request.eval_dataset]
-    result = evaluate_pipeline(eval_dataset)
-    if result['status'] == 'failed':
-        raise HTTPException(status_code=500, detail="Evaluation pipeline failed")
-    return EvaluateResponse(**result)
+    return EvaluationJobResponse(**start_evaluation_job(eval_dataset))
+
+
+@app.get("/evaluate/{job_id}", response_model=EvaluationJobResponse)
+def evaluation_job(job_id: str):
+    job = get_evaluation_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Evaluation job not found")
+    return EvaluationJobResponse(**job)
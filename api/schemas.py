@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Any
 
@@ -5,8 +6,19 @@ from typing import Any
 class IngestRequest(BaseModel):
     directory: str
 
+class QueryFilters(BaseModel):
+    sources: list[str] | None = None
+    file_types: list[str] | None = None
+    ingested_after: datetime | None = None
+    ingested_before: datetime | None = None
+
 class QueryRequest(BaseModel):
     query: str
+    filters: QueryFilters | None = None
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    filters: QueryFilters | None = None
 
 class EvalSample(BaseModel):
     question: str
@@ -21,12 +33,37 @@ class IngestResponse(BaseModel):
     documents_loaded: int
     chunks_created: int
     collection: str
+    batches: int = 0
+    files_added: int = 0
+    files_updated: int = 0
+    files_deleted: int = 0
+    files_skipped: int = 0
+    files_failed: int = 0
+    embedding_cache: dict[str, float] = {}
+    embedding_throughput: dict[str, float] = {}
+    trace_id: str | None = None
 
 class QueryResponse(BaseModel):
     answer: str
     sources: list[str]
     model: str
+    trace_id: str | None = None
+
+class BatchQueryItem(BaseModel):
+    query: str
+    answer: str
+    sources: list[str]
+    model: str
+    error: str | None = None
+
+class BatchQueryResponse(BaseModel):
+    results: list[BatchQueryItem]
+    trace_id: str | None = None
 
-class EvaluateResponse(BaseModel):
+class EvaluationJobResponse(BaseModel):
+    job_id: str
     status: str
-    results: Any
+    total: int | None = None
+    completed: int = 0
+    failed: int = 0
+    results: Any = None
@@ -0,0 +1,109 @@
+"""Peak memory of an ingestion batch as per-chunk dicts versus a columnar ChunkBatch.
+
+Both representations are built from the same chunk texts and the same embeddings, which arrive as lists of
+floats per embedding request, as the OpenAI client returns them. The per-chunk path keeps those lists on
+each chunk dict, next to its own copy of the document metadata; the ChunkBatch path copies each request's
+vectors into one float32 matrix and stores the metadata once per document. Peak memory is measured with
+tracemalloc, which also sees NumPy's allocations.
+
+Usage:
+    python -m benchmarks.chunk_memory --chunks 2000 --dim 1536
+    python -m benchmarks.chunk_memory --chunks 500 --chunks-per-document 50 --dim 3072
+"""
+import argparse
+import json
+import random
+import tracemalloc
+import numpy as np
+from src.ingestion.chunk_batch import make_chunk_batch
+
+# chunks per embedding request, so both paths hold the same transient lists
+_REQUEST_SIZE = 64
+
+
+def make_documents(chunks:int, chunks_per_document:int, chunk_chars:int, seed:int = 0) -> list[tuple[dict, list[str]]]:
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(2000)]
+    documents = []
+    for d in range(0, chunks, chunks_per_document):
+        count = min(chunks_per_document, chunks - d)
+        metadata = {"source": f"data/docs/document_{d // chunks_per_document}.pdf", "file_type": "pdf",
+                    "file_size_kb": 812.4, "num_pages": 24, "total_chunks": count}
+        texts = []
+        for _ in range(count):
+            text = ""
+            while len(text) < chunk_chars:
+                text += rng.choice(words) + " "
+            texts.append(text[:chunk_chars])
+        documents.append((metadata, texts))
+    return documents
+
+
+def _embedding_requests(count:int, dim:int, seed:int = 0):
+    # what the embedding client hands back: one list of Python floats per text, a request at a time
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, _REQUEST_SIZE):
+        yield rng.normal(size=(min(_REQUEST_SIZE, count - start), dim)).astype(np.float32).tolist()
+
+
+def build_chunk_dicts(documents:list[tuple[dict, list[str]]], dim:int) -> list[dict]:
+    chunks = [
+        {"content": text, "metadata": {**metadata, "chunk_index": i}}
+        for metadata, texts in documents
+        for i, text in enumerate(texts)
+    ]
+    position = 0
+    for vectors in _embedding_requests(len(chunks), dim):
+        for vector in vectors:
+            chunks[position]['embedding'] = vector
+            position += 1
+    return chunks
+
+
+def build_chunk_batch(documents:list[tuple[dict, list[str]]], dim:int):
+    texts, metadata, chunk_indices = [], [], []
+    for meta, document_texts in documents:
+        for i, text in enumerate(document_texts):
+            texts.append(text)
+            metadata.append(meta)
+            chunk_indices.append(i)
+    batch = make_chunk_batch(texts, metadata, chunk_indices)
+    embeddings = np.empty((len(texts), dim), dtype=np.float32)
+    position = 0
+    for vectors in _embedding_requests(len(texts), dim):
+        embeddings[position:position + len(vectors)] = vectors
+        position += len(vectors)
+    return {**batch, "embeddings": embeddings}
+
+
+def _peak_bytes(build, documents, dim:int) -> tuple[int, int]:
+    tracemalloc.start()
+    try:
+        result = build(documents, dim)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+def run_benchmark(chunks:int = 2000, dim:int = 1536, chunks_per_document:int = 20, chunk_chars:int = 810) -> dict:
+    documents = make_documents(chunks, chunks_per_document, chunk_chars)
+    report = {"settings": {"chunks": chunks, "dim": dim, "chunks_per_document": chunks_per_document,
+                           "chunk_chars": chunk_chars}}
+    for name, build in (("chunk_dicts", build_chunk_dicts), ("chunk_batch", build_chunk_batch)):
+        peak, retained = _peak_bytes(build, documents, dim)
+        report[name] = {"peak_mb": peak / 2**20, "retained_mb": retained / 2**20,
+                        "retained_bytes_per_chunk": retained / chunks}
+    report['peak_reduction'] = report['chunk_dicts']['peak_mb'] / report['chunk_batch']['peak_mb']
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--chunks-per-document", type=int, default=20)
+    parser.add_argument("--chunk-chars", type=int, default=810)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.chunks, args.dim, args.chunks_per_document, args.chunk_chars), indent=2))
@@ -0,0 +1,103 @@
+"""Chunking throughput of the offset-based chunker against LangChain's text splitters.
+
+The corpus is synthetic prose: paragraphs of sentences with line breaks, like text extracted from PDFs.
+"langchain" builds the splitter once per call and runs split_text per document, as ingestion did before;
+"offsets" is chunk_spans plus slicing the chunk texts out; "offsets_pool" is split_documents on a process pool
+of --workers processes. For the recursive and character strategies the run also checks that the offset-based
+chunks are identical to LangChain's.
+
+Usage:
+    python -m benchmarks.chunker --documents 500 --document-chars 20000
+    python -m benchmarks.chunker --strategy sentence --workers 8
+"""
+import argparse
+import json
+import random
+import time
+from unittest.mock import patch
+from src.config_loader import get_config
+from src.ingestion import chunker
+from src.ingestion.chunker import chunk_spans, split_documents
+
+config = get_config()
+
+
+def make_documents(documents:int, document_chars:int, seed:int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(2000)]
+    corpus = []
+    for d in range(documents):
+        paragraphs, size = [], 0
+        while size < document_chars:
+            sentences = []
+            for _ in range(rng.randint(2, 8)):
+                sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 30)))
+                sentences.append(sentence.capitalize() + rng.choice([".", ".", ".", "?", "!"]))
+            # line breaks inside a paragraph, as PDF text extraction leaves them
+            paragraph = "\n".join(" ".join(sentences[i:i + 3]) for i in range(0, len(sentences), 3))
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        corpus.append({"content": "\n\n".join(paragraphs)[:document_chars],
+                       "metadata": {"source": f"data/docs/document_{d}.pdf", "file_type": "pdf",
+                                    "file_size_kb": 812.4, "num_pages": 24}})
+    return corpus
+
+
+def _langchain(documents:list[dict], settings:dict) -> list[list[str]]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter, CharacterTextSplitter
+
+    splitter_class = CharacterTextSplitter if settings['strategy'] == "character" else RecursiveCharacterTextSplitter
+    splitter = splitter_class(chunk_size=settings['chunk_size'], chunk_overlap=settings['chunk_overlap'])
+    return [splitter.split_text(doc['content']) for doc in documents]
+
+
+def _offsets(documents:list[dict], settings:dict) -> list[list[str]]:
+    return [
+        [doc['content'][start:end] for start, end in chunk_spans(doc['content'], settings)]
+        for doc in documents
+    ]
+
+
+def _offsets_pool(documents:list[dict], settings:dict, workers:int) -> list[list[str]]:
+    with patch.dict(chunker.config['chunking'], settings):
+        return [texts for _, texts in split_documents(documents, workers=workers)]
+
+
+def _time(split, *args) -> tuple[float, list[list[str]]]:
+    start = time.perf_counter()
+    chunks = split(*args)
+    return time.perf_counter() - start, chunks
+
+
+def run_benchmark(documents:int = 500, document_chars:int = 20000, strategy:str = "recursive", workers:int = 4) -> dict:
+    corpus = make_documents(documents, document_chars)
+    settings = {**config['chunking'], "strategy": strategy, "length_unit": "characters"}
+    megabytes = sum(len(doc['content']) for doc in corpus) / 2**20
+    report = {"settings": {"documents": documents, "document_chars": document_chars, "strategy": strategy,
+                           "chunk_size": settings['chunk_size'], "chunk_overlap": settings['chunk_overlap'],
+                           "workers": workers}}
+
+    runs = {"offsets": (_offsets, corpus, settings), "offsets_pool": (_offsets_pool, corpus, settings, workers)}
+    if strategy in ("recursive", "character"):
+        runs = {"langchain": (_langchain, corpus, settings), **runs}
+    results = {}
+    for name, (split, *args) in runs.items():
+        seconds, results[name] = _time(split, *args)
+        chunks = sum(len(texts) for texts in results[name])
+        report[name] = {"seconds": seconds, "chunks": chunks, "mb_per_second": megabytes / seconds,
+                        "chunks_per_second": chunks / seconds}
+    if "langchain" in results:
+        report['identical_to_langchain'] = results['langchain'] == results['offsets'] == results['offsets_pool']
+        report['speedup'] = report['langchain']['seconds'] / report['offsets']['seconds']
+        report['pool_speedup'] = report['langchain']['seconds'] / report['offsets_pool']['seconds']
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--document-chars", type=int, default=20000)
+    parser.add_argument("--strategy", choices=["recursive", "character", "sentence"], default="recursive")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.documents, args.document_chars, args.strategy, args.workers), indent=2))
@@ -0,0 +1,359 @@
+"""End-to-end ingestion and query benchmark with local stand-ins for every external service.
+
+OpenAI embeddings and chat, Cohere rerank and the Qdrant server are replaced by deterministic fakes with
+configurable injected latency (Qdrant by an in-process `QdrantClient(":memory:")`), so the numbers measure
+our own code plus a known, fixed amount of simulated network time. The fakes are placed in the shared client
+registry, so the real `run_ingestion_pipeline` and `run_query_pipeline` run unchanged on a synthetic corpus.
+Fake embeddings hash the words of a text, so a query made of words from a chunk retrieves that chunk.
+
+Each stage the pipelines call is timed; the report gives per-stage p50/p95/p99 and overall throughput as
+JSON. A stored baseline (recorded with the same settings) turns slower stages or throughput into a failure.
+
+Usage:
+    python -m benchmarks.pipeline --documents 200 --queries 100
+    python -m benchmarks.pipeline --baseline benchmarks/baselines/pipeline.json
+    python -m benchmarks.pipeline --save-baseline benchmarks/baselines/pipeline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+import numpy as np
+from src import clients, pipeline
+from src.indexing import sparse_index
+from src.ingestion.embedding_scheduler import count_tokens
+from src.config_loader import get_config
+
+config = get_config()
+
+_TOKEN = re.compile(r"\w+")
+_COLLECTION = "benchmark_pipeline"
+# stage time differences below this are timer noise, whatever the tolerance
+_NOISE_MS = 1.0
+
+INGESTION_STAGES = {"load_and_chunk": "iter_chunk_batches", "embed": "embed_documents", "index": "index_documents"}
+QUERY_STAGES = {"embed": "embed_query", "retrieve": "retrieve_documents", "rerank": "rerank_documents",
+                "generate": "generate_response"}
+
+
+@functools.lru_cache(maxsize=100000)
+def _word_feature(word:str, dim:int) -> tuple[int, float]:
+    digest = hashlib.sha256(word.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little") % dim, 1.0 if digest[4] & 1 else -1.0
+
+
+def fake_embedding(text:str, dim:int) -> list[float]:
+    """Signed feature hashing of the words: cheap, deterministic, and similar for texts sharing words."""
+    features = [_word_feature(word, dim) for word in _TOKEN.findall(text.lower())]
+    if not features:
+        return [0.0] * dim
+    indices, signs = zip(*features)
+    vector = np.bincount(indices, weights=signs, minlength=dim)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def fake_embeddings(dim:int, latency:float) -> SimpleNamespace:
+    """OpenAI embeddings stand-in; each call sleeps `latency` seconds, like one request."""
+    def embed_documents(texts):
+        time.sleep(latency)
+        return [fake_embedding(text, dim) for text in texts]
+
+    def embed_query(text):
+        return embed_documents([text])[0]
+
+    async def aembed_documents(texts):
+        await asyncio.sleep(latency)
+        return [fake_embedding(text, dim) for text in texts]
+
+    async def aembed_query(text):
+        return (await aembed_documents([text]))[0]
+
+    return SimpleNamespace(embed_documents=embed_documents, embed_query=embed_query,
+                           aembed_documents=aembed_documents, aembed_query=aembed_query)
+
+
+def fake_llm(latency:float, answer_words:int = 60) -> SimpleNamespace:
+    """Chat model stand-in answering with the first words of the context."""
+    def _answer(messages):
+        words = _TOKEN.findall(messages[-1].content)
+        return " ".join(words[1:answer_words + 1]) or "I don't know based on the provided documents."
+
+    def invoke(messages):
+        time.sleep(latency)
+        return SimpleNamespace(content=_answer(messages))
+
+    async def ainvoke(messages):
+        await asyncio.sleep(latency)
+        return SimpleNamespace(content=_answer(messages))
+
+    async def astream(messages):
+        await asyncio.sleep(latency)
+        for word in _answer(messages).split(" "):
+            yield SimpleNamespace(content=f"{word} ")
+
+    return SimpleNamespace(invoke=invoke, ainvoke=ainvoke, astream=astream)
+
+
+def _rerank_results(query:str, documents:list[str]) -> SimpleNamespace:
+    # relevance = share of query words found in the document
+    query_words = set(_TOKEN.findall(query.lower()))
+    results = [
+        SimpleNamespace(index=i, relevance_score=len(query_words & set(_TOKEN.findall(document.lower()))) / (len(query_words) or 1))
+        for i, document in enumerate(documents)
+    ]
+    return SimpleNamespace(results=results)
+
+
+def fake_cohere(latency:float) -> SimpleNamespace:
+    def rerank(model, top_n, query, documents):
+        time.sleep(latency)
+        return _rerank_results(query, documents)
+
+    return SimpleNamespace(rerank=rerank)
+
+
+def fake_async_cohere(latency:float) -> SimpleNamespace:
+    async def rerank(model, top_n, query, documents):
+        await asyncio.sleep(latency)
+        return _rerank_results(query, documents)
+
+    return SimpleNamespace(rerank=rerank)
+
+
+def make_corpus(directory:str, documents:int, words_per_document:int, vocabulary:int = 5000, seed:int = 0) -> list[str]:
+    """Write `documents` text files of Zipf-distributed synthetic words; returns their texts."""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    frequencies = 1 / np.arange(1, vocabulary + 1)
+    frequencies /= frequencies.sum()
+
+    os.makedirs(directory, exist_ok=True)
+    texts = []
+    for i in range(documents):
+        drawn = rng.choice(words, size=words_per_document, p=frequencies)
+        sentences = [" ".join(drawn[start:start + 12]) + "." for start in range(0, len(drawn), 12)]
+        paragraphs = ["\n".join(sentences[start:start + 6]) for start in range(0, len(sentences), 6)]
+        text = "\n\n".join(paragraphs)
+        with open(os.path.join(directory, f"doc_{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        texts.append(text)
+    return texts
+
+
+def make_queries(texts:list[str], count:int, words:int = 8, seed:int = 1) -> list[str]:
+    """Questions made of a run of consecutive words from a random document."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        tokens = _TOKEN.findall(texts[rng.integers(len(texts))])
+        start = rng.integers(max(1, len(tokens) - words))
+        queries.append("what about " + " ".join(tokens[start:start + words]))
+    return queries
+
+
+def summarize(samples_ms:list[float]) -> dict:
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    return {
+        "count": len(ordered),
+        "p50_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "mean_ms": statistics.fmean(ordered),
+    }
+
+
+def _timed(samples:list[float], function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            samples.append((time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def _timed_iterator(samples:list[float], function):
+    # time spent producing each item of a generator, e.g. loading and chunking one batch
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        iterator = iter(function(*args, **kwargs))
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            samples.append((time.perf_counter() - start) * 1000)
+            yield item
+    return wrapper
+
+
+@contextlib.contextmanager
+def _fake_clients(fakes:dict):
+    with clients._lock:
+        previous = {name: clients._clients.pop(name) for name in fakes if name in clients._clients}
+        clients._clients.update(fakes)
+    try:
+        yield
+    finally:
+        with clients._lock:
+            for name in fakes:
+                clients._clients.pop(name, None)
+            clients._clients.update(previous)
+
+
+@contextlib.contextmanager
+def _benchmark_config(directory:str):
+    overrides = {
+        "source_data": {"document_directory": directory},
+        "ingestion": {"manifest_directory": os.path.join(directory, "manifests")},
+        "vector_store": {"name": "qdrant", "collection_name": _COLLECTION,
+                         "quantization": {**config['vector_store']['quantization'], "mode": "none"},
+                         "matryoshka": {**config['vector_store']['matryoshka'], "enabled": False}},
+        "sparse_index": {"path": os.path.join(directory, "sparse_index")},
+        # every chunk and query is new, so caches would only hide the work being measured
+        "embedding_cache": {"enabled": False},
+        "semantic_cache": {"enabled": False},
+        # sums of random word vectors score lower than real embeddings
+        "retriever": {"similarity_threshold": 0.0},
+        "reranker": {"backend": "cohere"},
+    }
+    original = {section: config[section] for section in overrides}
+    try:
+        for section, values in overrides.items():
+            config[section] = {**config[section], **values}
+        yield
+    finally:
+        config.update(original)
+
+
+def run_benchmark(documents:int = 200, words_per_document:int = 400, queries:int = 100, dim:int = 256,
+                  embedding_latency_ms:float = 20.0, llm_latency_ms:float = 50.0, rerank_latency_ms:float = 10.0) -> dict:
+    from qdrant_client import QdrantClient
+
+    settings = {
+        "documents": documents, "words_per_document": words_per_document, "queries": queries, "dim": dim,
+        "embedding_latency_ms": embedding_latency_ms, "llm_latency_ms": llm_latency_ms,
+        "rerank_latency_ms": rerank_latency_ms,
+    }
+    fakes = {
+        "embeddings": fake_embeddings(dim, embedding_latency_ms / 1000),
+        "embeddings_batch": fake_embeddings(dim, embedding_latency_ms / 1000),
+        "llm": fake_llm(llm_latency_ms / 1000),
+        "cohere": fake_cohere(rerank_latency_ms / 1000),
+        "cohere_async": fake_async_cohere(rerank_latency_ms / 1000),
+        "qdrant": QdrantClient(":memory:"),
+    }
+    ingestion_samples = {stage: [] for stage in [*INGESTION_STAGES, "sparse_index"]}
+    query_samples = {stage: [] for stage in [*QUERY_STAGES, "total"]}
+
+    with tempfile.TemporaryDirectory() as directory, _benchmark_config(directory), _fake_clients(fakes), \
+         contextlib.ExitStack() as stack:
+        texts = make_corpus(os.path.join(directory, "corpus"), documents, words_per_document)
+        questions = make_queries(texts, queries)
+
+        stack.enter_context(patch.object(pipeline, "iter_chunk_batches",
+                                         _timed_iterator(ingestion_samples['load_and_chunk'], pipeline.iter_chunk_batches)))
+        for stage, name in list(INGESTION_STAGES.items())[1:]:
+            stack.enter_context(patch.object(pipeline, name, _timed(ingestion_samples[stage], getattr(pipeline, name))))
+        stack.enter_context(patch.object(sparse_index, "add_documents",
+                                         _timed(ingestion_samples['sparse_index'], sparse_index.add_documents)))
+        for stage, name in QUERY_STAGES.items():
+            stack.enter_context(patch.object(pipeline, name, _timed(query_samples[stage], getattr(pipeline, name))))
+
+        # one-time setup, not part of any stage: loading the tokenizer
+        count_tokens(questions[0])
+
+        start = time.perf_counter()
+        ingestion = pipeline.run_ingestion_pipeline("corpus")
+        ingestion_seconds = time.perf_counter() - start
+        if ingestion['status'] != "success":
+            raise RuntimeError("Ingestion failed; see the log for the failing stage")
+
+        run_query_pipeline = _timed(query_samples['total'], pipeline.run_query_pipeline)
+        start = time.perf_counter()
+        for question in questions:
+            run_query_pipeline(question)
+        query_seconds = time.perf_counter() - start
+
+        index = sparse_index._indexes.pop((config['sparse_index']['path'], _COLLECTION), None)
+        if index is not None:
+            index['db'].close()
+
+    return {
+        "settings": settings,
+        "ingestion": {
+            "documents": ingestion['documents_loaded'],
+            "chunks": ingestion['chunks_created'],
+            "seconds": ingestion_seconds,
+            "chunks_per_second": ingestion['chunks_created'] / ingestion_seconds,
+            "stages": {stage: summarize(samples) for stage, samples in ingestion_samples.items()},
+        },
+        "query": {
+            "queries": queries,
+            "seconds": query_seconds,
+            "queries_per_second": queries / query_seconds,
+            "stages": {stage: summarize(samples) for stage, samples in query_samples.items()},
+        },
+    }
+
+
+def compare_to_baseline(report:dict, baseline:dict, tolerance:float, percentile:str = "p50_ms") -> list[str]:
+    """Stages whose `percentile` or phases whose throughput got worse than the baseline by more than `tolerance`."""
+    if report['settings'] != baseline['settings']:
+        return [f"Baseline was recorded with different settings: {baseline['settings']}"]
+
+    regressions = []
+    for phase, throughput in (("ingestion", "chunks_per_second"), ("query", "queries_per_second")):
+        for stage, expected in baseline[phase]['stages'].items():
+            actual = report[phase]['stages'].get(stage)
+            if actual and actual[percentile] > expected[percentile] * (1 + tolerance) + _NOISE_MS:
+                regressions.append(f"{phase}.{stage} {percentile} {actual[percentile]:.1f} vs baseline {expected[percentile]:.1f}")
+        if report[phase][throughput] < baseline[phase][throughput] / (1 + tolerance):
+            regressions.append(f"{phase} {throughput} {report[phase][throughput]:.1f} vs baseline {baseline[phase][throughput]:.1f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--words-per-document", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0, help="injected latency per embedding request")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="injected latency per LLM call")
+    parser.add_argument("--rerank-latency-ms", type=float, default=10.0, help="injected latency per rerank call")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against; regressions exit non-zero")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown against the baseline")
+    parser.add_argument("--percentile", default="p50_ms", choices=["p50_ms", "p95_ms", "p99_ms"],
+                        help="stage latency compared against the baseline; ingestion has few batches, so its tails are noisy")
+    parser.add_argument("--save-baseline", default=None, help="write this run's report as the new baseline")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.documents, args.words_per_document, args.queries, args.dim,
+                           args.embedding_latency_ms, args.llm_latency_ms, args.rerank_latency_ms)
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance, args.percentile)
+        if regressions:
+            sys.exit("Performance regressions against the baseline:\n" + "\n".join(regressions))
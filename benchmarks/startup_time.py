@@ -0,0 +1,78 @@
+"""Measure cold-start time of the API in fresh interpreters: importing the module and, when it defines a FastAPI
+`app`, running the lifespan startup, i.e. until the server would accept traffic. The probes log to a temporary
+file instead of the configured one.
+
+Usage:
+    python -m benchmarks.startup_time --runs 10 --max-seconds 1.5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+HEAVY_MODULES = ["ragas", "cohere", "qdrant_client", "langchain_openai", "langchain_community",
+                 "langchain_text_splitters", "openai"]
+
+_PROBE = """
+import asyncio, sys, time, json
+start = time.perf_counter()
+from src.config_loader import get_config
+get_config()["logging"]["file"] = {log_file!r}
+import {module} as module
+imported = time.perf_counter() - start
+
+async def startup():
+    app = getattr(module, "app", None)
+    if app is None:
+        return imported, [m for m in {heavy!r} if m in sys.modules]
+    async with app.router.lifespan_context(app):
+        return time.perf_counter() - start, [m for m in {heavy!r} if m in sys.modules]
+
+elapsed, loaded = asyncio.run(startup())
+print(json.dumps({{"import_seconds": imported, "seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def measure_startup(module:str = "api.main", runs:int = 5) -> dict:
+    timings, import_timings = [], []
+    loaded = []
+    with tempfile.TemporaryDirectory(prefix="rag-startup-") as directory:
+        probe = _PROBE.format(module=module, heavy=HEAVY_MODULES, log_file=str(Path(directory) / "app.log"))
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            timings.append(result['seconds'])
+            import_timings.append(result['import_seconds'])
+            loaded = result['loaded']
+
+    return {
+        "module": module,
+        "runs": runs,
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "max_seconds": max(timings),
+        "median_import_seconds": statistics.median(import_timings),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="fail if the median startup time exceeds this budget")
+    args = parser.parse_args()
+
+    report = measure_startup(args.module, args.runs)
+    print(json.dumps(report, indent=2))
+
+    if report['heavy_modules_loaded']:
+        sys.exit(f"Heavy modules imported at startup: {report['heavy_modules_loaded']}")
+    if args.max_seconds is not None and report['median_seconds'] > args.max_seconds:
+        sys.exit(f"Median startup {report['median_seconds']:.3f}s exceeds budget of {args.max_seconds:.3f}s")
@@ -0,0 +1,130 @@
+"""Compare memory, search latency and recall@k of the vector storage modes on real embeddings.
+
+Each quantization mode can be combined with two-stage Matryoshka search on a short prefix of the
+vectors (--short-dims, 0 = full vectors only).
+
+Vectors come from --vectors (a .npy file) or, by default, from the embedding cache of the configured
+model, so the numbers reflect our own corpus. A sample of them is held out as queries. Each mode is
+indexed into a temporary collection of the chosen backend and compared against exact float32 search.
+
+Usage:
+    python -m benchmarks.vector_storage --backend local --queries 100 --k 10
+    python -m benchmarks.vector_storage --backend qdrant --vectors embeddings.npy --modes none scalar
+    python -m benchmarks.vector_storage --modes none --short-dims 0 256 512
+"""
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+from src.cache.embedding_cache import load_cached_vectors
+from src.config_loader import get_config
+from src.indexing.vector_store import index_documents, search_vectors, drop_collection, point_ids
+from src.ingestion.chunk_batch import ChunkBatch, make_chunk_batch
+
+config = get_config()
+
+MODES = ["none", "scalar", "binary"]
+_UPLOAD_BATCH = 1000
+
+
+def vector_memory_bytes(mode:str, count:int, dim:int) -> int:
+    """RAM needed for the vectors a search scans: float32 vectors, or only their quantized codes."""
+    bytes_per_vector = {"none": dim * 4, "scalar": dim, "binary": (dim + 7) // 8}[mode]
+    return bytes_per_vector * count
+
+
+def _chunks(vectors:np.ndarray, offset:int = 0) -> ChunkBatch:
+    metadata = {"source": "benchmark"}
+    return make_chunk_batch([""] * len(vectors), [metadata] * len(vectors), list(range(offset, offset + len(vectors))), vectors)
+
+
+def _exact_top_k(vectors:np.ndarray, queries:np.ndarray, k:int) -> list[set[int]]:
+    normalised = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalised.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def run_benchmark(vectors:np.ndarray, backend:str = "local", modes:list[str] = MODES, queries:int = 100,
+                  k:int = 10, oversampling:float = 2.0, rescore:bool = True, short_dims:list[int] = [0],
+                  short_oversampling:float = 4.0) -> list[dict]:
+    rng = np.random.default_rng(0)
+    held_out = rng.choice(len(vectors), size=min(queries, len(vectors) // 10 or 1), replace=False)
+    query_vectors = vectors[held_out]
+    vectors = np.delete(vectors, held_out, axis=0)
+
+    ids = {id_: i for i, id_ in enumerate(point_ids(_chunks(vectors)))}
+    expected = _exact_top_k(vectors, query_vectors, k)
+
+    original = config['vector_store']
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            for mode, short_dim in itertools.product(modes, short_dims):
+                config['vector_store'] = {
+                    **original,
+                    "name": backend,
+                    "collection_name": f"{original['collection_name']}_benchmark_{mode}_{short_dim}",
+                    "quantization": {"mode": mode, "oversampling": oversampling, "rescore": rescore},
+                    "matryoshka": {"enabled": short_dim > 0, "dim": short_dim, "oversampling": short_oversampling},
+                    "local": {**original['local'], "path": directory},
+                }
+                drop_collection()
+                start = time.perf_counter()
+                for offset in range(0, len(vectors), _UPLOAD_BATCH):
+                    index_documents(_chunks(vectors[offset:offset + _UPLOAD_BATCH], offset))
+                index_seconds = time.perf_counter() - start
+
+                latencies, recalls = [], []
+                for query, relevant in zip(query_vectors, expected):
+                    start = time.perf_counter()
+                    hits = search_vectors(query.tolist(), k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    recalls.append(len({ids[hit['id']] for hit in hits} & relevant) / len(relevant))
+                drop_collection()
+
+                latencies.sort()
+                results.append({
+                    "mode": mode,
+                    "short_dim": short_dim,
+                    "backend": backend,
+                    "vectors": len(vectors),
+                    "dim": vectors.shape[1],
+                    "vector_memory_mb": vector_memory_bytes(mode, len(vectors), short_dim or vectors.shape[1]) / 2**20,
+                    "index_seconds": index_seconds,
+                    "p50_ms": statistics.median(latencies),
+                    "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                    f"recall@{k}": float(np.mean(recalls)),
+                })
+        finally:
+            config['vector_store'] = original
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="local", choices=["local", "qdrant"])
+    parser.add_argument("--vectors", default=None, help=".npy matrix of embeddings; defaults to the embedding cache")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    parser.add_argument("--no-rescore", action="store_true")
+    parser.add_argument("--short-dims", nargs="+", type=int, default=[0],
+                        help="Matryoshka prefix lengths to compare; 0 searches the full vectors only")
+    parser.add_argument("--short-oversampling", type=float, default=4.0)
+    args = parser.parse_args()
+
+    if args.vectors:
+        data = np.load(args.vectors).astype(np.float32)
+    else:
+        data = load_cached_vectors(config['embedding']['model_name'])
+    if len(data) < 2:
+        sys.exit("No vectors to benchmark: ingest some documents first or pass --vectors")
+
+    report = run_benchmark(data, args.backend, args.modes, args.queries, args.k, args.oversampling,
+                           not args.no_rescore, args.short_dims, args.short_oversampling)
+    print(json.dumps(report, indent=2))
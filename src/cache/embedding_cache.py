@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# On-disk layout, one directory per embedding model:
+#   vectors.f32    - memory-mapped float32 matrix, one row per slot
+#   keys.bin       - memory-mapped slot -> content key (sha256 hex, empty for a free slot)
+#   last_used.i64  - memory-mapped slot -> last-used tick
+#   meta.json      - vector dimension and number of slots, replaced atomically when the files grow
+# A store only writes the rows it touches. The key -> slot dict is rebuilt from keys.bin on first use.
+# When the cache is full the least recently used slot is overwritten; its key is cleared and flushed
+# before the new vector is written, so a crash never leaves a key pointing at another text's vector.
+_lock = threading.Lock()
+_stores = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+_INITIAL_ROWS = 1024
+
+
+def _settings() -> dict:
+    return config['embedding_cache']
+
+
+def _content_key(model:str, text:str) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest().encode("ascii")
+
+
+def _model_dir(model:str) -> str:
+    return os.path.join(_settings()['directory'], re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+
+
+_FILES = {"vectors": ("vectors.f32", np.float32), "keys": ("keys.bin", "S64"), "last_used": ("last_used.i64", np.int64)}
+
+
+def _open_matrix(store:dict, name:str, rows:int) -> np.memmap:
+    filename, dtype = _FILES[name]
+    shape = (rows, store['dim']) if name == "vectors" else (rows,)
+    path = os.path.join(store['directory'], filename)
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+def _save_meta(store:dict) -> None:
+    meta_path = os.path.join(store['directory'], "meta.json")
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump({"dim": store['dim'], "rows": len(store['keys'])}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def _read_meta(directory:str) -> dict:
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    dim, rows = int(meta['dim']), int(meta['rows'])
+    for name, (filename, dtype) in _FILES.items():
+        size = rows * (dim if name == "vectors" else 1) * np.dtype(dtype).itemsize
+        if os.path.getsize(os.path.join(directory, filename)) < size:
+            raise ValueError(f"{filename} is shorter than {rows} slots")
+    return {"dim": dim, "rows": rows}
+
+
+def _load_store(model:str) -> dict:
+    if model in _stores:
+        return _stores[model]
+
+    directory = _model_dir(model)
+    store = {"directory": directory, "vectors": None, "dim": 0, "slots": {},
+             "keys": np.zeros(0, dtype="S64"), "last_used": np.zeros(0, dtype=np.int64), "tick": 0}
+
+    meta = None
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        try:
+            meta = _read_meta(directory)
+        except Exception as e:
+            # a cache is only an optimisation: start empty rather than fail every ingest
+            logger.warning(f"Embedding cache index for '{model}' is unreadable, starting with an empty cache: {e}")
+            for filename, _ in _FILES.values():
+                if os.path.exists(os.path.join(directory, filename)):
+                    os.remove(os.path.join(directory, filename))
+    if meta is not None:
+        store['dim'] = meta['dim']
+        for name in _FILES:
+            store[name] = _open_matrix(store, name, meta['rows'])
+        store['tick'] = int(store['last_used'].max(initial=0))
+        store['slots'] = {key: slot for slot, key in enumerate(store['keys'].tolist()) if key}
+        logger.info(f"Opened embedding cache for '{model}' with {len(store['slots'])} vectors.")
+
+    _stores[model] = store
+    return store
+
+
+def _grow(store:dict, rows:int) -> None:
+    if rows <= len(store['keys']):
+        return
+    for name in _FILES:
+        if isinstance(store[name], np.memmap):
+            store[name].flush()
+        store[name] = _open_matrix(store, name, rows)
+    _save_meta(store)
+
+
+def _next_slot(store:dict) -> int:
+    # Slots are filled in order and evicted slots are reused in place, so the used ones are always 0..used-1
+    used = len(store['slots'])
+    max_entries = _settings()['max_entries']
+    if used < max_entries:
+        if used >= len(store['keys']):
+            _grow(store, min(max(_INITIAL_ROWS, used * 2), max_entries))
+        return used
+
+    slot = int(np.argmin(store['last_used'][:used]))
+    del store['slots'][bytes(store['keys'][slot])]
+    _stats['evictions'] += 1
+    return slot
+
+
+def lookup_embeddings(texts:list[str], model:str) -> dict[int, np.ndarray]:
+    """Return cached float32 vectors keyed by the position of each text that was found."""
+    if not _settings()['enabled'] or not texts:
+        return {}
+
+    with _lock:
+        store = _load_store(model)
+        found = {}
+        for i, text in enumerate(texts):
+            slot = store['slots'].get(_content_key(model, text))
+            if slot is None:
+                continue
+            store['tick'] += 1
+            store['last_used'][slot] = store['tick']
+            found[i] = np.array(store['vectors'][slot])
+
+        _stats['hits'] += len(found)
+        _stats['misses'] += len(texts) - len(found)
+        return found
+
+
+def store_embeddings(texts:list[str], embeddings:list[list[float]] | np.ndarray, model:str) -> None:
+    if not _settings()['enabled'] or not texts:
+        return
+
+    with _lock:
+        store = _load_store(model)
+        if store['vectors'] is None:
+            os.makedirs(store['directory'], exist_ok=True)
+            store['dim'] = len(embeddings[0])
+            _grow(store, min(_INITIAL_ROWS, _settings()['max_entries']))
+
+        # only the last `max_entries` texts of an oversized batch would survive, and touching each slot at most
+        # once keeps an evicted slot from being picked again before its new key is written
+        max_entries = _settings()['max_entries']
+        texts, embeddings = texts[-max_entries:], embeddings[-max_entries:]
+        slots, keys, evicted = [], [], False
+        for text in texts:
+            key = _content_key(model, text)
+            slot = store['slots'].get(key)
+            if slot is None:
+                slot = _next_slot(store)
+                evicted = evicted or bool(store['keys'][slot])
+                store['slots'][key] = slot
+                store['keys'][slot] = b""
+            store['tick'] += 1
+            store['last_used'][slot] = store['tick']
+            slots.append(slot)
+            keys.append(key)
+
+        if evicted:
+            store['keys'].flush()
+        store['vectors'][slots] = embeddings
+        store['vectors'].flush()
+        store['keys'][slots] = keys
+        store['keys'].flush()
+        store['last_used'].flush()
+
+
+def load_cached_vectors(model:str) -> np.ndarray:
+    """Copy of every vector cached for the model, e.g. as realistic benchmark data."""
+    with _lock:
+        store = _load_store(model)
+        if store['vectors'] is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.array(store['vectors'][:len(store['slots'])])
+
+
+def get_embedding_cache_stats() -> dict:
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {
+            **_stats,
+            "size": sum(len(store['slots']) for store in _stores.values()),
+            "hit_rate": _stats['hits'] / lookups if lookups else 0.0,
+        }
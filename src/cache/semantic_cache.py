@@ -0,0 +1,256 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# Entries live in an in-memory LRU (oldest first) that is searched by cosine similarity against a matrix
+# of their normalised embeddings. A store fills a free row or appends one (doubling the capacity), and a
+# deletion frees its row, so the matrix is only stacked from scratch after a restart or an invalidation.
+# With the "sqlite" backend every store and deletion is also written through to a local database, and the
+# LRU is restored from it on first use after a restart. Hits only record their access time in memory; it
+# is written with the next store or deletion (and at exit), so a hit never waits on a commit.
+_lock = threading.Lock()
+_entries: OrderedDict = OrderedDict()
+_matrix = None
+_matrix_keys: list[str | None] = []
+_rows: dict[str, int] = {}
+_free_rows: list[int] = []
+_accessed: dict[str, float] = {}
+_db = None
+_loaded = False
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+
+def _settings() -> dict:
+    return config['semantic_cache']
+
+
+def _normalise(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _cache_key(query:str) -> str:
+    return hashlib.sha256(query.strip().lower().encode("utf-8")).hexdigest()
+
+
+def _get_db():
+    global _db
+    if _db is None:
+        path = _settings()['path']
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _db = sqlite3.connect(path, check_same_thread=False)
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, query TEXT, embedding BLOB, result TEXT, created_at REAL, last_access REAL)"
+        )
+        _db.commit()
+    return _db
+
+
+def _persistent() -> bool:
+    return _settings()['backend'] == "sqlite"
+
+
+def _ensure_loaded() -> None:
+    global _loaded, _matrix
+    if _loaded:
+        return
+    _loaded = True
+    if not _persistent():
+        return
+
+    cutoff = time.time() - _settings()['ttl_seconds']
+    rows = _get_db().execute(
+        "SELECT key, query, embedding, result, created_at FROM entries WHERE created_at >= ? ORDER BY last_access",
+        (cutoff,)
+    ).fetchall()
+    for key, query, embedding, result, created_at in rows:
+        _entries[key] = {
+            "query": query,
+            "embedding": np.frombuffer(embedding, dtype=np.float32),
+            "result": json.loads(result),
+            "created_at": created_at,
+        }
+    _matrix = None
+    logger.info(f"Restored {len(_entries)} semantic cache entries from {_settings()['path']}")
+
+
+def _build_matrix() -> None:
+    global _matrix, _matrix_keys
+    _matrix_keys = list(_entries.keys())
+    _matrix = np.stack([_entries[key]['embedding'] for key in _matrix_keys])
+    _rows.clear()
+    _rows.update({key: row for row, key in enumerate(_matrix_keys)})
+    _free_rows.clear()
+
+
+def _place(key:str, embedding:np.ndarray) -> None:
+    global _matrix
+    if _matrix is None:
+        return
+    if _matrix.shape[1] != len(embedding):
+        # the embedding model changed; stacked again from the entries on the next lookup
+        _matrix = None
+        return
+    row = _rows.get(key)
+    if row is None:
+        if _free_rows:
+            row = _free_rows.pop()
+        else:
+            row = len(_matrix_keys)
+            _matrix_keys.append(None)
+            if row >= len(_matrix):
+                grown = np.zeros((2 * len(_matrix), _matrix.shape[1]), dtype=np.float32)
+                grown[:row] = _matrix
+                _matrix = grown
+        _rows[key] = row
+        _matrix_keys[row] = key
+    _matrix[row] = embedding
+
+
+def _unplace(key:str) -> None:
+    row = _rows.pop(key, None) if _matrix is not None else None
+    if row is not None:
+        _matrix_keys[row] = None
+        _matrix[row] = 0
+        _free_rows.append(row)
+
+
+def _write_accessed(db) -> None:
+    # access times of hits since the last write; committed by the caller
+    if _accessed:
+        db.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(at, key) for key, at in _accessed.items()])
+        _accessed.clear()
+
+
+def _delete(keys:list[str]) -> None:
+    for key in keys:
+        _entries.pop(key, None)
+        _accessed.pop(key, None)
+        _unplace(key)
+    if _persistent() and keys:
+        db = _get_db()
+        _write_accessed(db)
+        db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        db.commit()
+
+
+def _expire() -> None:
+    cutoff = time.time() - _settings()['ttl_seconds']
+    expired = [key for key, entry in _entries.items() if entry['created_at'] < cutoff]
+    if expired:
+        _stats['expirations'] += len(expired)
+        _delete(expired)
+
+
+def lookup_answer(query_embedding) -> dict | None:
+    """Return the cached result of the most similar earlier query, if it clears the similarity threshold.
+
+    Without an embedding (lexical retrieval) there is nothing to compare, so this is always a miss.
+    """
+    if not _settings()['enabled'] or query_embedding is None:
+        return None
+
+    with _lock:
+        _ensure_loaded()
+        _expire()
+        if not _entries:
+            _stats['misses'] += 1
+            return None
+
+        if _matrix is None:
+            _build_matrix()
+
+        scores = _matrix[:len(_matrix_keys)] @ _normalise(query_embedding)
+        scores[_free_rows] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < _settings()['similarity_threshold']:
+            _stats['misses'] += 1
+            return None
+
+        key = _matrix_keys[best]
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+        if _persistent():
+            _accessed[key] = time.time()
+
+        logger.debug(f"Semantic cache hit (similarity {scores[best]:.3f}) for query: {_entries[key]['query'][:50]}...")
+        return dict(_entries[key]['result'])
+
+
+def store_answer(query:str, query_embedding, result:dict) -> None:
+    if not _settings()['enabled'] or query_embedding is None:
+        return
+
+    with _lock:
+        _ensure_loaded()
+        key = _cache_key(query)
+        now = time.time()
+        embedding = _normalise(query_embedding)
+        _entries[key] = {"query": query, "embedding": embedding, "result": result, "created_at": now}
+        _entries.move_to_end(key)
+        _accessed.pop(key, None)
+        _place(key, embedding)
+        _stats['stores'] += 1
+
+        if _persistent():
+            db = _get_db()
+            _write_accessed(db)
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, query, embedding, result, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, embedding.tobytes(), json.dumps(result), now, now)
+            )
+            db.commit()
+
+        overflow = len(_entries) - _settings()['max_entries']
+        if overflow > 0:
+            _stats['evictions'] += overflow
+            _delete(list(_entries.keys())[:overflow])
+
+
+def invalidate_cache() -> None:
+    """Drop every cached answer, e.g. after new documents are ingested into the collection."""
+    global _matrix
+    with _lock:
+        _ensure_loaded()
+        _entries.clear()
+        _accessed.clear()
+        _matrix = None
+        _stats['invalidations'] += 1
+        if _persistent():
+            db = _get_db()
+            db.execute("DELETE FROM entries")
+            db.commit()
+    logger.info("Semantic cache invalidated.")
+
+
+def _flush_accessed() -> None:
+    with _lock:
+        if _persistent() and _accessed and _db is not None:
+            _write_accessed(_db)
+            _db.commit()
+
+
+atexit.register(_flush_accessed)
+
+
+def get_cache_stats() -> dict:
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {
+            **_stats,
+            "size": len(_entries),
+            "hit_rate": _stats['hits'] / lookups if lookups else 0.0,
+            "backend": _settings()['backend'],
+        }
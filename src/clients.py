@@ -0,0 +1,223 @@
+from __future__ import annotations
+import inspect
+import threading
+from typing import TYPE_CHECKING
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# The SDKs below are imported inside each getter so they load on first use, not at startup.
+if TYPE_CHECKING:
+    import cohere
+    import httpx
+    from qdrant_client import QdrantClient, AsyncQdrantClient
+    from langchain_openai import ChatOpenAI
+    from langchain_openai.embeddings import OpenAIEmbeddings
+    from sentence_transformers import CrossEncoder
+
+# Process-wide registry: every client is built once and reused by all requests,
+# so the TCP/TLS/gRPC handshakes are paid once per process instead of per call.
+_lock = threading.Lock()
+_clients = {}
+_http_clients = {}
+_stats = {}
+
+
+def _pool_limits() -> httpx.Limits:
+    import httpx
+
+    return httpx.Limits(
+        max_connections=config['clients']['max_connections'],
+        max_keepalive_connections=config['clients']['max_keepalive_connections'],
+        keepalive_expiry=config['clients']['keepalive_expiry'],
+    )
+
+
+def _http_client(name:str) -> httpx.Client:
+    import httpx
+
+    if name not in _http_clients:
+        _http_clients[name] = httpx.Client(limits=_pool_limits(), timeout=config['clients']['timeout'])
+    return _http_clients[name]
+
+
+def _async_http_client(name:str) -> httpx.AsyncClient:
+    import httpx
+
+    key = f"{name}_async"
+    if key not in _http_clients:
+        _http_clients[key] = httpx.AsyncClient(limits=_pool_limits(), timeout=config['clients']['timeout'])
+    return _http_clients[key]
+
+
+def _qdrant_options() -> dict:
+    return {
+        "url": config['vector_store']['url'],
+        "prefer_grpc": True,
+        "pool_size": config['clients']['max_connections'],
+        "grpc_options": {
+            "grpc.keepalive_time_ms": int(config['clients']['keepalive_expiry'] * 1000),
+            "grpc.keepalive_permit_without_calls": 1,
+        },
+    }
+
+
+def _get_or_create(name:str, factory):
+    with _lock:
+        stats = _stats.setdefault(name, {"created": 0, "reused": 0})
+        if name in _clients:
+            stats["reused"] += 1
+            return _clients[name]
+
+        _clients[name] = factory()
+        stats["created"] += 1
+        logger.info(f"Created shared '{name}' client.")
+        return _clients[name]
+
+
+def get_qdrant_client() -> QdrantClient:
+    from qdrant_client import QdrantClient
+
+    return _get_or_create("qdrant", lambda: QdrantClient(**_qdrant_options()))
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    from qdrant_client import AsyncQdrantClient
+
+    return _get_or_create("qdrant_async", lambda: AsyncQdrantClient(**_qdrant_options()))
+
+
+def get_embedding_model() -> OpenAIEmbeddings:
+    from langchain_openai.embeddings import OpenAIEmbeddings
+
+    return _get_or_create("embeddings", lambda: OpenAIEmbeddings(
+        model=config['embedding']['model_name'],
+        openai_api_key=config['credentials']['openai_api_key'],
+        base_url=config['embedding']['base_url'],
+        http_client=_http_client("openai"),
+        http_async_client=_async_http_client("openai"),
+    ))
+
+
+def get_batch_embedding_model() -> OpenAIEmbeddings:
+    """Embedding client for the ingestion scheduler, which does its own batching and retries."""
+    from langchain_openai.embeddings import OpenAIEmbeddings
+
+    return _get_or_create("embeddings_batch", lambda: OpenAIEmbeddings(
+        model=config['embedding']['model_name'],
+        openai_api_key=config['credentials']['openai_api_key'],
+        base_url=config['embedding']['base_url'],
+        max_retries=0,
+        check_embedding_ctx_length=False,
+        chunk_size=config['embedding']['batch_max_items'],
+        http_client=_http_client("openai"),
+    ))
+
+
+def get_llm() -> ChatOpenAI:
+    from langchain_openai import ChatOpenAI
+
+    return _get_or_create("llm", lambda: ChatOpenAI(
+        model=config['llm']['model_name'],
+        openai_api_key=config['credentials']['openai_api_key'],
+        temperature=config['llm']['temperature'],
+        # the last streamed chunk then carries usage_metadata, so /query/stream counts LLM tokens too
+        stream_usage=True,
+        http_client=_http_client("openai"),
+        http_async_client=_async_http_client("openai"),
+    ))
+
+
+def get_cohere_client() -> cohere.Client:
+    import cohere
+
+    return _get_or_create("cohere", lambda: cohere.Client(
+        api_key=config['credentials']['cohere_api_key'],
+        httpx_client=_http_client("cohere"),
+    ))
+
+
+def get_async_cohere_client() -> cohere.AsyncClient:
+    import cohere
+
+    return _get_or_create("cohere_async", lambda: cohere.AsyncClient(
+        api_key=config['credentials']['cohere_api_key'],
+        httpx_client=_async_http_client("cohere"),
+    ))
+
+
+def get_cross_encoder() -> CrossEncoder:
+    # optional dependency, only needed for reranker.backend "cross_encoder"
+    from sentence_transformers import CrossEncoder
+
+    return _get_or_create("cross_encoder", lambda: CrossEncoder(config['reranker']['cross_encoder_model'], device="cpu"))
+
+
+def init_clients() -> None:
+    getters = [("embeddings", get_embedding_model), ("llm", get_llm),
+               ("cohere", get_cohere_client), ("cohere_async", get_async_cohere_client)]
+    if config['reranker']['backend'] == "cross_encoder":
+        getters.append(("cross_encoder", get_cross_encoder))
+    if config['vector_store']['name'] == "qdrant":
+        getters = [("qdrant", get_qdrant_client), ("qdrant_async", get_async_qdrant_client)] + getters
+    for name, getter in getters:
+        try:
+            getter()
+        except Exception as e:
+            logger.warning(f"Could not initialise '{name}' client at startup: {e}")
+
+
+def close_clients() -> None:
+    """Close the synchronous clients. Async clients are only dropped; use aclose_clients() inside an event loop."""
+    with _lock:
+        for name, client in list(_clients.items()):
+            close = getattr(client, "close", None)
+            if callable(close) and not inspect.iscoroutinefunction(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"Error closing '{name}' client: {e}")
+        for http_client in _http_clients.values():
+            # httpx.AsyncClient only has aclose(), so this closes the sync pools
+            close = getattr(http_client, "close", None)
+            if callable(close):
+                close()
+        _clients.clear()
+        _http_clients.clear()
+    logger.info("Closed all shared clients.")
+
+
+async def aclose_clients() -> None:
+    for name, client in list(_clients.items()):
+        close = getattr(client, "close", None)
+        if callable(close) and inspect.iscoroutinefunction(close):
+            try:
+                await close()
+            except Exception as e:
+                logger.warning(f"Error closing '{name}' client: {e}")
+    for http_client in list(_http_clients.values()):
+        aclose = getattr(http_client, "aclose", None)
+        if callable(aclose):
+            await aclose()
+    close_clients()
+
+
+def get_pool_stats() -> dict:
+    with _lock:
+        pools = {}
+        for name, http_client in _http_clients.items():
+            # httpx does not expose pool state publicly; read it from the transport when available
+            pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+            connections = getattr(pool, "connections", [])
+            pools[name] = {
+                "max_connections": config['clients']['max_connections'],
+                "max_keepalive_connections": config['clients']['max_keepalive_connections'],
+                "open_connections": len(connections),
+                "idle_connections": sum(1 for c in connections if c.is_idle()),
+            }
+
+        return {
+            "clients": {name: dict(stats, active=name in _clients) for name, stats in _stats.items()},
+            "http_pools": pools,
+        }
@@ -1,17 +1,228 @@
 import os
+import threading
+from typing import TypedDict
 import yaml
 from dotenv import load_dotenv
 
-def load_config(path: str = "./config/config.yaml") -> dict:
+DEFAULT_CONFIG_PATH = "./config/config.yaml"
+
+
+class EmbeddingConfig(TypedDict):
+    model_name: str
+    base_url: str | None
+    batch_max_tokens: int
+    batch_max_items: int
+    concurrency: int
+    requests_per_minute: int
+    tokens_per_minute: int
+    max_retries: int
+    backoff_base_seconds: float
+    backoff_max_seconds: float
+
+class LocalVectorStoreConfig(TypedDict):
+    path: str
+    dtype: str
+    ann_threshold: int
+    ivf_lists: int
+    ivf_probes: int
+
+class QuantizationConfig(TypedDict):
+    mode: str
+    oversampling: float
+    rescore: bool
+
+class MatryoshkaConfig(TypedDict):
+    enabled: bool
+    dim: int
+    oversampling: float
+
+class UploadConfig(TypedDict):
+    batch_size: int
+    parallel: int
+    max_retries: int
+    backoff_base_seconds: float
+    wait: bool
+    disable_indexing: bool
+    indexing_threshold: int
+
+class VectorStoreConfig(TypedDict):
+    name: str
+    host: str
+    port: int
+    collection_name: str
+    url: str
+    quantization: QuantizationConfig
+    matryoshka: MatryoshkaConfig
+    on_disk_vectors: bool
+    on_disk_payload: bool
+    payload_indexes: dict[str, str]
+    upload: UploadConfig
+    local: LocalVectorStoreConfig
+
+class LLMConfig(TypedDict):
+    model_name: str
+    temperature: float
+
+class RetrieverConfig(TypedDict):
+    top_k: int
+    similarity_threshold: float
+    mode: str
+    rrf_k: int
+    payload_fields: list[str]
+
+class ContextConfig(TypedDict):
+    enabled: bool
+    max_tokens: int
+    merge_adjacent: bool
+    dedupe_threshold: float
+
+class LoggingConfig(TypedDict):
+    level: str
+    format: str
+    file: str
+    json: bool
+    max_bytes: int
+    backup_count: int
+    queue_size: int
+    debug_sample_rate: float
+
+class SourceDataConfig(TypedDict):
+    document_directory: str
+
+class ChunkingConfig(TypedDict):
+    chunk_size: int
+    chunk_overlap: int
+    strategy: str
+    length_unit: str
+    workers: int
+
+class CredentialsConfig(TypedDict):
+    openai_api_key: str | None
+    cohere_api_key: str | None
+
+class RerankerConfig(TypedDict):
+    model_name: str
+    top_k: int
+    top_n: int
+    backend: str
+    cross_encoder_model: str
+    batch_size: int
+    cache_size: int
+    skip_when_all_kept: bool
+    skip_margin: float
+
+class ValidationConfig(TypedDict):
+    max_query_length: int
+    max_response_length: int
+    min_query_length: int
+
+class ClientsConfig(TypedDict):
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    timeout: float
+    warm_up: bool
+
+class SemanticCacheConfig(TypedDict):
+    enabled: bool
+    backend: str
+    similarity_threshold: float
+    ttl_seconds: float
+    max_entries: int
+    path: str
+
+class EmbeddingCacheConfig(TypedDict):
+    enabled: bool
+    directory: str
+    max_entries: int
+
+class IngestionConfig(TypedDict):
+    manifest_directory: str
+    include: list[str]
+    exclude: list[str]
+    parse_workers: int
+    batch_size: int
+    queue_size: int
+
+class SparseIndexConfig(TypedDict):
+    enabled: bool
+    path: str
+    k1: float
+    b: float
+    max_segments: int
+
+class QueryBatchConfig(TypedDict):
+    max_queries: int
+    concurrency: int
+
+class EvaluationConfig(TypedDict):
+    checkpoint_directory: str
+    concurrency: int
+
+class MetricsConfig(TypedDict):
+    trace_history: int
+    slow_request_ms: float
+
+class Config(TypedDict):
+    embedding: EmbeddingConfig
+    vector_store: VectorStoreConfig
+    llm: LLMConfig
+    retriever: RetrieverConfig
+    context: ContextConfig
+    logging: LoggingConfig
+    source_data: SourceDataConfig
+    chunking: ChunkingConfig
+    credentials: CredentialsConfig
+    reranker: RerankerConfig
+    validation: ValidationConfig
+    clients: ClientsConfig
+    semantic_cache: SemanticCacheConfig
+    embedding_cache: EmbeddingCacheConfig
+    ingestion: IngestionConfig
+    sparse_index: SparseIndexConfig
+    query_batch: QueryBatchConfig
+    evaluation: EvaluationConfig
+    metrics: MetricsConfig
+
+
+def load_config(path: str = DEFAULT_CONFIG_PATH) -> Config:
     try:
         with open(path, "r") as f:
             config =  yaml.safe_load(f)
-        
+
         load_dotenv()
         config["credentials"]["openai_api_key"] = os.getenv("OPENAI_API_KEY")
         config["credentials"]["cohere_api_key"] = os.getenv("COHERE_API_KEY")
 
         return config
-        
+
     except FileNotFoundError:
         raise FileNotFoundError(f"Configuration file '{path}' not found.")
+
+
+# The parsed config is cached process-wide so the YAML and .env are read once,
+# no matter how many modules ask for it.
+_config_lock = threading.Lock()
+_config: Config | None = None
+
+
+def get_config() -> Config:
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = load_config()
+    return _config
+
+
+def reload_config(path: str = DEFAULT_CONFIG_PATH) -> Config:
+    """Re-read the config and update the cached dict in place, so modules holding a reference see the new values."""
+    global _config
+    fresh = load_config(path)
+    with _config_lock:
+        if _config is None:
+            _config = fresh
+        else:
+            _config.clear()
+            _config.update(fresh)
+    return _config
@@ -1,43 +1,183 @@
-from ragas import EvaluationDataset, SingleTurnSample, evaluate
-from ragas.metrics import Faithfulness, AnswerRelevancy, ContextPrecision
-from src.pipeline import run_query_pipeline
-from src.retrieval.retriever import retrieve_documents
+import asyncio
+import hashlib
 import json
-from src.config_loader import load_config
+import os
+import threading
+from src.pipeline import arun_query_pipeline
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
 
-def evaluate_pipeline(eval_dataset:list[dict])->dict:
+# Each evaluation is a job identified by a hash of its dataset. Every answered sample is appended to
+# <checkpoint_directory>/<job id>.jsonl as soon as it completes, so submitting the same dataset again after a
+# crash or restart only queries the samples still missing. The final scores go to <job id>.json and the
+# checkpoint is removed, so the next submission of a finished dataset starts a fresh run.
+_lock = threading.Lock()
+_jobs = {}
+# running job tasks, referenced so the event loop does not garbage-collect them mid-run
+_tasks = set()
+
+
+def _settings() -> dict:
+    return config['evaluation']
+
+
+def job_id(eval_dataset:list[dict]) -> str:
+    return hashlib.sha256(json.dumps(eval_dataset, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _path(job:str, extension:str) -> str:
+    return os.path.join(_settings()['checkpoint_directory'], f"{job}.{extension}")
+
+
+def _load_checkpoint(job:str) -> dict[int, dict]:
+    path = _path(job, "jsonl")
+    if not os.path.exists(path):
+        return {}
+
+    records, truncated = {}, False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                records[record['index']] = record
+            except json.JSONDecodeError:
+                # the last line of a run killed mid-write
+                truncated = True
+    if truncated:
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records.values())
+    return records
+
+
+def _append_checkpoint(job:str, record:dict) -> None:
+    with _lock, open(_path(job, "jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def _update_job(job:str, **fields) -> None:
+    with _lock:
+        _jobs.setdefault(job, {"job_id": job, "status": "running", "total": 0, "completed": 0, "failed": 0, "results": None})
+        _jobs[job].update(fields)
+
+
+def _score_samples(records:list[dict]) -> dict:
+    # ragas is heavy and only needed here, so it is imported on the first evaluation
+    from ragas import EvaluationDataset, SingleTurnSample, evaluate
+    from ragas.metrics import Faithfulness, AnswerRelevancy, ContextPrecision
+
+    samples = [
+        SingleTurnSample(
+            user_input=record['question'],
+            response=record['answer'],
+            retrieved_contexts=record['contexts'],
+            reference=record['ground_truth']
+        )
+        for record in records
+    ]
+    metrics = [Faithfulness(), AnswerRelevancy(), ContextPrecision()]
+    results = evaluate(EvaluationDataset(samples=samples), metrics=metrics)
+    logger.info(f"Evaluation scores: {results}")
+    scores = results.to_pandas()
+    return {metric.name: float(scores[metric.name].mean()) for metric in metrics}
+
+
+async def aevaluate_pipeline(eval_dataset:list[dict], job:str | None = None) -> dict:
+    """Answer every sample (resuming from the job's checkpoint) with bounded concurrency, then score them with RAGAS."""
+    job = job or job_id(eval_dataset)
     try:
-        logger.info(f"Starting evaluation for {len(eval_dataset)} samples")
+        logger.info(f"Starting evaluation job {job} for {len(eval_dataset)} samples")
 
         if not eval_dataset:
             logger.warning("No evaluation dataset provided")
+            _update_job(job, status="failed")
             return {"status": "failed", "results": {}}
-        
-        samples = []
-        for item in eval_dataset:
-            answer = run_query_pipeline(item['question'])
-            contexts = [doc['content'] for doc in retrieve_documents(item['question'])]
-            samples.append(SingleTurnSample(
-                user_input=item['question'],
-                response=answer['answer'],
-                retrieved_contexts=contexts,
-                reference=item['ground_truth']
-            ))
-        
-        metrics = [Faithfulness(), AnswerRelevancy(), ContextPrecision()]
-        dataset = EvaluationDataset(samples=samples)
-        results = evaluate(dataset, metrics=metrics)
-        logger.info(f"Evaluation scores: {json.dumps(str(results), indent=2)}")
 
+        os.makedirs(_settings()['checkpoint_directory'], exist_ok=True)
+        records = _load_checkpoint(job)
+        if records:
+            logger.info(f"Resuming evaluation job {job}: {len(records)} samples restored from checkpoint")
+        _update_job(job, status="running", total=len(eval_dataset), completed=len(records), failed=0)
+
+        semaphore = asyncio.Semaphore(_settings()['concurrency'])
+
+        async def answer(index:int) -> None:
+            item = eval_dataset[index]
+            async with semaphore:
+                # the contexts the answer was generated from are returned with it, so nothing is retrieved twice;
+                # the semantic cache is bypassed so a paraphrase is never scored on another sample's answer
+                result = await arun_query_pipeline(item['question'], return_contexts=True, use_cache=False)
+            if not result['model']:
+                # not checkpointed, so a resumed run retries it
+                logger.warning(f"Evaluation sample {index} was not answered: {result['answer']}")
+                _update_job(job, failed=_jobs[job]['failed'] + 1)
+                return
+            record = {
+                "index": index,
+                "question": item['question'],
+                "ground_truth": item['ground_truth'],
+                "answer": result['answer'],
+                "contexts": result['contexts'],
+            }
+            _append_checkpoint(job, record)
+            records[index] = record
+            _update_job(job, completed=len(records))
+
+        await asyncio.gather(*(answer(i) for i in range(len(eval_dataset)) if i not in records))
+        if not records:
+            raise RuntimeError("no sample could be answered")
+
+        scores = await asyncio.to_thread(_score_samples, [records[i] for i in sorted(records)])
         results_summary = {
-            "scores": results,
-            "num_evaluated_samples": len(samples)
+            "scores": scores,
+            "num_evaluated_samples": len(records),
+            "num_failed_samples": len(eval_dataset) - len(records),
         }
-        
+        with open(_path(job, "json"), "w", encoding="utf-8") as f:
+            json.dump(results_summary, f)
+        os.remove(_path(job, "jsonl"))
+        _update_job(job, status="success", results=results_summary)
+        logger.info(f"Evaluation job {job} finished")
+
         return {"status": "success", "results": results_summary}
     except Exception as e:
         logger.error(f"Evaluation pipeline failed: {e}")
-        return {"status": "failed", "results": {}}
\ No newline at end of file
+        _update_job(job, status="failed")
+        return {"status": "failed", "results": {}}
+
+
+def evaluate_pipeline(eval_dataset:list[dict]) -> dict:
+    """Blocking evaluation for scripts; the API runs the same thing as a background job."""
+    return asyncio.run(aevaluate_pipeline(eval_dataset))
+
+
+def start_evaluation_job(eval_dataset:list[dict]) -> dict:
+    """Start, or resume from its checkpoint, evaluation of `eval_dataset` on the running event loop; returns the job."""
+    job = job_id(eval_dataset)
+    with _lock:
+        running = _jobs.get(job, {}).get('status') == "running"
+    if not running:
+        _update_job(job, status="running", total=len(eval_dataset), completed=0, failed=0, results=None)
+        task = asyncio.get_running_loop().create_task(aevaluate_pipeline(eval_dataset, job))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return get_evaluation_job(job)
+
+
+def get_evaluation_job(job:str) -> dict | None:
+    """Progress of a job started in this process, or what is on disk for one run by an earlier process."""
+    with _lock:
+        if job in _jobs:
+            return dict(_jobs[job])
+
+    if os.path.exists(_path(job, "json")):
+        with open(_path(job, "json"), encoding="utf-8") as f:
+            results = json.load(f)
+        return {"job_id": job, "status": "success", "total": results['num_evaluated_samples'] + results['num_failed_samples'],
+                "completed": results['num_evaluated_samples'], "failed": results['num_failed_samples'], "results": results}
+    if os.path.exists(_path(job, "jsonl")):
+        # submit the same dataset again to resume it
+        completed = len(_load_checkpoint(job))
+        return {"job_id": job, "status": "interrupted", "total": None, "completed": completed, "failed": 0, "results": None}
+    return None
@@ -0,0 +1,146 @@
+import re
+from src.ingestion.embedding_scheduler import count_tokens
+from src.metrics import observe, annotate_trace, TOKEN_BUCKETS
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# Packs reranked chunks into the prompt context. Neighbouring chunks of one page of a source repeat up to
+# `chunking.chunk_overlap` characters of each other, so they are merged into one passage with the overlap
+# written once; passages that mostly repeat a better-scored one are dropped; what is left is added in score
+# order until `context.max_tokens` is reached.
+
+_WORD = re.compile(r"\w+")
+# shorter matches between neighbouring chunks are more likely coincidence than real overlap
+_MIN_OVERLAP = 8
+# generous, so an overlap measured in tokens is never cut short
+_CHARS_PER_TOKEN = 8
+
+
+def _settings() -> dict:
+    return config['context']
+
+
+def _overlap(previous:str, following:str, limit:int) -> int:
+    """Length of the longest suffix of `previous` that `following` starts with, up to `limit` characters."""
+    for size in range(min(limit, len(previous), len(following)), _MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+
+def _position(metadata:dict) -> tuple | None:
+    """The (source, page) a chunk's index counts within, or None if its neighbours can't be told.
+
+    Chunk indices restart on every loaded document, i.e. on every PDF page. Chunks indexed before `page` was
+    stored can only be placed when their file was loaded as a single document.
+    """
+    if metadata.get('chunk_index') is None:
+        return None
+    if metadata.get('page') is None and metadata.get('num_pages', 1) > 1:
+        return None
+    return metadata.get('source'), metadata.get('page')
+
+
+def _merge_adjacent(documents:list[dict]) -> list[dict]:
+    # overlap is at most chunk_overlap characters (or tokens), plus whitespace the splitter trims at the boundary
+    chars_per_unit = _CHARS_PER_TOKEN if config['chunking']['length_unit'] == "tokens" else 1
+    limit = config['chunking']['chunk_overlap'] * chars_per_unit + 16
+    unique = {}
+    for doc in documents:
+        # the same chunk twice, e.g. from both dense and lexical retrieval, is recognised by its point id
+        key = doc.get('id') or doc['content']
+        if key in unique:
+            unique[key]['score'] = max(unique[key]['score'], doc['score'])
+        else:
+            unique[key] = dict(doc)
+
+    passages, by_position = [], {}
+    for doc in unique.values():
+        position = _position(doc['metadata'])
+        if position is None:
+            passages.append({**doc, "chunks": [doc['metadata'].get('chunk_index')]})
+            continue
+        by_position.setdefault(position, []).append(doc)
+
+    for docs in by_position.values():
+        docs.sort(key=lambda doc: doc['metadata']['chunk_index'])
+        run = None
+        for doc in docs:
+            index = doc['metadata']['chunk_index']
+            if run is not None and index == run['chunks'][-1] + 1:
+                size = _overlap(run['content'], doc['content'], limit)
+                run['content'] = run['content'] + (doc['content'][size:] if size else "\n" + doc['content'])
+                run['chunks'].append(index)
+                run['score'] = max(run['score'], doc['score'])
+            else:
+                run = {**doc, "chunks": [index]}
+                passages.append(run)
+    return passages
+
+
+def _truncate(text:str, budget:int) -> str:
+    """Longest prefix of `text` that count_tokens puts within `budget`."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def _shingles(text:str) -> set:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def _drop_near_duplicates(passages:list[dict], threshold:float) -> list[dict]:
+    kept = []
+    for passage in passages:
+        shingles = _shingles(passage['content'])
+        if any(len(shingles & other) >= threshold * len(shingles | other) for _, other in kept):
+            continue
+        kept.append((passage, shingles))
+    return [passage for passage, _ in kept]
+
+
+def assemble_context(documents:list[dict]) -> list[dict]:
+    """Merge, deduplicate and budget reranked documents into the passages the prompt is built from.
+
+    Passages keep the document shape ("content", "metadata", "score") in score order; merged passages list
+    their chunk indices in metadata["chunk_indices"].
+    """
+    if not documents or not _settings()['enabled']:
+        return documents
+
+    input_tokens = sum(count_tokens(doc['content']) for doc in documents)
+    if _settings()['merge_adjacent']:
+        passages = _merge_adjacent(documents)
+    else:
+        passages = [{**doc, "chunks": [doc['metadata'].get('chunk_index')]} for doc in documents]
+    passages.sort(key=lambda passage: passage['score'], reverse=True)
+    passages = _drop_near_duplicates(passages, _settings()['dedupe_threshold'])
+
+    packed, context_tokens = [], 0
+    for passage in passages:
+        tokens = count_tokens(passage['content'])
+        if context_tokens + tokens > _settings()['max_tokens']:
+            if packed:
+                continue
+            # the best passage alone is over budget: keep its beginning rather than send no context
+            passage = {**passage, "content": _truncate(passage['content'], _settings()['max_tokens'] - context_tokens)}
+            tokens = count_tokens(passage['content'])
+        chunks = passage.pop('chunks')
+        metadata = dict(passage['metadata'], chunk_indices=chunks) if len(chunks) > 1 else passage['metadata']
+        packed.append({**passage, "metadata": metadata})
+        context_tokens += tokens
+
+    saved = input_tokens - context_tokens
+    observe("rag_context_tokens", context_tokens, TOKEN_BUCKETS, kind="packed")
+    observe("rag_context_tokens", saved, TOKEN_BUCKETS, kind="saved")
+    annotate_trace(context_tokens=context_tokens, context_tokens_saved=saved)
+    logger.debug(f"Packed {len(documents)} documents into {len(packed)} passages: {context_tokens} tokens, {saved} saved.")
+    return packed
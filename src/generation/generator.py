@@ -1,23 +1,13 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from src.config_loader import load_config
+from src.clients import get_llm
+from src.metrics import record_tokens
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
 
 
-def generate_response(query:str, documents:list[dict]) -> dict:
-    if not query:
-        logger.warning("No query provided")
-        return {"answer": "", "sources": [], "model": config['llm']['model_name']}
-
-    if not documents:
-        logger.warning("No documents provided")
-        return {
-            "answer": "I don't have enough context to answer this question.",
-            "sources": [],
-            "model": config['llm']['model_name']
-        }
+def _build_messages(query:str, documents:list[dict]) -> list:
+    from langchain_core.messages import SystemMessage, HumanMessage
 
     # For simplicity, we will just concatenate the retrieved documents and use them as context for the response.
     # In a real implementation, you would likely want to use a more sophisticated approach to generate the response.
@@ -25,7 +15,7 @@ def generate_response(query:str, documents:list[dict]) -> dict:
     for i, doc in enumerate(documents):
         context += f"[{i+1}] {doc['content']}\n\n"
 
-    system_prompt = """You are a helpful assistant. 
+    system_prompt = """You are a helpful assistant.
     Answer the question using ONLY the provided context.
     If the answer is not in the context, say 'I don't know based on the provided documents.'"""
 
@@ -34,26 +24,88 @@ def generate_response(query:str, documents:list[dict]) -> dict:
 
     Question: {query}"""
 
-    llm = ChatOpenAI(
-        model=config['llm']['model_name'],
-        openai_api_key=config['credentials']['openai_api_key'],
-        temperature=config['llm']['temperature']
-    )
-
-    messages = [
+    return [
         SystemMessage(content=system_prompt),
         HumanMessage(content=human_prompt)
     ]
-    logger.info(f"Generating response for query: {query[:50]}...")
-    response = llm.invoke(messages)
 
-    logger.info(f"Response generated — length: {len(response.content)} characters")
-    
+
+def _empty_response(query:str, documents:list[dict]) -> dict | None:
+    if not query:
+        logger.warning("No query provided")
+        return {"answer": "", "sources": [], "model": config['llm']['model_name']}
+
+    if not documents:
+        logger.warning("No documents provided")
+        return {
+            "answer": "I don't have enough context to answer this question.",
+            "sources": [],
+            "model": config['llm']['model_name']
+        }
+
+    return None
+
+
+def _to_response(answer:str, documents:list[dict]) -> dict:
+    logger.debug(f"Response generated — length: {len(answer)} characters")
+
     # deduplicate sources
     sources = list(set([doc['metadata']['source'] for doc in documents]))
 
     return {
-        "answer": response.content,
+        "answer": answer,
         "sources": sources,
         "model": config['llm']['model_name']
     }
+
+
+def _record_usage(message) -> None:
+    # LangChain chat models report token usage on the message, when the provider returns it
+    usage = getattr(message, "usage_metadata", None) or {}
+    record_tokens("input", usage.get("input_tokens", 0))
+    record_tokens("output", usage.get("output_tokens", 0))
+
+
+def generate_response(query:str, documents:list[dict]) -> dict:
+    empty = _empty_response(query, documents)
+    if empty is not None:
+        return empty
+
+    llm = get_llm()
+    messages = _build_messages(query, documents)
+    logger.debug(f"Generating response for query: {query[:50]}...")
+    response = llm.invoke(messages)
+    _record_usage(response)
+
+    return _to_response(response.content, documents)
+
+
+async def agenerate_response(query:str, documents:list[dict]) -> dict:
+    empty = _empty_response(query, documents)
+    if empty is not None:
+        return empty
+
+    llm = get_llm()
+    messages = _build_messages(query, documents)
+    logger.debug(f"Generating response for query: {query[:50]}...")
+    response = await llm.ainvoke(messages)
+    _record_usage(response)
+
+    return _to_response(response.content, documents)
+
+
+async def astream_response(query:str, documents:list[dict]):
+    """Yield the answer token by token. Falls back to a single chunk when there is nothing to generate from."""
+    empty = _empty_response(query, documents)
+    if empty is not None:
+        if empty['answer']:
+            yield empty['answer']
+        return
+
+    llm = get_llm()
+    messages = _build_messages(query, documents)
+    logger.debug(f"Streaming response for query: {query[:50]}...")
+    async for chunk in llm.astream(messages):
+        _record_usage(chunk)
+        if chunk.content:
+            yield chunk.content
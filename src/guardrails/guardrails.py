@@ -1,11 +1,11 @@
-from src.config_loader import load_config
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
 
 
 def validate_query(query:str) -> tuple[bool, str]:
-    logger.info(f"Validating query: {query[:50]}...")
+    logger.debug(f"Validating query: {query[:50]}...")
     if not query:
         return False, "Query cannot be empty."
     
@@ -24,7 +24,7 @@ def validate_query(query:str) -> tuple[bool, str]:
 
 
 def validate_response(response: dict) -> tuple[bool, str]:
-    logger.info("Validating response...")
+    logger.debug("Validating response...")
 
     # Check 1 — empty answer
     if not response.get('answer'):
@@ -0,0 +1,50 @@
+import sqlite3
+
+# Retrieval filters are plain dicts with any of these keys (a missing, None or empty value doesn't filter):
+#   sources          - payload `source` values, i.e. file paths as they were ingested
+#   file_types       - payload `file_type` values ("pdf", "md", "txt")
+#   ingested_after   - unix seconds; keeps chunks whose payload `ingested_at` is at or after it
+#   ingested_before  - unix seconds; keeps chunks whose payload `ingested_at` is at or before it
+# Qdrant turns them into a payload filter; the local vector store and the BM25 index into SQL over the JSON
+# payloads in their SQLite tables. Chunks ingested before `ingested_at` was recorded never match a date bound.
+
+# payload fields with an index in every backend, so filtering on them doesn't scan all payloads
+INDEXED_FIELDS = ("file_type", "ingested_at")
+
+
+def sql_condition(filters:dict | None) -> tuple[str, list]:
+    """WHERE clause (and its parameters) over a table with `source` and JSON `payload` columns."""
+    filters = filters or {}
+    clauses, params = [], []
+    for key, column in (("sources", "source"), ("file_types", "json_extract(payload, '$.file_type')")):
+        if filters.get(key):
+            clauses.append(f"{column} IN ({','.join('?' * len(filters[key]))})")
+            params += list(filters[key])
+    if filters.get('ingested_after') is not None:
+        clauses.append("json_extract(payload, '$.ingested_at') >= ?")
+        params.append(filters['ingested_after'])
+    if filters.get('ingested_before') is not None:
+        clauses.append("json_extract(payload, '$.ingested_at') <= ?")
+        params.append(filters['ingested_before'])
+    return " AND ".join(clauses) or "1", params
+
+
+def is_filtered(filters:dict | None) -> bool:
+    return sql_condition(filters)[0] != "1"
+
+
+def create_indexes(db:sqlite3.Connection, table:str) -> None:
+    for field in INDEXED_FIELDS:
+        db.execute(f"CREATE INDEX IF NOT EXISTS {table}_{field} ON {table} (json_extract(payload, '$.{field}'))")
+
+
+def matching_rows(db:sqlite3.Connection, table:str, row_column:str, filters:dict) -> list[int]:
+    condition, params = sql_condition(filters)
+    return [row for row, in db.execute(f"SELECT {row_column} FROM {table} WHERE {condition}", params)]
+
+
+def select_fields(payload:dict, fields:list[str] | None) -> dict:
+    """Only the requested payload fields; all of them when `fields` is None."""
+    if fields is None:
+        return payload
+    return {field: payload[field] for field in fields if field in payload}
@@ -0,0 +1,462 @@
+import asyncio
+import json
+import math
+import os
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from src.indexing.filters import create_indexes, is_filtered, matching_rows, select_fields
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# Embedded vector store, one directory per collection:
+#   vectors.bin  - memory-mapped float32/float16 matrix of unit-normalised vectors, one row per point
+#   points.db    - SQLite table mapping row -> point id, source and JSON payload (only live points)
+#   short.bin    - optional Matryoshka prefix of each vector (first `short_dim` dimensions, renormalised)
+#   codes.bin    - optional quantized copy of the scanned vectors: int8 ("scalar") or packed sign bits ("binary")
+#   meta.json    - vector dimension, dtype, short dimension, quantization mode and scale, and rows in use
+#   ivf.npz      - optional IVF index: centroids and the list each row was assigned to; rows written again
+#                  after the build are moved to their new nearest list
+# Vectors are normalised on write, so cosine similarity is a dot product. Collections below
+# `ann_threshold` points are searched exactly in row blocks; larger ones probe the nearest IVF
+# lists plus any rows added since the index was built. With a short vector and/or quantization,
+# candidates are picked on the short vectors or the codes and the best `limit x oversampling` of
+# them are rescored with the original full vectors.
+_lock = threading.Lock()
+_stores = {}
+# during a bulk load (one ingest) the IVF index is rebuilt once at the end instead of after every upsert
+_bulk = {"active": False}
+
+_BLOCK_ROWS = 8192
+_INITIAL_ROWS = 1024
+_KMEANS_ITERATIONS = 10
+# rebuild the IVF index once this fraction of rows was added or rewritten after it was built
+_REBUILD_FRACTION = 0.2
+# sources per `IN (...)` query, well below SQLite's bound-parameter limit
+_SQL_BATCH = 500
+
+
+def _settings() -> dict:
+    return config['vector_store']['local']
+
+
+def _in_memory() -> bool:
+    return _settings()['path'] == ":memory:"
+
+
+def _normalise(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _open_matrix(store:dict, name:str, dtype, columns:int, rows:int) -> np.ndarray:
+    old = store.get(name)
+    if store['directory'] is None:
+        matrix = np.zeros((rows, columns), dtype=dtype)
+        if old is not None:
+            matrix[:len(old)] = old
+        return matrix
+
+    path = os.path.join(store['directory'], f"{name}.bin")
+    size = rows * columns * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    if old is not None:
+        old.flush()
+    return np.memmap(path, dtype=dtype, mode="r+", shape=(rows, columns))
+
+
+def _scanned_dim(store:dict) -> int:
+    return store['short_dim'] or store['dim']
+
+
+def _allocate(store:dict, rows:int) -> None:
+    store['vectors'] = _open_matrix(store, "vectors", store['dtype'], store['dim'], rows)
+    if store['short_dim']:
+        store['short'] = _open_matrix(store, "short", store['dtype'], store['short_dim'], rows)
+    if store['quantization'] == "scalar":
+        store['codes'] = _open_matrix(store, "codes", np.int8, _scanned_dim(store), rows)
+    elif store['quantization'] == "binary":
+        store['codes'] = _open_matrix(store, "codes", np.uint8, (_scanned_dim(store) + 7) // 8, rows)
+
+    alive = np.zeros(rows, dtype=bool)
+    alive[:len(store['alive'])] = store['alive']
+    store['alive'] = alive
+
+
+def _open_db(path:str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("CREATE TABLE IF NOT EXISTS points (row INTEGER PRIMARY KEY, id TEXT UNIQUE, source TEXT, payload TEXT)")
+    db.execute("CREATE INDEX IF NOT EXISTS points_source ON points (source)")
+    create_indexes(db, "points")
+    db.commit()
+    return db
+
+
+def _get_store(create_dim:int | None = None) -> dict | None:
+    collection = config['vector_store']['collection_name']
+    key = (_settings()['path'], collection)
+    if key in _stores:
+        return _stores[key]
+
+    directory = None if _in_memory() else os.path.join(_settings()['path'], collection)
+    meta_path = None if directory is None else os.path.join(directory, "meta.json")
+    if meta_path is not None and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    elif create_dim is not None:
+        matryoshka = config['vector_store']['matryoshka']
+        meta = {"dim": create_dim, "dtype": _settings()['dtype'], "rows": 0,
+                "short_dim": matryoshka['dim'] if matryoshka['enabled'] and matryoshka['dim'] < create_dim else 0,
+                "quantization": config['vector_store']['quantization']['mode'], "scale": None}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        logger.info(f"Local collection '{collection}' created.")
+    else:
+        return None
+
+    store = {
+        "directory": directory, "dim": meta['dim'], "dtype": np.dtype(meta['dtype']), "rows": meta['rows'],
+        "short_dim": meta.get("short_dim", 0), "quantization": meta.get("quantization", "none"),
+        "scale": meta.get("scale"), "vectors": None, "short": None, "codes": None, "alive": np.zeros(0, dtype=bool), "ids": {}, "free": [], "ivf": None,
+        "db": _open_db(":memory:" if directory is None else os.path.join(directory, "points.db")),
+    }
+    _allocate(store, max(store['rows'], _INITIAL_ROWS))
+    for row, point_id in store['db'].execute("SELECT row, id FROM points"):
+        store['ids'][point_id] = row
+        store['alive'][row] = True
+    store['free'] = [int(row) for row in np.flatnonzero(~store['alive'][:store['rows']])]
+
+    ivf_path = None if directory is None else os.path.join(directory, "ivf.npz")
+    if ivf_path is not None and os.path.exists(ivf_path):
+        ivf = np.load(ivf_path)
+        store['ivf'] = _ivf_from_assignment(ivf['centroids'], ivf['assignment'], int(ivf['stale']))
+
+    _stores[key] = store
+    return store
+
+
+def _save_meta(store:dict) -> None:
+    if store['directory'] is None:
+        return
+    for name in ("vectors", "short", "codes"):
+        if store[name] is not None:
+            store[name].flush()
+    with open(os.path.join(store['directory'], "meta.json"), "w") as f:
+        json.dump({"dim": store['dim'], "dtype": store['dtype'].name, "rows": store['rows'],
+                   "short_dim": store['short_dim'], "quantization": store['quantization'],
+                   "scale": store['scale']}, f)
+
+
+def _ivf_from_assignment(centroids:np.ndarray, assignment:np.ndarray, stale:int) -> dict:
+    order = np.argsort(assignment, kind="stable")
+    bounds = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+    lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+    return {"centroids": centroids, "assignment": assignment, "lists": lists,
+            "built_rows": len(assignment), "stale": stale, "dirty": False}
+
+
+def _save_ivf(store:dict) -> None:
+    ivf = store['ivf']
+    ivf['dirty'] = False
+    if store['directory'] is None:
+        return
+    path = os.path.join(store['directory'], "ivf.npz")
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(f, centroids=ivf['centroids'], assignment=ivf['assignment'], stale=ivf['stale'])
+    os.replace(f"{path}.tmp", path)
+
+
+def _reassign(store:dict, rows:list[int], vectors:np.ndarray) -> None:
+    # a reused or rewritten row below `built_rows` is only found through its list, so it is moved to the
+    # list of its new vector's nearest centroid
+    ivf = store['ivf']
+    inside = np.asarray(rows) < ivf['built_rows']
+    if not inside.any():
+        return
+    nearest = np.argmax(vectors[inside] @ ivf['centroids'].T, axis=1)
+    for row, new in zip(np.asarray(rows)[inside], nearest):
+        old = ivf['assignment'][row]
+        if old == new:
+            continue
+        if old >= 0:
+            ivf['lists'][old] = ivf['lists'][old][ivf['lists'][old] != row]
+        ivf['lists'][new] = np.append(ivf['lists'][new], row)
+        ivf['assignment'][row] = new
+    ivf['stale'] += int(inside.sum())
+    ivf['dirty'] = True
+
+
+def _build_ivf(store:dict) -> None:
+    live_rows = np.flatnonzero(store['alive'][:store['rows']])
+    n_lists = min(len(live_rows), _settings()['ivf_lists'] or max(1, int(np.sqrt(len(live_rows)))))
+    rng = np.random.default_rng(0)
+    sample_rows = np.sort(rng.choice(live_rows, size=min(len(live_rows), n_lists * 64), replace=False))
+    sample = np.asarray(store['vectors'][sample_rows], dtype=np.float32)
+
+    # spherical k-means on a sample
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+    for _ in range(_KMEANS_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = sample[labels == i]
+            centroids[i] = members.sum(axis=0) if len(members) else sample[rng.integers(len(sample))]
+        centroids = _normalise(centroids)
+
+    assignment = np.full(store['rows'], -1, dtype=np.int32)
+    for start in range(0, store['rows'], _BLOCK_ROWS):
+        end = min(start + _BLOCK_ROWS, store['rows'])
+        block = np.asarray(store['vectors'][start:end], dtype=np.float32)
+        assignment[start:end] = np.argmax(block @ centroids.T, axis=1)
+    assignment[~store['alive'][:store['rows']]] = -1
+
+    store['ivf'] = _ivf_from_assignment(centroids, assignment, 0)
+    _save_ivf(store)
+    logger.info(f"Built IVF index with {n_lists} lists over {len(live_rows)} vectors.")
+
+
+def _maybe_rebuild_ivf(store:dict) -> None:
+    live = int(store['alive'][:store['rows']].sum())
+    if live < _settings()['ann_threshold']:
+        store['ivf'] = None
+        return
+    ivf = store['ivf']
+    if ivf is None or (store['rows'] - ivf['built_rows'] + ivf['stale']) > _REBUILD_FRACTION * ivf['built_rows']:
+        _build_ivf(store)
+    elif ivf['dirty']:
+        _save_ivf(store)
+
+
+def _encode(store:dict, vectors:np.ndarray) -> np.ndarray:
+    if store['quantization'] == "scalar":
+        if store['scale'] is None:
+            # calibrated once on the first batch: the 0.99 quantile of |component| maps to 127
+            store['scale'] = float(np.quantile(np.abs(vectors), 0.99)) or 1.0
+        return np.clip(np.rint(vectors * (127 / store['scale'])), -127, 127).astype(np.int8)
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _coarse_scores(store:dict, index, queries:np.ndarray) -> np.ndarray:
+    """Scores used to pick candidates, one column per query: exact cosine on the full vectors, an approximation of it otherwise.
+
+    `queries` holds the normalised queries cut to the scanned dimension, one per column.
+    """
+    if store['quantization'] == "scalar":
+        return (np.asarray(store['codes'][index], dtype=np.float32) @ queries) * (store['scale'] / 127)
+    if store['quantization'] == "binary":
+        codes = store['codes'][index]
+        hamming = np.stack([
+            np.bitwise_count(codes ^ np.packbits(query > 0)).sum(axis=1, dtype=np.int32) for query in queries.T
+        ], axis=1)
+        return 1 - 2 * hamming / len(queries)
+    matrix = store['short'] if store['short_dim'] else store['vectors']
+    return np.asarray(matrix[index], dtype=np.float32) @ queries
+
+
+def _top_k(rows:np.ndarray, scores:np.ndarray, limit:int) -> tuple[np.ndarray, np.ndarray]:
+    if len(scores) > limit:
+        keep = np.argpartition(-scores, limit)[:limit]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+def _exact_candidates(store:dict, coarse_queries:np.ndarray, limit:int, searchable:np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+    # every block is read once and scored against all queries in a single matrix product
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+    best = [empty] * len(coarse_queries)
+    for start in range(0, store['rows'], _BLOCK_ROWS):
+        end = min(start + _BLOCK_ROWS, store['rows'])
+        alive = searchable[start:end]
+        rows = np.arange(start, end)[alive]
+        scores = _coarse_scores(store, slice(start, end), coarse_queries.T)[alive]
+        for i, column in enumerate(scores.T):
+            block_rows, block_scores = _top_k(rows, column, limit)
+            best[i] = _top_k(np.concatenate([best[i][0], block_rows]), np.concatenate([best[i][1], block_scores]), limit)
+    return best
+
+
+def _ivf_candidates(store:dict, query:np.ndarray, coarse_query:np.ndarray, limit:int, searchable:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    ivf = store['ivf']
+    probes = np.argsort(-(ivf['centroids'] @ query))[:_settings()['ivf_probes']]
+    # rows appended after the build are not in any list yet, so they are always scanned
+    rows = np.concatenate([ivf['lists'][i] for i in probes] + [np.arange(ivf['built_rows'], store['rows'])])
+    rows = np.sort(rows[searchable[rows]])
+    return _top_k(rows, _coarse_scores(store, rows, coarse_query[:, None])[:, 0], limit)
+
+
+def _payloads(store:dict, rows:list[int], fields:list[str] | None) -> dict:
+    placeholders = ",".join("?" * len(rows))
+    return {
+        row: (point_id, select_fields(json.loads(payload), fields))
+        for row, point_id, payload in store['db'].execute(
+            f"SELECT row, id, payload FROM points WHERE row IN ({placeholders})", rows
+        )
+    }
+
+
+def collection_exists() -> bool:
+    with _lock:
+        return _get_store() is not None
+
+
+def upsert_points(ids:list[str], vectors:np.ndarray, payloads:list[dict]) -> None:
+    with _lock:
+        vectors = _normalise(vectors)
+        store = _get_store(create_dim=vectors.shape[1])
+        short = _normalise(vectors[:, :store['short_dim']]) if store['short_dim'] else None
+        codes = None if store['codes'] is None else _encode(store, vectors if short is None else short)
+
+        rows, records = [], []
+        for id_, payload in zip(ids, payloads):
+            row = store['ids'].get(id_)
+            if row is None:
+                if store['free']:
+                    row = store['free'].pop()
+                else:
+                    row = store['rows']
+                    store['rows'] += 1
+                    if row >= len(store['alive']):
+                        _allocate(store, len(store['alive']) * 2)
+                store['ids'][id_] = row
+            rows.append(row)
+            records.append((row, id_, payload.get("source"), json.dumps(payload)))
+
+        store['vectors'][rows] = vectors
+        if short is not None:
+            store['short'][rows] = short
+        if codes is not None:
+            store['codes'][rows] = codes
+        store['alive'][rows] = True
+        if store['ivf'] is not None:
+            _reassign(store, rows, vectors)
+        store['db'].executemany("INSERT OR REPLACE INTO points (row, id, source, payload) VALUES (?, ?, ?, ?)", records)
+        store['db'].commit()
+        _save_meta(store)
+        if not _bulk['active']:
+            _maybe_rebuild_ivf(store)
+
+
+def begin_bulk_load() -> None:
+    with _lock:
+        if _bulk['active']:
+            raise RuntimeError("A bulk load is already in progress")
+        _bulk['active'] = True
+
+
+def finish_bulk_load() -> None:
+    with _lock:
+        if not _bulk['active']:
+            return
+        _bulk['active'] = False
+        store = _get_store()
+        if store is not None:
+            _maybe_rebuild_ivf(store)
+
+
+def delete_by_sources(sources:list[str]) -> None:
+    with _lock:
+        store = _get_store()
+        if store is None:
+            return
+
+        for start in range(0, len(sources), _SQL_BATCH):
+            part = sources[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            deleted = store['db'].execute(f"SELECT row, id FROM points WHERE source IN ({placeholders})", part).fetchall()
+            for row, point_id in deleted:
+                store['alive'][row] = False
+                store['ids'].pop(point_id, None)
+                store['free'].append(row)
+            store['db'].execute(f"DELETE FROM points WHERE source IN ({placeholders})", part)
+        store['db'].commit()
+
+
+def _searchable(store:dict, filters:dict | None) -> np.ndarray:
+    if not is_filtered(filters):
+        return store['alive']
+    searchable = np.zeros_like(store['alive'])
+    searchable[matching_rows(store['db'], "points", "row", filters)] = True
+    return searchable
+
+
+def search(vector:list[float], limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[dict]:
+    return search_batch([vector], limit, filters, fields)[0]
+
+
+def search_batch(vectors:list[list[float]], limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[list[dict]]:
+    """Search several query vectors in one pass over the index; returns one hit list per vector, in order.
+
+    Only points matching `filters` are scored; hits carry just the payload `fields` (all when None). With an
+    IVF index a filtered search only sees the matching points in the probed lists.
+    """
+    if not vectors:
+        return []
+
+    with _lock:
+        store = _get_store()
+        if store is None:
+            logger.warning(f"Collection '{config['vector_store']['collection_name']}' does not exist.")
+            return [[] for _ in vectors]
+
+        queries = _normalise(vectors)
+        coarse_queries = _normalise(queries[:, :store['short_dim']]) if store['short_dim'] else queries
+        quantization = config['vector_store']['quantization']
+        quantized = store['quantization'] != "none"
+        candidates = limit
+        if quantized:
+            candidates *= quantization['oversampling']
+        if store['short_dim']:
+            candidates *= config['vector_store']['matryoshka']['oversampling']
+        candidates = math.ceil(candidates)
+        searchable = _searchable(store, filters)
+        if store['ivf'] is not None:
+            found = [_ivf_candidates(store, query, coarse, candidates, searchable) for query, coarse in zip(queries, coarse_queries)]
+        else:
+            found = _exact_candidates(store, coarse_queries, candidates, searchable)
+
+        results = []
+        for query, (rows, scores) in zip(queries, found):
+            if store['short_dim'] or (quantized and quantization['rescore']):
+                rows = np.sort(rows)
+                rows, scores = _top_k(rows, np.asarray(store['vectors'][rows], dtype=np.float32) @ query, limit)
+            rows = [int(row) for row in rows[:limit]]
+            payloads = _payloads(store, rows, fields) if rows else {}
+            results.append([
+                {"id": payloads[row][0], "score": float(score), "payload": payloads[row][1]}
+                for row, score in zip(rows, scores)
+            ])
+        return results
+
+
+async def asearch(vector:list[float], limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[dict]:
+    # an exact scan can cover tens of thousands of rows, so it runs on a worker thread instead of the event loop
+    return await asyncio.to_thread(search, vector, limit, filters, fields)
+
+
+async def asearch_batch(vectors:list[list[float]], limit:int, filters:dict | None = None,
+                        fields:list[str] | None = None) -> list[list[dict]]:
+    return await asyncio.to_thread(search_batch, vectors, limit, filters, fields)
+
+
+def drop_collection() -> None:
+    with _lock:
+        store = _get_store()
+        if store is None:
+            return
+        store['db'].close()
+        del _stores[(_settings()['path'], config['vector_store']['collection_name'])]
+        if store['directory'] is not None:
+            shutil.rmtree(store['directory'])
+
+
+def count() -> int:
+    with _lock:
+        store = _get_store()
+        return 0 if store is None else len(store['ids'])
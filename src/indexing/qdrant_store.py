@@ -0,0 +1,379 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.clients import get_qdrant_client, get_async_qdrant_client
+from src.metrics import record_error
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# Between begin_bulk_load() and finish_bulk_load() (one ingest) writes may skip waiting for Qdrant to apply
+# them; `barrier` is the last request sent, which finish_bulk_load() re-sends with wait=True.
+_bulk = {"active": False, "barrier": None}
+_bulk_lock = threading.Lock()
+
+# Whether a collection has "full"/"short" named vectors is fixed when it is created, like the local store's
+# meta.json: the short dimension (0 for a single unnamed vector) is read from the collection's schema once per
+# collection, so toggling `matryoshka` later doesn't break upserts and searches against an existing collection.
+_short_dims = {}
+
+
+def _collection() -> str:
+    return config['vector_store']['collection_name']
+
+
+def _to_hits(points) -> list[dict]:
+    return [{"id": str(point.id), "score": point.score, "payload": point.payload} for point in points]
+
+
+def _quantization_config():
+    from qdrant_client.models import (
+        ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig
+    )
+
+    # quantized vectors are what the search scans, so they always stay in RAM
+    mode = config['vector_store']['quantization']['mode']
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _search_params():
+    from qdrant_client.models import SearchParams, QuantizationSearchParams
+
+    quantization = config['vector_store']['quantization']
+    if quantization['mode'] == "none":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        rescore=quantization['rescore'], oversampling=quantization['oversampling']
+    ))
+
+
+def _short_dim(size:int) -> int:
+    """Short dimension for a new collection of `size`-dimension vectors, from the config."""
+    matryoshka = config['vector_store']['matryoshka']
+    return matryoshka['dim'] if matryoshka['enabled'] and matryoshka['dim'] < size else 0
+
+
+def _schema_short_dim(info) -> int:
+    vectors = info.config.params.vectors
+    short_dim = vectors['short'].size if isinstance(vectors, dict) and "short" in vectors else 0
+    if bool(short_dim) != config['vector_store']['matryoshka']['enabled']:
+        logger.warning(f"Collection '{_collection()}' was created {'with' if short_dim else 'without'} Matryoshka "
+                       f"short vectors; the matryoshka setting only applies after it is dropped and re-ingested.")
+    return short_dim
+
+
+def _collection_short_dim(client) -> int:
+    if _collection() not in _short_dims:
+        _short_dims[_collection()] = _schema_short_dim(client.get_collection(_collection()))
+    return _short_dims[_collection()]
+
+
+async def _acollection_short_dim(client) -> int:
+    if _collection() not in _short_dims:
+        _short_dims[_collection()] = _schema_short_dim(await client.get_collection(_collection()))
+    return _short_dims[_collection()]
+
+
+def _shorten(vector:list[float], dim:int) -> list[float]:
+    head = vector[:dim]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def _shorten_rows(vectors:np.ndarray, dim:int) -> np.ndarray:
+    head = vectors[:, :dim]
+    norms = np.linalg.norm(head, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return head / norms
+
+
+def _query_filter(filters:dict | None):
+    """The Qdrant payload filter for retrieval filters (see src/indexing/filters.py), or None."""
+    from qdrant_client.models import Filter, FieldCondition, MatchAny, Range
+
+    filters = filters or {}
+    conditions = []
+    for key, field in (("sources", "source"), ("file_types", "file_type")):
+        if filters.get(key):
+            conditions.append(FieldCondition(key=field, match=MatchAny(any=list(filters[key]))))
+    if filters.get('ingested_after') is not None or filters.get('ingested_before') is not None:
+        conditions.append(FieldCondition(key="ingested_at", range=Range(
+            gte=filters.get('ingested_after'), lte=filters.get('ingested_before')
+        )))
+    return Filter(must=conditions) if conditions else None
+
+
+def _query_args(vector:list[float], limit:int, short_dim:int, filters:dict | None = None,
+                fields:list[str] | None = None) -> dict:
+    query_filter = _query_filter(filters)
+    with_payload = True if fields is None else fields
+    if not short_dim:
+        return {"query": vector, "limit": limit, "search_params": _search_params(), "query_filter": query_filter,
+                "with_payload": with_payload}
+
+    from qdrant_client.models import Prefetch
+
+    # coarse pass on the short vectors, then exact rescoring of those candidates with the full vectors;
+    # the filter goes on the coarse pass, so the candidates it picks all match
+    return {
+        "prefetch": Prefetch(
+            query=_shorten(vector, short_dim), using="short", params=_search_params(), filter=query_filter,
+            limit=math.ceil(limit * config['vector_store']['matryoshka']['oversampling']),
+        ),
+        "query": vector, "using": "full", "limit": limit, "query_filter": query_filter, "with_payload": with_payload,
+    }
+
+
+def _batch_requests(vectors:list[list[float]], limit:int, short_dim:int, filters:dict | None = None,
+                    fields:list[str] | None = None) -> list:
+    from qdrant_client.models import QueryRequest
+
+    requests = []
+    for vector in vectors:
+        args = _query_args(vector, limit, short_dim, filters, fields)
+        # query_points takes `search_params` and `query_filter`, a batched QueryRequest calls them `params` and `filter`
+        args['params'] = args.pop('search_params', None)
+        args['filter'] = args.pop('query_filter')
+        requests.append(QueryRequest(**args))
+    return requests
+
+
+def _create_payload_indexes(client) -> None:
+    from qdrant_client.models import PayloadSchemaType
+
+    if _in_process(client):
+        # the in-process client filters without indexes and warns about each one
+        return
+    for field, schema in config['vector_store']['payload_indexes'].items():
+        client.create_payload_index(_collection(), field_name=field, field_schema=PayloadSchemaType(schema))
+
+
+def _upload_settings() -> dict:
+    return config['vector_store']['upload']
+
+
+def _in_process(client) -> bool:
+    return client.init_options.get("location") == ":memory:" or bool(client.init_options.get("path"))
+
+
+def _parallel(client) -> int:
+    # the in-process client is not thread-safe
+    return 1 if _in_process(client) else _upload_settings()['parallel']
+
+
+def _indexing_off() -> bool:
+    return _bulk['active'] and _upload_settings()['disable_indexing']
+
+
+def _upsert_batch(client, batch:dict, wait:bool) -> None:
+    """Send one request's points, retrying with exponential backoff; only this request is re-sent."""
+    from qdrant_client.models import Batch
+
+    settings = _upload_settings()
+    vectors = batch['vectors']
+    points = Batch(
+        ids=batch['ids'], payloads=batch['payloads'],
+        vectors={name: rows.tolist() for name, rows in vectors.items()} if isinstance(vectors, dict) else vectors.tolist(),
+    )
+    for attempt in range(settings['max_retries'] + 1):
+        try:
+            client.upsert(collection_name=_collection(), points=points, wait=wait)
+            return
+        except Exception as e:
+            record_error("upload", "ingestion")
+            if attempt == settings['max_retries']:
+                raise
+            delay = settings['backoff_base_seconds'] * 2 ** attempt
+            logger.warning(f"Upsert of {len(batch['ids'])} points failed ({e}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+def collection_exists() -> bool:
+    return get_qdrant_client().collection_exists(_collection())
+
+
+def begin_bulk_load() -> None:
+    """Start an ingest: writes no longer wait to be applied and, if configured, HNSW indexing is paused.
+
+    One bulk load at a time: a second one would reset the first one's barrier and indexing threshold.
+    """
+    with _bulk_lock:
+        if _bulk['active']:
+            raise RuntimeError("A bulk load is already in progress")
+        _bulk.update(active=True, barrier=None)
+    try:
+        client = get_qdrant_client()
+        if _indexing_off() and client.collection_exists(_collection()):
+            from qdrant_client.models import OptimizersConfigDiff
+
+            client.update_collection(_collection(), optimizers_config=OptimizersConfigDiff(indexing_threshold=0))
+            logger.info(f"Paused HNSW indexing of '{_collection()}' for the bulk load.")
+    except Exception:
+        _bulk.update(active=False)
+        raise
+
+
+def finish_bulk_load() -> None:
+    """End an ingest: wait until every write is applied, then resume HNSW indexing if it was paused."""
+    with _bulk_lock:
+        if not _bulk['active']:
+            return
+        indexing_off = _indexing_off()
+        barrier = _bulk['barrier']
+        _bulk.update(active=False, barrier=None)
+    client = get_qdrant_client()
+    try:
+        if barrier is not None:
+            # Qdrant applies a collection's updates in order, so once this write is applied every earlier one is too
+            _upsert_batch(client, barrier, wait=True)
+    finally:
+        # a failed barrier must not leave HNSW indexing switched off
+        if indexing_off and client.collection_exists(_collection()):
+            from qdrant_client.models import OptimizersConfigDiff
+
+            client.update_collection(_collection(), optimizers_config=OptimizersConfigDiff(
+                indexing_threshold=_upload_settings()['indexing_threshold']
+            ))
+            logger.info(f"Resumed HNSW indexing of '{_collection()}'; the index is built in the background.")
+
+
+def upsert_points(ids:list[str], vectors:np.ndarray, payloads:list[dict]) -> None:
+    from qdrant_client.models import Distance, VectorParams, OptimizersConfigDiff
+
+    client = get_qdrant_client()
+
+    size = vectors.shape[1]
+
+    # Create collection if it doesn't exist
+    if not client.collection_exists(_collection()):
+        short_dim = _short_dims[_collection()] = _short_dim(size)
+        vectors_config = VectorParams(size=size, distance=Distance.COSINE, on_disk=config['vector_store']['on_disk_vectors'])
+        if short_dim:
+            vectors_config = {
+                "full": vectors_config,
+                "short": VectorParams(size=short_dim, distance=Distance.COSINE),
+            }
+        client.create_collection(
+            collection_name=_collection(),
+            vectors_config=vectors_config,
+            quantization_config=_quantization_config(),
+            on_disk_payload=config['vector_store']['on_disk_payload'],
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=0) if _indexing_off() else None,
+        )
+        _create_payload_indexes(client)
+        logger.info(f"Collection '{_collection()}' created.")
+    else:
+        short_dim = _collection_short_dim(client)
+        logger.info(f"Collection '{_collection()}' already exists.")
+
+    # Rows are converted to lists one request at a time, so no list of Python floats is built for the whole
+    # ingestion batch; requests of `batch_size` points stay well under the server's message size limit
+    vectors = {"full": vectors, "short": _shorten_rows(vectors, short_dim)} if short_dim else vectors
+    batch_size = _upload_settings()['batch_size']
+    batches = [
+        {
+            "ids": ids[start:start + batch_size],
+            "vectors": {name: rows[start:start + batch_size] for name, rows in vectors.items()}
+                       if isinstance(vectors, dict) else vectors[start:start + batch_size],
+            "payloads": payloads[start:start + batch_size],
+        }
+        for start in range(0, len(ids), batch_size)
+    ]
+    # writes outside an ingest (e.g. benchmarks) are searchable as soon as this returns
+    wait = not _bulk['active'] or _upload_settings()['wait']
+    parallel = min(_parallel(client), len(batches))
+    if parallel > 1:
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = [executor.submit(_upsert_batch, client, batch, wait) for batch in batches]
+        # every request has finished by here; the first failure (after its retries) fails the whole call
+        for future in futures:
+            future.result()
+    else:
+        for batch in batches:
+            _upsert_batch(client, batch, wait)
+    if _bulk['active'] and not wait and batches:
+        _bulk['barrier'] = batches[-1]
+    logger.debug(f"Upserted {len(ids)} points in {len(batches)} requests ({parallel} in parallel, wait={wait}).")
+
+
+def delete_by_sources(sources:list[str]) -> None:
+    from qdrant_client.models import Filter, FieldCondition, MatchAny, FilterSelector
+
+    client = get_qdrant_client()
+    if not client.collection_exists(_collection()):
+        return
+
+    client.delete(
+        collection_name=_collection(),
+        points_selector=FilterSelector(filter=Filter(must=[FieldCondition(key="source", match=MatchAny(any=sources))]))
+    )
+
+
+def search(vector:list[float], limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[dict]:
+    client = get_qdrant_client()
+    if not client.collection_exists(_collection()):
+        logger.warning(f"Collection '{_collection()}' does not exist.")
+        return []
+
+    args = _query_args(vector, limit, _collection_short_dim(client), filters, fields)
+    return _to_hits(client.query_points(collection_name=_collection(), **args).points)
+
+
+async def asearch(vector:list[float], limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[dict]:
+    client = get_async_qdrant_client()
+    if not await client.collection_exists(_collection()):
+        logger.warning(f"Collection '{_collection()}' does not exist.")
+        return []
+
+    args = _query_args(vector, limit, await _acollection_short_dim(client), filters, fields)
+    response = await client.query_points(collection_name=_collection(), **args)
+    return _to_hits(response.points)
+
+
+def search_batch(vectors:list[list[float]], limit:int, filters:dict | None = None,
+                 fields:list[str] | None = None) -> list[list[dict]]:
+    if not vectors:
+        return []
+    client = get_qdrant_client()
+    if not client.collection_exists(_collection()):
+        logger.warning(f"Collection '{_collection()}' does not exist.")
+        return [[] for _ in vectors]
+
+    requests = _batch_requests(vectors, limit, _collection_short_dim(client), filters, fields)
+    responses = client.query_batch_points(collection_name=_collection(), requests=requests)
+    return [_to_hits(response.points) for response in responses]
+
+
+async def asearch_batch(vectors:list[list[float]], limit:int, filters:dict | None = None,
+                        fields:list[str] | None = None) -> list[list[dict]]:
+    if not vectors:
+        return []
+    client = get_async_qdrant_client()
+    if not await client.collection_exists(_collection()):
+        logger.warning(f"Collection '{_collection()}' does not exist.")
+        return [[] for _ in vectors]
+
+    requests = _batch_requests(vectors, limit, await _acollection_short_dim(client), filters, fields)
+    responses = await client.query_batch_points(collection_name=_collection(), requests=requests)
+    return [_to_hits(response.points) for response in responses]
+
+
+def drop_collection() -> None:
+    client = get_qdrant_client()
+    _short_dims.pop(_collection(), None)
+    if client.collection_exists(_collection()):
+        client.delete_collection(_collection())
+
+
+def count() -> int:
+    client = get_qdrant_client()
+    if not client.collection_exists(_collection()):
+        return 0
+    return client.count(collection_name=_collection()).count
@@ -0,0 +1,338 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+import numpy as np
+from src.indexing.filters import create_indexes, is_filtered, matching_rows, select_fields
+from src.indexing.vector_store import point_ids
+from src.ingestion.chunk_batch import ChunkBatch, chunk_count, iter_chunks
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# BM25 inverted index, one directory per collection:
+#   docs.db              - SQLite table of live chunks: doc number, point id, source, token count, JSON payload
+#   segment-<n>.npz      - immutable postings in CSR form: vocabulary, per-term offsets, doc numbers (int32)
+#                          and term frequencies (uint16)
+# Every add writes a new segment, so ingestion never rewrites existing postings. Deleting a source only
+# removes its rows from docs.db; postings of dead docs are skipped at query time and dropped when a
+# segment is merged. Segments are tiered by size (powers of `max_segments + 1` postings) and only a tier
+# holding more than `max_segments` segments is merged, so each posting is rewritten O(log n) times.
+_lock = threading.Lock()
+_indexes = {}
+_stats = {"searches": 0, "merges": 0}
+
+_TOKEN = re.compile(r"\w+")
+_MAX_TF = np.iinfo(np.uint16).max
+# sources or ids per `IN (...)` query, well below SQLite's bound-parameter limit
+_SQL_BATCH = 500
+
+
+def _settings() -> dict:
+    return config['sparse_index']
+
+
+def tokenize(text:str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _open_db(path:str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("CREATE TABLE IF NOT EXISTS docs (doc INTEGER PRIMARY KEY, id TEXT UNIQUE, source TEXT, length INTEGER, payload TEXT)")
+    db.execute("CREATE INDEX IF NOT EXISTS docs_source ON docs (source)")
+    create_indexes(db, "docs")
+    db.commit()
+    return db
+
+
+def _make_segment(terms:list[str], offsets:np.ndarray, docs:np.ndarray, tfs:np.ndarray, number:int) -> dict:
+    return {"number": number, "vocabulary": {term: i for i, term in enumerate(terms)},
+            "offsets": offsets, "docs": docs, "tfs": tfs}
+
+
+def _save_segment(index:dict, segment:dict) -> None:
+    if index['directory'] is None:
+        return
+    path = os.path.join(index['directory'], f"segment-{segment['number']:06d}.npz")
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(f, terms=np.frombuffer("\n".join(segment['vocabulary']).encode("utf-8"), dtype=np.uint8),
+                 offsets=segment['offsets'], docs=segment['docs'], tfs=segment['tfs'])
+    os.replace(f"{path}.tmp", path)
+
+
+def _load_segment(path:str, number:int) -> dict:
+    with np.load(path) as data:
+        text = data['terms'].tobytes().decode("utf-8")
+        return _make_segment(text.split("\n") if text else [], data['offsets'], data['docs'], data['tfs'], number)
+
+
+def _resize(index:dict, size:int) -> None:
+    for name, dtype in (("alive", bool), ("lengths", np.int32)):
+        grown = np.zeros(max(size, 2 * len(index[name])), dtype=dtype)
+        grown[:len(index[name])] = index[name]
+        index[name] = grown
+
+
+def _get_index() -> dict:
+    collection = config['vector_store']['collection_name']
+    key = (_settings()['path'], collection)
+    if key in _indexes:
+        return _indexes[key]
+
+    directory = None if _settings()['path'] == ":memory:" else os.path.join(_settings()['path'], collection)
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    index = {
+        "directory": directory, "segments": [], "next_doc": 0, "live": 0, "total_length": 0,
+        "alive": np.zeros(0, dtype=bool), "lengths": np.zeros(0, dtype=np.int32),
+        "db": _open_db(":memory:" if directory is None else os.path.join(directory, "docs.db")),
+    }
+
+    if directory is not None:
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("segment-") and name.endswith(".npz"):
+                index['segments'].append(_load_segment(os.path.join(directory, name), int(name[8:14])))
+
+    rows = index['db'].execute("SELECT doc, length FROM docs").fetchall()
+    # doc numbers are never reused, including ones only referenced by postings of an interrupted add
+    index['next_doc'] = max([doc + 1 for doc, _ in rows] + [int(s['docs'].max()) + 1 for s in index['segments'] if len(s['docs'])] + [0])
+    _resize(index, index['next_doc'])
+    for doc, length in rows:
+        index['alive'][doc] = True
+        index['lengths'][doc] = length
+    index['live'] = len(rows)
+    index['total_length'] = sum(length for _, length in rows)
+
+    _indexes[key] = index
+    return index
+
+
+def _next_segment_number(index:dict) -> int:
+    return max([segment['number'] for segment in index['segments']] + [-1]) + 1
+
+
+def _build_segment(index:dict, docs:list[int], term_counts:list[Counter]) -> dict:
+    postings = {}
+    for doc, counts in zip(docs, term_counts):
+        for term, tf in counts.items():
+            postings.setdefault(term, ([], []))
+            postings[term][0].append(doc)
+            postings[term][1].append(min(tf, _MAX_TF))
+
+    terms = sorted(postings)
+    lengths = np.array([len(postings[term][0]) for term in terms], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    doc_array = np.array([doc for term in terms for doc in postings[term][0]], dtype=np.int32)
+    tf_array = np.array([tf for term in terms for tf in postings[term][1]], dtype=np.uint16)
+    return _make_segment(terms, offsets, doc_array, tf_array, _next_segment_number(index))
+
+
+def _tier(segment:dict, base:int) -> int:
+    size, tier = max(len(segment['docs']), 1), 0
+    while size >= base:
+        size //= base
+        tier += 1
+    return tier
+
+
+def _merge_segments(index:dict, segments:list[dict]) -> None:
+    # flatten the segments to (term, doc, tf) triples over a shared vocabulary, drop dead docs, rebuild CSR
+    vocabulary = sorted(set().union(*(segment['vocabulary'] for segment in segments)))
+    term_ids = {term: i for i, term in enumerate(vocabulary)}
+    all_terms, all_docs, all_tfs = [], [], []
+    for segment in segments:
+        local_to_global = np.array([term_ids[term] for term in segment['vocabulary']], dtype=np.int64)
+        all_terms.append(np.repeat(local_to_global, np.diff(segment['offsets'])))
+        all_docs.append(segment['docs'])
+        all_tfs.append(segment['tfs'])
+
+    terms, docs, tfs = np.concatenate(all_terms), np.concatenate(all_docs), np.concatenate(all_tfs)
+    keep = index['alive'][docs]
+    terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+    order = np.lexsort((docs, terms))
+    terms, docs, tfs = terms[order], docs[order], tfs[order]
+
+    used = np.unique(terms)
+    offsets = np.append(np.searchsorted(terms, used), len(terms)).astype(np.int64)
+    merged = _make_segment([vocabulary[i] for i in used], offsets, docs, tfs, _next_segment_number(index))
+
+    old_numbers = {segment['number'] for segment in segments}
+    _save_segment(index, merged)
+    index['segments'] = [segment for segment in index['segments'] if segment['number'] not in old_numbers] + [merged]
+    if index['directory'] is not None:
+        for number in old_numbers:
+            os.remove(os.path.join(index['directory'], f"segment-{number:06d}.npz"))
+    _stats['merges'] += 1
+    logger.info(f"Merged {len(old_numbers)} sparse index segments ({len(docs)} postings kept).")
+
+
+def _merge_tiers(index:dict) -> None:
+    # a merged tier lands at least one tier up, which may then be over the limit in turn
+    max_segments = max(_settings()['max_segments'], 1)
+    base = max_segments + 1
+    while True:
+        tiers = {}
+        for segment in index['segments']:
+            tiers.setdefault(_tier(segment, base), []).append(segment)
+        full = [tier for tier, segments in tiers.items() if len(segments) > max_segments]
+        if not full:
+            return
+        _merge_segments(index, tiers[min(full)])
+
+
+def _delete_docs(index:dict, rows:list[tuple[int, int]]) -> None:
+    for doc, length in rows:
+        if index['alive'][doc]:
+            index['alive'][doc] = False
+            index['live'] -= 1
+            index['total_length'] -= length
+
+
+def add_documents(batch:ChunkBatch) -> int:
+    """Add a chunk batch to the BM25 index under the same point ids as the vector store; returns the count added."""
+    if not chunk_count(batch):
+        return 0
+
+    chunks = list(iter_chunks(batch))
+    with _lock:
+        index = _get_index()
+        ids = point_ids(batch)
+        for start in range(0, len(ids), _SQL_BATCH):
+            part = ids[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            replaced = index['db'].execute(f"SELECT doc, length FROM docs WHERE id IN ({placeholders})", part).fetchall()
+            _delete_docs(index, replaced)
+            index['db'].execute(f"DELETE FROM docs WHERE id IN ({placeholders})", part)
+
+        term_counts = [Counter(tokenize(chunk['content'])) for chunk in chunks]
+        docs = list(range(index['next_doc'], index['next_doc'] + len(chunks)))
+        index['next_doc'] += len(chunks)
+        if index['next_doc'] > len(index['alive']):
+            _resize(index, index['next_doc'])
+
+        segment = _build_segment(index, docs, term_counts)
+        _save_segment(index, segment)
+        index['segments'].append(segment)
+
+        records = []
+        for doc, chunk, id_, counts in zip(docs, chunks, ids, term_counts):
+            length = sum(counts.values())
+            index['alive'][doc] = True
+            index['lengths'][doc] = length
+            index['live'] += 1
+            index['total_length'] += length
+            payload = {"content": chunk['content'], **chunk['metadata']}
+            records.append((doc, id_, chunk['metadata'].get("source"), length, json.dumps(payload)))
+        index['db'].executemany("INSERT INTO docs (doc, id, source, length, payload) VALUES (?, ?, ?, ?, ?)", records)
+        index['db'].commit()
+
+        _merge_tiers(index)
+        return len(chunks)
+
+
+def delete_sources(sources:list[str]) -> None:
+    if not sources:
+        return
+
+    with _lock:
+        index = _get_index()
+        for start in range(0, len(sources), _SQL_BATCH):
+            part = sources[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            rows = index['db'].execute(f"SELECT doc, length FROM docs WHERE source IN ({placeholders})", part).fetchall()
+            _delete_docs(index, rows)
+            index['db'].execute(f"DELETE FROM docs WHERE source IN ({placeholders})", part)
+        index['db'].commit()
+
+
+def indexed_sources(sources:list[str]) -> set[str]:
+    """The subset of `sources` that has at least one chunk in the index."""
+    if not sources:
+        return set()
+
+    with _lock:
+        index = _get_index()
+        found = set()
+        for start in range(0, len(sources), _SQL_BATCH):
+            part = sources[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(part))
+            found.update(row[0] for row in index['db'].execute(
+                f"SELECT DISTINCT source FROM docs WHERE source IN ({placeholders})", part
+            ))
+        return found
+
+
+def search(query:str, limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[dict]:
+    """Return up to `limit` chunks ranked by BM25 as {"id", "score", "payload"}, best first.
+
+    Only chunks matching `filters` are ranked, and hits carry just the payload `fields` (all when None).
+    """
+    terms = set(tokenize(query))
+    with _lock:
+        index = _get_index()
+        _stats['searches'] += 1
+        if not terms or index['live'] == 0:
+            return []
+
+        searchable = index['alive']
+        if is_filtered(filters):
+            searchable = np.zeros_like(index['alive'])
+            searchable[matching_rows(index['db'], "docs", "doc", filters)] = True
+
+        # term statistics stay corpus-wide, so a filter changes which chunks rank, not how they score
+        k1, b = _settings()['k1'], _settings()['b']
+        average_length = index['total_length'] / index['live']
+        scores = np.zeros(index['next_doc'], dtype=np.float32)
+        for term in terms:
+            docs, tfs = [], []
+            for segment in index['segments']:
+                i = segment['vocabulary'].get(term)
+                if i is not None:
+                    start, end = segment['offsets'][i], segment['offsets'][i + 1]
+                    docs.append(segment['docs'][start:end])
+                    tfs.append(segment['tfs'][start:end])
+            if not docs:
+                continue
+
+            docs, tfs = np.concatenate(docs), np.concatenate(tfs).astype(np.float32)
+            keep = index['alive'][docs]
+            docs, tfs = docs[keep], tfs[keep]
+            if not len(docs):
+                continue
+            idf = math.log(1 + (index['live'] - len(docs) + 0.5) / (len(docs) + 0.5))
+            keep = searchable[docs]
+            docs, tfs = docs[keep], tfs[keep]
+            norm = k1 * (1 - b + b * index['lengths'][docs] / average_length)
+            scores[docs] += idf * tfs * (k1 + 1) / (tfs + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit)[:limit]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        if not len(matched):
+            return []
+
+        docs = [int(doc) for doc in matched]
+        placeholders = ",".join("?" * len(docs))
+        rows = {doc: (id_, payload) for doc, id_, payload in index['db'].execute(
+            f"SELECT doc, id, payload FROM docs WHERE doc IN ({placeholders})", docs
+        )}
+        return [
+            {"id": rows[doc][0], "score": float(scores[doc]), "payload": select_fields(json.loads(rows[doc][1]), fields)}
+            for doc in docs
+        ]
+
+
+def get_sparse_index_stats() -> dict:
+    with _lock:
+        index = _get_index()
+        return {
+            **_stats,
+            "documents": index['live'],
+            "segments": len(index['segments']),
+            "postings": sum(len(segment['docs']) for segment in index['segments']),
+        }
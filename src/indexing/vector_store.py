@@ -1,46 +1,99 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-from qdrant_client.models import PointStruct
+import hashlib
 import uuid
-from src.config_loader import load_config
+from src.ingestion.chunk_batch import ChunkBatch, chunk_count, chunk_texts, iter_chunks
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
 
 
-def index_documents(chunks:list[dict])->dict:
-    if not chunks:
+def _backend():
+    # Every backend module exposes collection_exists, upsert_points, begin_bulk_load, finish_bulk_load,
+    # delete_by_sources, search, asearch, search_batch, asearch_batch, drop_collection and count
+    if config['vector_store']['name'] == "local":
+        from src.indexing import local_store
+        return local_store
+    from src.indexing import qdrant_store
+    return qdrant_store
+
+
+def _point_id(source:str, chunk_index:int, content:str) -> str:
+    # Derived from (source, chunk_index, content hash) so re-upserting an unchanged chunk overwrites the same point
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{chunk_index}#{content_hash}"))
+
+
+def point_id(chunk:dict) -> str:
+    return _point_id(chunk['metadata']['source'], chunk['metadata']['chunk_index'], chunk['content'])
+
+
+def point_ids(batch:ChunkBatch) -> list[str]:
+    documents = batch['documents']
+    return [
+        _point_id(documents[row]['source'], index, content)
+        for content, row, index in zip(chunk_texts(batch), batch['document'].tolist(), batch['chunk_index'].tolist())
+    ]
+
+
+def index_documents(batch:ChunkBatch)->dict:
+    if not chunk_count(batch):
         logger.warning("No chunks provided for indexing")
         return {"status": "failed", "indexed_count": 0, "collection": config['vector_store']['collection_name']}
 
-    client = QdrantClient(
-        url=config['vector_store']['url'],
-        prefer_grpc=True,
-    )
-
-    # Create collection if it doesn't exist
-    if not client.has_collection(config['vector_store']['collection_name']):
-        client.create_collection(
-            collection_name=config['vector_store']['collection_name'],
-            vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
-        )
-        logger.info(f"Collection '{config['vector_store']['collection_name']}' created.")
-
-    else:
-        logger.info(f"Collection '{config['vector_store']['collection_name']}' already exists.")
-
-    points = [
-        PointStruct(
-            id=str(uuid.uuid4()),
-            vector=chunk['embedding'],
-            payload={
-                "content": chunk['content'],
-                **chunk['metadata']
-            }
-        )
-        for chunk in chunks
-    ]
-    client.upsert(collection_name=config['vector_store']['collection_name'], points=points)
-    logger.info(f"Added {len(chunks)} documents to the vector store.")
-    
-    return {"status": "success", "indexed_count": len(chunks), "collection": config['vector_store']['collection_name']}
\ No newline at end of file
+    # the embedding matrix goes to the backend as is; only the payloads are built per chunk
+    payloads = [{"content": chunk['content'], **chunk['metadata']} for chunk in iter_chunks(batch)]
+    _backend().upsert_points(point_ids(batch), batch['embeddings'], payloads)
+    logger.info(f"Added {len(payloads)} documents to the vector store.")
+
+    return {"status": "success", "indexed_count": len(payloads), "collection": config['vector_store']['collection_name']}
+
+
+def begin_bulk_load() -> None:
+    """Mark the start of an ingest; the backend may defer index maintenance and write confirmation until
+    finish_bulk_load()."""
+    _backend().begin_bulk_load()
+
+
+def finish_bulk_load() -> None:
+    """Mark the end of an ingest: returns once every indexed point is searchable."""
+    _backend().finish_bulk_load()
+
+
+def delete_documents(sources:list[str])->int:
+    """Delete every point whose payload `source` is one of the given files."""
+    if not sources:
+        return 0
+
+    _backend().delete_by_sources(sources)
+    logger.info(f"Deleted points for {len(sources)} sources from the vector store.")
+    return len(sources)
+
+
+def search_vectors(vector:list[float], limit:int, filters:dict | None = None, fields:list[str] | None = None) -> list[dict]:
+    """Return up to `limit` nearest points as {"id", "score", "payload"}, best first.
+
+    Only points matching `filters` (see src/indexing/filters.py) are searched, and only the payload `fields`
+    are fetched (all of them when None).
+    """
+    return _backend().search(vector, limit, filters, fields)
+
+
+async def asearch_vectors(vector:list[float], limit:int, filters:dict | None = None,
+                          fields:list[str] | None = None) -> list[dict]:
+    return await _backend().asearch(vector, limit, filters, fields)
+
+
+def search_vectors_batch(vectors:list[list[float]], limit:int, filters:dict | None = None,
+                         fields:list[str] | None = None) -> list[list[dict]]:
+    """Search many query vectors in one backend call; returns one hit list per vector, in order."""
+    return _backend().search_batch(vectors, limit, filters, fields)
+
+
+async def asearch_vectors_batch(vectors:list[list[float]], limit:int, filters:dict | None = None,
+                                fields:list[str] | None = None) -> list[list[dict]]:
+    return await _backend().asearch_batch(vectors, limit, filters, fields)
+
+
+def drop_collection() -> None:
+    """Delete the whole collection; the next index_documents call recreates it with the current settings."""
+    _backend().drop_collection()
@@ -0,0 +1,71 @@
+import json
+from typing import TypedDict
+import numpy as np
+
+# The ingestion stages (load -> chunk -> embed -> index) hand chunks on as one columnar batch instead of one dict
+# per chunk: chunk texts are slices of a single string, metadata that every chunk of a document shares is stored
+# once per document, and embeddings are one contiguous float32 matrix. A 1536-dimension embedding is ~6 KB in
+# the matrix against ~50 KB as a list of Python floats.
+
+
+class ChunkBatch(TypedDict):
+    text: str                       # every chunk's text, concatenated
+    offsets: np.ndarray             # int64, chunk i is text[offsets[i]:offsets[i + 1]]
+    document: np.ndarray            # int32, row of each chunk's metadata in `documents`
+    chunk_index: np.ndarray         # int32, position of each chunk within its document
+    documents: list[dict]           # metadata shared by the chunks of one document (source, file_type, ...)
+    embeddings: np.ndarray | None   # float32 (chunks x dim) once embedded
+
+
+def make_chunk_batch(texts:list[str], metadata:list[dict], chunk_indices:list[int],
+                     embeddings:np.ndarray | None = None) -> ChunkBatch:
+    """Build a batch from parallel per-chunk lists; chunks of one document pass the same metadata dict."""
+    documents, rows, seen = [], [], {}
+    for meta in metadata:
+        row = seen.get(id(meta))
+        if row is None:
+            row = seen[id(meta)] = len(documents)
+            documents.append(meta)
+        rows.append(row)
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    return {
+        "text": "".join(texts),
+        "offsets": offsets,
+        "document": np.array(rows, dtype=np.int32),
+        "chunk_index": np.array(chunk_indices, dtype=np.int32),
+        "documents": documents,
+        "embeddings": None if embeddings is None else np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def from_chunks(chunks:list[dict]) -> ChunkBatch:
+    """Batch of per-chunk dicts ({"content", "metadata"} and optionally "embedding"), e.g. from chunk_documents."""
+    shared, metadata = {}, []
+    for chunk in chunks:
+        meta = {k: v for k, v in chunk['metadata'].items() if k != "chunk_index"}
+        metadata.append(shared.setdefault(json.dumps(meta, sort_keys=True), meta))
+    embeddings = None
+    if chunks and all("embedding" in chunk for chunk in chunks):
+        embeddings = np.array([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+    return make_chunk_batch(
+        [chunk['content'] for chunk in chunks], metadata,
+        [chunk['metadata'].get("chunk_index", 0) for chunk in chunks], embeddings,
+    )
+
+
+def chunk_count(batch:ChunkBatch) -> int:
+    return len(batch['chunk_index'])
+
+
+def chunk_texts(batch:ChunkBatch) -> list[str]:
+    text, offsets = batch['text'], batch['offsets'].tolist()
+    return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+def iter_chunks(batch:ChunkBatch):
+    """Yield each chunk as {"content", "metadata"}, for consumers that need one record per chunk."""
+    documents = batch['documents']
+    for content, row, index in zip(chunk_texts(batch), batch['document'].tolist(), batch['chunk_index'].tolist()):
+        yield {"content": content, "metadata": {**documents[row], "chunk_index": index}}
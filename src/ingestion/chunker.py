@@ -1,48 +1,183 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter, CharacterTextSplitter
-from src.config_loader import load_config
+import re
+from collections import deque
+from itertools import repeat
+from src.ingestion.document_loader import load_file, process_pool
+from src.ingestion.embedding_scheduler import count_tokens
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
 
-config = load_config()
+config = get_config()
 
+# Chunks are located by (start, end) offsets into their document's text; a chunk is only sliced out when it is
+# handed on. The "recursive" and "character" strategies place chunk boundaries exactly where LangChain's
+# RecursiveCharacterTextSplitter and CharacterTextSplitter do, so point ids and cached embeddings of already
+# ingested files carry over, but without a splitter object, Document objects or intermediate strings.
+# "sentence" splits paragraphs at sentence ends before falling back to lines and words.
 
-def chunk_documents(documents:list[dict])->list[dict]:
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_SEPARATORS = {
+    "recursive": ["\n\n", "\n", " ", ""],
+    "sentence": ["\n\n", _SENTENCE_END, "\n", " ", ""],
+}
+_PARAGRAPH = "\n\n"
+
+
+def _settings() -> dict:
+    return config['chunking']
+
+
+def _measure(text:str, length_unit:str):
+    if length_unit == "tokens":
+        return lambda start, end: count_tokens(text[start:end])
+    return lambda start, end: end - start
+
+
+def _find(text:str, separator, start:int, end:int):
+    """(start, end) of each separator occurrence in text[start:end]; `separator` is a string or a compiled regex."""
+    if isinstance(separator, str):
+        position = text.find(separator, start, end)
+        while position != -1:
+            yield position, position + len(separator)
+            position = text.find(separator, position + len(separator), end)
+    else:
+        for match in separator.finditer(text, start, end):
+            yield match.span()
+
+
+def _pieces(text:str, start:int, end:int, separator, keep_separator:bool) -> list[tuple[int, int]]:
+    if separator == "":
+        return [(i, i + 1) for i in range(start, end)]
+    pieces, piece_start = [], start
+    for separator_start, separator_end in _find(text, separator, start, end):
+        pieces.append((piece_start, separator_start))
+        # a kept separator starts the following piece
+        piece_start = separator_start if keep_separator else separator_end
+    pieces.append((piece_start, end))
+    return [(a, b) for a, b in pieces if b > a]
+
+
+def _add_chunk(text:str, start:int, end:int, chunks:list) -> None:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if end > start:
+        chunks.append((start, end))
+
+
+def _merge(text:str, pieces:list[tuple[int, int, int]], separator_len:int, settings:dict, chunks:list) -> None:
+    """Greedily join consecutive (start, end, length) pieces into chunks, starting each chunk with the tail of
+    the previous one, up to `chunk_overlap`."""
+    chunk_size, chunk_overlap = settings['chunk_size'], settings['chunk_overlap']
+    window, total = deque(), 0
+    for start, end, length in pieces:
+        if total + length + (separator_len if window else 0) > chunk_size and window:
+            _add_chunk(text, window[0][0], window[-1][1], chunks)
+            while window and (total > chunk_overlap or total + length + separator_len > chunk_size):
+                total -= window.popleft()[2] + (separator_len if window else 0)
+        window.append((start, end, length))
+        total += length + (separator_len if len(window) > 1 else 0)
+    if window:
+        _add_chunk(text, window[0][0], window[-1][1], chunks)
+
+
+def _split_recursive(text:str, start:int, end:int, separators:list, measure, settings:dict, chunks:list) -> None:
+    # the first separator that occurs in this range splits it; pieces still too long try the next ones
+    separator, remaining = separators[-1], []
+    for i, candidate in enumerate(separators):
+        if candidate == "":
+            separator = candidate
+            break
+        if next(_find(text, candidate, start, end), None) is not None:
+            separator, remaining = candidate, separators[i + 1:]
+            break
+
+    fitting = []
+    for piece_start, piece_end in _pieces(text, start, end, separator, keep_separator=True):
+        length = measure(piece_start, piece_end)
+        if length < settings['chunk_size']:
+            fitting.append((piece_start, piece_end, length))
+            continue
+        if fitting:
+            _merge(text, fitting, 0, settings, chunks)
+            fitting = []
+        if remaining:
+            _split_recursive(text, piece_start, piece_end, remaining, measure, settings, chunks)
+        else:
+            chunks.append((piece_start, piece_end))
+    if fitting:
+        _merge(text, fitting, 0, settings, chunks)
+
+
+def chunk_spans(text:str, settings:dict | None = None) -> list[tuple[int, int]]:
+    """(start, end) offsets of the chunks of `text`, in order. `settings` defaults to the chunking config."""
+    settings = settings or _settings()
+    length_unit = settings.get('length_unit', "characters")
+    measure = _measure(text, length_unit)
+    strategy = settings['strategy']
+    chunks = []
+    if strategy == "character":
+        pieces = [(start, end, measure(start, end)) for start, end in _pieces(text, 0, len(text), _PARAGRAPH, False)]
+        separator_len = count_tokens(_PARAGRAPH) if length_unit == "tokens" else len(_PARAGRAPH)
+        _merge(text, pieces, separator_len, settings, chunks)
+        return chunks
+    if strategy not in _SEPARATORS:
+        logger.warning(f"Unknown chunking strategy: {strategy}, defaulting to recursive splitting")
+        strategy = "recursive"
+    _split_recursive(text, 0, len(text), _SEPARATORS[strategy], measure, settings, chunks)
+    return chunks
+
+
+def _metadata(doc:dict, total_chunks:int) -> dict:
+    return {
+        "source": doc['metadata']['source'],
+        "file_type": doc['metadata']['file_type'],
+        "file_size_kb": doc['metadata']['file_size_kb'],
+        "num_pages": doc['metadata']['num_pages'],
+        "page": doc['metadata'].get('page', 0),
+        "total_chunks": total_chunks
+    }
+
+
+def split_spans(documents:list[dict], workers:int | None = None) -> list[tuple[dict, str, list[tuple[int, int]]]]:
+    """Chunk each document; returns (metadata shared by its chunks, document text, chunk offsets) per document.
+
+    With more than one worker the documents are split on a process pool; only offsets travel back.
+    """
+    workers = _settings()['workers'] if workers is None else workers
+    contents = [doc['content'] for doc in documents]
+    if workers > 1 and len(documents) > 1:
+        with process_pool(workers) as executor:
+            spans = list(executor.map(chunk_spans, contents, repeat(dict(_settings())),
+                                      chunksize=max(1, len(documents) // (workers * 4))))
+    else:
+        spans = [chunk_spans(content) for content in contents]
+    return [(_metadata(doc, len(doc_spans)), content, doc_spans) for doc, content, doc_spans in zip(documents, contents, spans)]
+
+
+def load_and_split(file_path:str) -> list[tuple[dict, str, list[tuple[int, int]]]]:
+    """Parse a file and chunk its documents in the same process, e.g. as the loader of a parse worker."""
+    return split_spans(load_file(file_path), workers=1)
+
+
+def split_documents(documents:list[dict], workers:int | None = None) -> list[tuple[dict, list[str]]]:
+    """Split each document into chunk texts; returns (metadata shared by its chunks, chunk texts) per document."""
     if not documents:
         logger.warning("No documents provided for chunking")
         return []
 
-    strategy = config["chunking"]["strategy"]
-    if strategy == "recursive":
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config["chunking"]["chunk_size"],
-            chunk_overlap=config["chunking"]["chunk_overlap"]
-        )
-    elif strategy == "character":
-        text_splitter = CharacterTextSplitter(
-            chunk_size=config["chunking"]["chunk_size"],
-            chunk_overlap=config["chunking"]["chunk_overlap"]
-        )
-    else:
-        logger.warning(f"Unknown chunking strategy: {strategy}, defaulting to character-based splitting")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config["chunking"]["chunk_size"],
-            chunk_overlap=config["chunking"]["chunk_overlap"]
-        )
-
-    chunked_docs = []
-    for doc in documents:
-        chunks = text_splitter.create_documents([doc['content']])
-        for i, chunk in enumerate(chunks):
-            chunked_docs.append({
-                'content': chunk.page_content,
-                'metadata': {
-                    "source": doc['metadata']['source'],
-                    "file_type": doc['metadata']['file_type'],
-                    "file_size_kb": doc['metadata']['file_size_kb'],
-                    "num_pages": doc['metadata']['num_pages'],
-                    "chunk_index": i,
-                    "total_chunks": len(chunks)
-                }
-            })
-    logger.info(f"Produced {len(chunked_docs)} chunks from {len(documents)} documents")
-    return chunked_docs
\ No newline at end of file
+    split_docs = [
+        (metadata, [content[start:end] for start, end in spans])
+        for metadata, content, spans in split_spans(documents, workers)
+    ]
+    logger.info(f"Produced {sum(len(texts) for _, texts in split_docs)} chunks from {len(documents)} documents")
+    return split_docs
+
+
+def chunk_documents(documents:list[dict])->list[dict]:
+    return [
+        {'content': text, 'metadata': {**metadata, "chunk_index": i}}
+        for metadata, texts in split_documents(documents)
+        for i, text in enumerate(texts)
+    ]
@@ -1,49 +1,139 @@
+import multiprocessing
 import os
-from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader, PyMuPDFLoader
-from src.config_loader import load_config
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from fnmatch import fnmatch
+from src.config_loader import get_config
 from src.logger import get_logger
 
-config = load_config()
+config = get_config()
 logger = get_logger(__name__)
 
 
-def load_documents(directory:str)->list[dict]:
+def _adopt_config(parent_config:dict) -> None:
+    # workers don't inherit the parent's memory, so they take over its config, including changes made at runtime
+    get_config().update(parent_config)
+
+
+def process_pool(workers:int) -> ProcessPoolExecutor:
+    """Process pool for parsing and chunking.
+
+    Pools are created from ingest threads while the logging and embedding threads run, and a forked child can
+    inherit a lock one of them holds and deadlock, so workers are started by a forkserver (spawn where there is none).
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                               initializer=_adopt_config, initargs=(dict(config),))
+
+
+def list_files(directory:str)->list[str]:
+    """Recursively list files under the directory that match an include glob and no exclude glob."""
     dir_path = os.path.join(config["source_data"]["document_directory"], directory)
     if not os.listdir(dir_path):
         logger.warning(f"Directory is empty: {dir_path}")
         return []
-    
-    files = os.listdir(dir_path)
+
+    include = config["ingestion"]["include"]
+    exclude = config["ingestion"]["exclude"]
     file_paths = []
-    for file in files:
-        if file.endswith(('.txt', '.md', '.pdf')):
-            file_paths.append(os.path.join(dir_path, file))
-        else:
-            logger.warning(f"Skipping unsupported file: {file}") 
+    for root, dirs, files in os.walk(dir_path):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            relative_path = os.path.relpath(file_path, dir_path)
+            if any(fnmatch(relative_path, pattern) for pattern in exclude):
+                continue
+            if any(fnmatch(relative_path, pattern) for pattern in include):
+                file_paths.append(file_path)
+            else:
+                logger.warning(f"Skipping unsupported file: {relative_path}")
+    return file_paths
+
+
+def load_file(file_path:str)->list[dict]:
+    from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader, PyMuPDFLoader
+
+    if file_path.endswith('.txt'):
+        loader = TextLoader(file_path)
+    elif file_path.endswith('.md'):
+        loader = UnstructuredMarkdownLoader(file_path)
+    else:
+        loader = PyMuPDFLoader(file_path)
+    docs = loader.load()
 
+    # file-level metadata is computed once, not per page; `page` is the document's position in the file (the
+    # PDF page), since chunk indices restart for every loaded document
+    file_type = file_path.split('.')[-1]
+    file_size_kb = os.path.getsize(file_path) / 1024
+    num_pages = len(docs) if file_path.endswith('.pdf') else 1
+    return [
+        {
+            'content': doc.page_content,
+            'metadata': {
+                "source": doc.metadata.get('source', 'unknown'),
+                "file_type": file_type,
+                "file_size_kb": file_size_kb,
+                "num_pages": num_pages,
+                "page": page
+            }
+        }
+        for page, doc in enumerate(docs)
+    ]
+
+
+def load_files(file_paths:list[str])->list[dict]:
     all_docs = []
     for file_path in file_paths:
-        if file_path.endswith('.txt'):
-            loader = TextLoader(file_path)
-            docs = loader.load()
-        elif file_path.endswith('.md'):
-            loader = UnstructuredMarkdownLoader(file_path)
-            docs = loader.load()
-        else:
-            loader = PyMuPDFLoader(file_path)
-            docs = loader.load()
-
-    
-        for doc in docs:
-            all_docs.append({
-                'content': doc.page_content,
-                'metadata': {
-                    "source": doc.metadata.get('source', 'unknown'),
-                    "file_type": file_path.split('.')[-1],
-                    "file_size_kb": os.path.getsize(file_path) / 1024,
-                    "num_pages": len(docs) if file_path.endswith('.pdf') else 1
-                }
-            })
-    file_cnt = len(file_paths)
-    logger.info(f"Loaded {len(all_docs)} documents from {file_cnt} files in directory: {dir_path}")
-    return all_docs
\ No newline at end of file
+        all_docs.extend(load_file(file_path))
+    logger.info(f"Loaded {len(all_docs)} documents from {len(file_paths)} files")
+    return all_docs
+
+
+def iter_loaded_files(file_paths:list[str], workers:int | None = None, loader=load_file):
+    """Parse files on a process pool and yield (file_path, documents, error) as each one completes.
+
+    `documents` is what `loader` returns for the file, so work that should run next to the parsing (e.g.
+    chunking) can be done in the worker by passing a module-level function that wraps load_file.
+    A file that fails to parse yields an empty document list and its error; the other files carry on.
+    At most 2 x workers files are in flight, so finished results do not pile up ahead of the consumer.
+    """
+    workers = config["ingestion"]["parse_workers"] if workers is None else workers
+    if workers <= 1:
+        for file_path in file_paths:
+            try:
+                documents, error = loader(file_path), None
+            except Exception as e:
+                logger.error(f"Failed to load {file_path}: {e}")
+                documents, error = [], e
+            yield file_path, documents, error
+        return
+
+    pending_paths = iter(file_paths)
+    with process_pool(workers) as executor:
+        in_flight = {}
+        for file_path in pending_paths:
+            in_flight[executor.submit(loader, file_path)] = file_path
+            if len(in_flight) >= workers * 2:
+                break
+
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    next_path = next(pending_paths, None)
+                    if next_path is not None:
+                        in_flight[executor.submit(loader, next_path)] = next_path
+                    try:
+                        documents, error = future.result(), None
+                    except Exception as e:
+                        logger.error(f"Failed to load {file_path}: {e}")
+                        documents, error = [], e
+                    yield file_path, documents, error
+        finally:
+            # consumer stopped early: don't start files nobody will read
+            for future in in_flight:
+                future.cancel()
+
+
+def load_documents(directory:str)->list[dict]:
+    return load_files(list_files(directory))
@@ -1,27 +1,37 @@
-from langchain_openai.embeddings import OpenAIEmbeddings
-from src.config_loader import load_config
+import numpy as np
+from src.ingestion.embedding_scheduler import embed_texts
+from src.ingestion.chunk_batch import ChunkBatch, chunk_count, chunk_texts
+from src.cache.embedding_cache import lookup_embeddings, store_embeddings
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
 
-def embed_documents(documents:list[dict])->list[dict]:
-    """Embed documents using OpenAI embeddings."""
+def embed_documents(batch:ChunkBatch)->ChunkBatch:
+    """Embed a chunk batch using OpenAI embeddings, reusing cached vectors for unchanged chunk text."""
 
-    if not documents:
+    if not chunk_count(batch):
         logger.warning("No documents provided for embedding")
-        return []
+        return batch
     else:
-        api_key = config['credentials']['openai_api_key']
-        embedding_model = OpenAIEmbeddings(
-            model=config['embedding']['model_name'],
-            openai_api_key=api_key
-        )
-        
-        texts = [doc['content'] for doc in documents]
-        embeddings = embedding_model.embed_documents(texts)   # one API call
+        model_name = config['embedding']['model_name']
+        texts = chunk_texts(batch)
+        cached = lookup_embeddings(texts, model_name)
 
-        for doc, embedding in zip(documents, embeddings):
-            doc['embedding'] = embedding
+        missing = [i for i in range(len(texts)) if i not in cached]
+        new_embeddings = None
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            # batched, concurrent calls for the cache misses only
+            new_embeddings = np.array(embed_texts(missing_texts), dtype=np.float32)
+            store_embeddings(missing_texts, new_embeddings, model_name)
 
-        logger.info(f"total embedding generated for {len(documents)} documents")
-        return documents
\ No newline at end of file
+        dim = new_embeddings.shape[1] if new_embeddings is not None else len(next(iter(cached.values())))
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        for i, embedding in cached.items():
+            embeddings[i] = embedding
+        if missing:
+            embeddings[missing] = new_embeddings
+
+        logger.info(f"total embedding generated for {len(texts)} documents ({len(cached)} from cache)")
+        return {**batch, "embeddings": embeddings}
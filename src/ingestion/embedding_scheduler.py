@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.clients import get_batch_embedding_model
+from src.metrics import record_tokens
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# Shared by every caller in the process, since the OpenAI limits are per API key, not per request.
+# `paused_until` is set when any batch is rate limited so all workers back off together.
+_lock = threading.Lock()
+_limiter = {"requests": None, "tokens": None, "updated": None, "paused_until": 0.0}
+_stats = {"requests": 0, "texts": 0, "tokens": 0, "retries": 0, "rate_limited": 0, "seconds": 0.0}
+_encoding = None
+
+
+def _settings() -> dict:
+    return config['embedding']
+
+
+def estimate_tokens(text:str) -> int:
+    """Cheap token estimate (~4 characters per token) for counters that don't justify loading a tokenizer."""
+    return max(1, len(text) // 4)
+
+
+def count_tokens(text:str) -> int:
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(_settings()['model_name'])
+        except Exception:
+            # unknown model or no tokenizer data available: fall back to ~4 characters per token
+            _encoding = False
+    if _encoding is False:
+        return estimate_tokens(text)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def pack_batches(token_counts:list[int], max_tokens:int, max_items:int) -> list[list[int]]:
+    """Group text positions into consecutive batches that stay within the token and item budgets."""
+    batches, batch, batch_tokens = [], [], 0
+    for i, tokens in enumerate(token_counts):
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _wait_for_capacity(tokens:int) -> None:
+    requests_per_minute = _settings()['requests_per_minute']
+    tokens_per_minute = _settings()['tokens_per_minute']
+    while True:
+        with _lock:
+            now = time.monotonic()
+            if _limiter['updated'] is None:
+                _limiter.update(requests=requests_per_minute, tokens=tokens_per_minute, updated=now)
+            elapsed = now - _limiter['updated']
+            _limiter['requests'] = min(requests_per_minute, _limiter['requests'] + elapsed * requests_per_minute / 60)
+            _limiter['tokens'] = min(tokens_per_minute, _limiter['tokens'] + elapsed * tokens_per_minute / 60)
+            _limiter['updated'] = now
+
+            # a batch larger than the whole bucket is let through once the bucket is full
+            needed_tokens = min(tokens, tokens_per_minute)
+            wait = _limiter['paused_until'] - now
+            if wait <= 0:
+                if _limiter['requests'] >= 1 and _limiter['tokens'] >= needed_tokens:
+                    _limiter['requests'] -= 1
+                    _limiter['tokens'] -= tokens
+                    return
+                wait = max(
+                    (1 - _limiter['requests']) * 60 / requests_per_minute,
+                    (needed_tokens - _limiter['tokens']) * 60 / tokens_per_minute,
+                )
+        time.sleep(wait)
+
+
+def _status_code(error:Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_delay(error:Exception, attempt:int) -> float | None:
+    """Seconds to wait before retrying, or None if the error is not retryable (only 429s and 5xx are)."""
+    status = _status_code(error)
+    if status != 429 and (status is None or status < 500):
+        return None
+
+    retry_after = getattr(getattr(error, "response", None), "headers", {}).get("retry-after")
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    delay = min(_settings()['backoff_max_seconds'], _settings()['backoff_base_seconds'] * 2 ** attempt)
+    return delay * (0.5 + random.random() / 2)
+
+
+def _embed_batch(texts:list[str], tokens:int) -> list[list[float]]:
+    embedding_model = get_batch_embedding_model()
+    for attempt in range(_settings()['max_retries'] + 1):
+        _wait_for_capacity(tokens)
+        try:
+            embeddings = embedding_model.embed_documents(texts)
+            with _lock:
+                _stats['requests'] += 1
+            record_tokens("embedding", tokens)
+            return embeddings
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None or attempt == _settings()['max_retries']:
+                raise
+            with _lock:
+                _stats['retries'] += 1
+                if _status_code(e) == 429:
+                    _stats['rate_limited'] += 1
+                _limiter['paused_until'] = max(_limiter['paused_until'], time.monotonic() + delay)
+            logger.warning(f"Embedding batch of {len(texts)} texts failed ({e}); retrying in {delay:.1f}s")
+
+
+def embed_texts(texts:list[str]) -> list[list[float]]:
+    """Embed texts in token-budgeted batches, several at a time, within the configured rate limits."""
+    if not texts:
+        return []
+
+    start = time.perf_counter()
+    token_counts = [count_tokens(text) for text in texts]
+    batches = pack_batches(token_counts, _settings()['batch_max_tokens'], _settings()['batch_max_items'])
+
+    with ThreadPoolExecutor(max_workers=min(_settings()['concurrency'], len(batches))) as executor:
+        futures = [
+            executor.submit(_embed_batch, [texts[i] for i in batch], sum(token_counts[i] for i in batch))
+            for batch in batches
+        ]
+        embeddings = [None] * len(texts)
+        for batch, future in zip(batches, futures):
+            for i, embedding in zip(batch, future.result()):
+                embeddings[i] = embedding
+
+    seconds = time.perf_counter() - start
+    total_tokens = sum(token_counts)
+    with _lock:
+        _stats['texts'] += len(texts)
+        _stats['tokens'] += total_tokens
+        _stats['seconds'] += seconds
+    logger.info(
+        f"Embedded {len(texts)} texts ({total_tokens} tokens) in {len(batches)} batches over {seconds:.2f}s "
+        f"({total_tokens / seconds if seconds else 0:.0f} tokens/s)"
+    )
+    return embeddings
+
+
+def get_embedding_scheduler_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "texts_per_second": _stats['texts'] / _stats['seconds'] if _stats['seconds'] else 0.0,
+            "tokens_per_second": _stats['tokens'] / _stats['seconds'] if _stats['seconds'] else 0.0,
+        }
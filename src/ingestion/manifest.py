@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+
+def _manifest_path() -> str:
+    return os.path.join(config['ingestion']['manifest_directory'], f"{config['vector_store']['collection_name']}.json")
+
+
+def file_hash(file_path:str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict:
+    """Return {file path: {"size", "mtime", "hash"}} for every file already ingested into the collection."""
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest:dict) -> None:
+    path = _manifest_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def diff_manifest(manifest:dict, directory:str, file_paths:list[str]) -> dict:
+    """Classify files against the manifest. Returns the change lists and the manifest entries to save on success."""
+    changes = {"added": [], "updated": [], "deleted": [], "skipped": [], "entries": {}}
+
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+        previous = manifest.get(file_path)
+
+        # size and mtime unchanged: trust the previous hash without reading the file
+        if previous and previous['size'] == entry['size'] and previous['mtime'] == entry['mtime']:
+            changes['skipped'].append(file_path)
+            changes['entries'][file_path] = previous
+            continue
+
+        entry['hash'] = file_hash(file_path)
+        changes['entries'][file_path] = entry
+        if previous is None:
+            changes['added'].append(file_path)
+        elif previous['hash'] != entry['hash']:
+            changes['updated'].append(file_path)
+        else:
+            changes['skipped'].append(file_path)
+
+    dir_path = os.path.join(config["source_data"]["document_directory"], directory)
+    prefix = os.path.join(dir_path, "")
+    current = set(file_paths)
+    changes['deleted'] = [path for path in manifest if path.startswith(prefix) and path not in current]
+
+    logger.info(
+        f"Manifest diff for {dir_path}: {len(changes['added'])} added, {len(changes['updated'])} updated, "
+        f"{len(changes['deleted'])} deleted, {len(changes['skipped'])} unchanged"
+    )
+    return changes
+
+
+def apply_changes(manifest:dict, changes:dict, completed:list[str] | None = None) -> dict:
+    """Return the manifest without deleted files and with the entries of `completed` files (default: all) refreshed."""
+    updated = {path: entry for path, entry in manifest.items() if path not in changes['deleted']}
+    for path in changes['entries'] if completed is None else completed:
+        updated[path] = changes['entries'][path]
+    return updated
@@ -0,0 +1,94 @@
+import contextvars
+import queue
+import threading
+import time
+from src.ingestion.document_loader import iter_loaded_files
+from src.ingestion.chunker import load_and_split
+from src.ingestion.chunk_batch import make_chunk_batch
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+
+def iter_chunk_batches(file_paths:list[str], batch_size:int):
+    """Load and chunk files as they finish parsing, yielding bounded batches of chunks.
+
+    Each batch is {"chunks", "documents", "files", "failed"} where `chunks` is a ChunkBatch whose document
+    metadata carries `ingested_at`, `files` lists the files whose last chunk is in this batch or an earlier one,
+    so they are fully indexed once this batch has been upserted, and `failed` lists files that could not be parsed.
+    """
+    texts, metadata, chunk_indices = [], [], []
+    finished, failed, documents_loaded = [], [], 0
+    # files are chunked in the parse workers, which hand back each document's text and chunk offsets
+    for file_path, documents, error in iter_loaded_files(file_paths, loader=load_and_split):
+        if error is not None:
+            failed.append(file_path)
+            continue
+        documents_loaded += len(documents)
+        ingested_at = time.time()
+        for meta, content, spans in documents:
+            # unix seconds; lets queries filter on when a file was (re-)ingested
+            meta['ingested_at'] = ingested_at
+            for i, (start, end) in enumerate(spans):
+                texts.append(content[start:end])
+                metadata.append(meta)
+                chunk_indices.append(i)
+                if len(texts) >= batch_size:
+                    yield {"chunks": make_chunk_batch(texts, metadata, chunk_indices), "documents": documents_loaded,
+                           "files": finished, "failed": failed}
+                    texts, metadata, chunk_indices = [], [], []
+                    finished, failed, documents_loaded = [], [], 0
+        finished.append(file_path)
+
+    if texts or finished or failed:
+        yield {"chunks": make_chunk_batch(texts, metadata, chunk_indices), "documents": documents_loaded,
+               "files": finished, "failed": failed}
+
+
+def run_in_background(iterable, max_queued:int):
+    """Drive `iterable` on a worker thread and yield its items through a bounded queue.
+
+    The worker blocks once `max_queued` items are waiting, which gives backpressure between stages.
+    Exceptions raised by the worker are re-raised in the consumer. If the consumer stops early the
+    worker is told to stop too.
+    """
+    items = queue.Queue(maxsize=max_queued)
+    stop = threading.Event()
+
+    def _put(message) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker():
+        try:
+            for item in iterable:
+                if not _put(("item", item)):
+                    return
+            _put(("done", None))
+        except BaseException as e:
+            _put(("error", e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if callable(close):
+                close()
+
+    # the worker runs in a copy of the caller's context, so its spans land in the caller's trace
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(_worker,), daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+        thread.join()
@@ -1,23 +1,136 @@
+import atexit
+import copy
+import json
 import logging
-from src.config_loader import load_config
-config = load_config()
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from src.config_loader import get_config
+config = get_config()
+
+# Loggers only put records on a bounded queue; a single QueueListener thread formats them and does the
+# console and (rotating) file I/O, so logging never blocks a request on a disk or terminal write.
+# The listener is started on the first record and stopped (after draining the queue) at exit.
+_lock = threading.Lock()
+_queue = queue.Queue(maxsize=config["logging"]["queue_size"])
+_state = {"listener": None, "dropped": 0}
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _SamplingFilter(logging.Filter):
+    """Tag records with the request's trace id and keep only `debug_sample_rate` of debug records.
+
+    Debug records are sampled per trace, so a sampled request keeps all of its debug lines.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # imported here because src.metrics logs through this module
+        from src.metrics import current_trace_id
+        record.trace_id = current_trace_id()
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = config["logging"]["debug_sample_rate"]
+        if record.trace_id is not None:
+            return int(record.trace_id[:8], 16) < rate * 0x100000000
+        return random.random() < rate
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments and render the traceback on the calling thread, as the stdlib handler does, but keep
+        # the traceback in exc_text so the JSON formatter can put it in its own field.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        _start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # the writer cannot keep up; losing a line is better than stalling the request
+            with _lock:
+                _state["dropped"] += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # blocks until the writer has room, so a full queue is still drained on shutdown
+        self.queue.put(self._sentinel)
+
+
+_queue_handler = _DroppingQueueHandler(_queue)
+_queue_handler.addFilter(_SamplingFilter())
+
+
+def _build_handlers() -> list[logging.Handler]:
+    settings = config["logging"]
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(settings["format"]))
+    file_handler = RotatingFileHandler(
+        settings["file"], maxBytes=settings["max_bytes"], backupCount=settings["backup_count"], encoding="utf-8"
+    )
+    file_handler.setFormatter(_JsonFormatter() if settings["json"] else logging.Formatter(settings["format"]))
+    return [console, file_handler]
+
+
+def _start_listener() -> None:
+    if _state["listener"] is not None:
+        return
+    with _lock:
+        if _state["listener"] is None:
+            listener = _Listener(_queue, *_build_handlers(), respect_handler_level=True)
+            listener.start()
+            _state["listener"] = listener
+
+
+def shutdown_logging() -> None:
+    """Write out every queued record and close the log file. The next record starts a new listener."""
+    with _lock:
+        listener, _state["listener"] = _state["listener"], None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logging_stats() -> dict:
+    with _lock:
+        return {"queued": _queue.qsize(), "dropped": _state["dropped"]}
+
 
 def get_logger(name: str) -> logging.Logger:
     try:
         logger = logging.getLogger(name)
-        
-        # configure handler, format, level once here
-        handler = logging.StreamHandler()
-        file_handler = logging.FileHandler(config["logging"]["file"])
-        formatter = logging.Formatter(config["logging"]["format"])
-        handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
-        if not logger.handlers:
-            logger.addHandler(handler)
-            logger.addHandler(file_handler)
+
+        # configure handler and level once here
+        if _queue_handler not in logger.handlers:
+            logger.addHandler(_queue_handler)
 
         logger.setLevel(config["logging"]["level"])
-        
+
         return logger
     except Exception as e:
-        raise Exception(f"Error setting up logger: {e}")
\ No newline at end of file
+        raise Exception(f"Error setting up logger: {e}")
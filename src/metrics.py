@@ -0,0 +1,201 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.config_loader import get_config
+from src.logger import get_logger
+logger = get_logger(__name__)
+config = get_config()
+
+# In-process metrics, rendered in the Prometheus text exposition format by GET /metrics, and per-request
+# traces. A trace lives in a context variable, so spans from coroutines a request gathers, and from
+# background threads started with a copy of its context, all land in that request's trace.
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_traces = OrderedDict()
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+TOKEN_BUCKETS = (0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+_METRICS = {
+    "rag_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage."),
+    "rag_stage_items": ("histogram", "Items a stage produced: retrieved candidates, reranked documents, chunks per batch."),
+    "rag_stage_errors_total": ("counter", "Pipeline stage failures."),
+    "rag_tokens_total": ("counter", "Tokens sent to and received from model APIs."),
+    "rag_context_tokens": ("histogram", "Prompt context tokens per request after packing, and tokens packing saved."),
+    "rag_request_duration_seconds": ("histogram", "HTTP request latency by route and status code."),
+}
+
+
+def _settings() -> dict:
+    return config['metrics']
+
+
+def _key(name:str, labels:dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name:str, value:float, buckets:tuple = LATENCY_BUCKETS, **labels) -> None:
+    with _lock:
+        histogram = _histograms.setdefault(_key(name, labels), {
+            "buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0,
+        })
+        # bucket counts are cumulative, as Prometheus expects
+        for i, bound in enumerate(histogram['buckets']):
+            if value <= bound:
+                histogram['counts'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def increment(name:str, value:float = 1, **labels) -> None:
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_items(stage:str, count:int, pipeline:str = "query") -> None:
+    observe("rag_stage_items", count, COUNT_BUCKETS, pipeline=pipeline, stage=stage)
+
+
+def record_tokens(kind:str, count:int) -> None:
+    if count:
+        increment("rag_tokens_total", count, kind=kind)
+
+
+def record_error(stage:str, pipeline:str = "query") -> None:
+    increment("rag_stage_errors_total", pipeline=pipeline, stage=stage)
+
+
+def _finish_span(stage:str, pipeline:str, start:float) -> None:
+    seconds = time.perf_counter() - start
+    observe("rag_stage_duration_seconds", seconds, pipeline=pipeline, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['spans'].append({
+            "stage": stage, "pipeline": pipeline,
+            "start_ms": (start - trace['start']) * 1000, "duration_ms": seconds * 1000,
+        })
+
+
+@contextmanager
+def span(stage:str, pipeline:str = "query"):
+    """Time a pipeline stage: duration histogram, error counter, and a span in the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage, pipeline)
+        raise
+    finally:
+        _finish_span(stage, pipeline, start)
+
+
+def timed_iter(iterable, stage:str, pipeline:str = "ingestion"):
+    """Yield from `iterable`, timing the production of each item as one span."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except Exception:
+            record_error(stage, pipeline)
+            _finish_span(stage, pipeline, start)
+            raise
+        _finish_span(stage, pipeline, start)
+        yield item
+
+
+def start_trace(name:str) -> str:
+    """Start a trace for the current request (or context) and return its id."""
+    trace = {"trace_id": uuid.uuid4().hex, "name": name, "started_at": time.time(),
+             "start": time.perf_counter(), "duration_ms": None, "spans": [], "attributes": {}}
+    _current_trace.set(trace)
+    with _lock:
+        _traces[trace['trace_id']] = trace
+        while len(_traces) > _settings()['trace_history']:
+            _traces.popitem(last=False)
+    return trace['trace_id']
+
+
+def annotate_trace(**attributes) -> None:
+    """Attach per-request values (e.g. tokens saved) to the current trace, if there is one."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['attributes'].update(attributes)
+
+
+def current_trace_id() -> str | None:
+    trace = _current_trace.get()
+    return trace['trace_id'] if trace is not None else None
+
+
+def finish_trace() -> None:
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace['duration_ms'] = (time.perf_counter() - trace['start']) * 1000
+    if trace['duration_ms'] >= _settings()['slow_request_ms']:
+        breakdown = ", ".join(f"{s['stage']}={s['duration_ms']:.0f}ms" for s in trace['spans'])
+        logger.warning(f"Slow request {trace['name']} ({trace['duration_ms']:.0f}ms, trace {trace['trace_id']}): {breakdown}")
+
+
+def get_trace(trace_id:str) -> dict | None:
+    with _lock:
+        trace = _traces.get(trace_id)
+        if trace is None:
+            return None
+        return {
+            "trace_id": trace['trace_id'],
+            "name": trace['name'],
+            "started_at": trace['started_at'],
+            "duration_ms": trace['duration_ms'],
+            "spans": [dict(s) for s in trace['spans']],
+            "attributes": dict(trace['attributes']),
+        }
+
+
+def _format_labels(labels:tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _lock:
+        names = sorted({name for name, _ in _histograms} | {name for name, _ in _counters})
+        for name in names:
+            kind, help_text = _METRICS.get(name, ("untyped", name))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for (metric, labels), histogram in sorted(_histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(histogram['buckets'], histogram['counts']):
+                    lines.append(f"{name}_bucket{_format_labels(labels, le=f'{bound:g}')} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+            for (metric, labels), value in sorted(_counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _traces.clear()
@@ -1,36 +1,155 @@
-from src.ingestion.document_loader import load_documents
-from src.ingestion.chunker import chunk_documents
+import asyncio
+import threading
+from src.ingestion.document_loader import list_files
+from src.ingestion.manifest import load_manifest, save_manifest, diff_manifest, apply_changes
+from src.ingestion.streaming import iter_chunk_batches, run_in_background
 from src.ingestion.embedder import embed_documents
-from src.indexing.vector_store import index_documents
-from src.retrieval.retriever import retrieve_documents
-from src.retrieval.reranker import rerank_documents
-from src.generation.generator import generate_response
+from src.ingestion.chunk_batch import chunk_count
+from src.indexing.vector_store import index_documents, delete_documents, begin_bulk_load, finish_bulk_load
+from src.indexing import sparse_index
+from src.indexing.filters import is_filtered
+from src.retrieval.retriever import (
+    retrieve_documents, aretrieve_documents, aretrieve_documents_batch, embed_query, aembed_query, embed_queries, uses_embeddings
+)
+from src.retrieval.reranker import rerank_documents, arerank_documents
+from src.generation.generator import generate_response, agenerate_response, astream_response
+from src.generation.context_assembler import assemble_context
 from src.guardrails.guardrails import validate_query, validate_response
-from src.config_loader import load_config
+from src.cache.semantic_cache import lookup_answer, store_answer, invalidate_cache
+from src.cache.embedding_cache import get_embedding_cache_stats
+from src.ingestion.embedding_scheduler import get_embedding_scheduler_stats
+from src.metrics import span, timed_iter, record_items
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
+
+# Ingests run one at a time: each diffs and rewrites the manifest, and the vector store's bulk-load state
+# (deferred write confirmation, paused HNSW indexing) belongs to a single ingest.
+_ingest_lock = threading.Lock()
+
+def _embed_batch(batch:dict) -> dict:
+    record_items("chunks", chunk_count(batch['chunks']), "ingestion")
+    with span("embed", "ingestion"):
+        return dict(batch, chunks=embed_documents(batch['chunks']))
+
 
 def run_ingestion_pipeline(directory:str) -> dict:
+    """Ingest new and changed files of `directory`; a call made while another ingest runs waits for it."""
+    if not _ingest_lock.acquire(blocking=False):
+        logger.info(f"Another ingest is running; {directory} is ingested once it has finished.")
+        _ingest_lock.acquire()
+    try:
+        return _run_ingestion(directory)
+    finally:
+        _ingest_lock.release()
+
+
+def _run_ingestion(directory:str) -> dict:
     try:
         logger.info(f"Starting ingestion pipeline for directory: {directory}")
-        documents = load_documents(directory)
-        logger.info(f"Loaded {len(documents)} documents from directory.")
-        
-        chunks = chunk_documents(documents)
-        logger.info(f"Chunked documents into {len(chunks)} chunks.")
+        manifest = load_manifest()
+        with span("scan", "ingestion"):
+            changes = diff_manifest(manifest, directory, list_files(directory))
+
+        # Points of changed and removed files are dropped first; changed files are then re-added below.
+        # Changed files keep their old manifest entry until fully re-indexed, so a failed run redoes them.
+        with span("delete", "ingestion"):
+            delete_documents(changes['updated'] + changes['deleted'])
+            if config['sparse_index']['enabled']:
+                sparse_index.delete_sources(changes['updated'] + changes['deleted'])
+        if config['sparse_index']['enabled']:
+            # unchanged files indexed before the sparse index existed only need their BM25 postings
+            backfill = sorted(set(changes['skipped']) - sparse_index.indexed_sources(changes['skipped']))
+            with span("sparse_backfill", "ingestion"):
+                for batch in iter_chunk_batches(backfill, config['ingestion']['batch_size']):
+                    sparse_index.add_documents(batch['chunks'])
+            if backfill:
+                logger.info(f"Backfilled the sparse index with {len(backfill)} unchanged files.")
+        manifest = apply_changes(manifest, changes, completed=changes['skipped'])
+        save_manifest(manifest)
+
+        # load+chunk, embed and upsert run concurrently on bounded batches; each stage blocks once
+        # `queue_size` batches are waiting downstream, so memory stays flat regardless of corpus size
+        batch_size = config['ingestion']['batch_size']
+        queue_size = config['ingestion']['queue_size']
+        batches = run_in_background(
+            timed_iter(iter_chunk_batches(changes['added'] + changes['updated'], batch_size), "load_and_chunk"), queue_size
+        )
+        embedded_batches = run_in_background((_embed_batch(batch) for batch in batches), queue_size)
+
+        cache_before = get_embedding_cache_stats()
+        scheduler_before = get_embedding_scheduler_stats()
+        documents_loaded, chunks_created, files_done, files_failed, batch_count = 0, 0, 0, 0, 0
+        files_total = len(changes['added']) + len(changes['updated'])
+        # writes of this ingest may be applied asynchronously (and HNSW indexing paused) until finish_bulk_load()
+        begin_bulk_load()
+        try:
+            for batch in embedded_batches:
+                if chunk_count(batch['chunks']):
+                    with span("index", "ingestion"):
+                        indexing_result = index_documents(batch['chunks'])
+                        if indexing_result['status'] != "success":
+                            raise RuntimeError(f"Indexing failed for batch {batch_count + 1}")
+                    if config['sparse_index']['enabled']:
+                        with span("sparse_index", "ingestion"):
+                            sparse_index.add_documents(batch['chunks'])
 
-        embedded_chunks = embed_documents(chunks)
-        logger.info(f"Generated embeddings for {len(embedded_chunks)} chunks.")
+                # record finished files straight away so a later failure resumes after them
+                for file_path in batch['files']:
+                    manifest[file_path] = changes['entries'][file_path]
+                save_manifest(manifest)
 
-        indexing_result = index_documents(embedded_chunks)
-        logger.info(f"Indexing result: {indexing_result}")
+                batch_count += 1
+                documents_loaded += batch['documents']
+                chunks_created += chunk_count(batch['chunks'])
+                files_done += len(batch['files'])
+                files_failed += len(batch['failed'])
+                logger.info(f"Batch {batch_count}: indexed {chunk_count(batch['chunks'])} chunks ({chunks_created} total), {files_done}/{files_total} files done.")
+        except BaseException:
+            # the ingest has already failed; a failing flush is logged rather than replacing that error
+            try:
+                with span("flush", "ingestion"):
+                    finish_bulk_load()
+            except Exception as e:
+                logger.error(f"Flushing the vector store after a failed ingest failed too: {e}")
+            raise
+        with span("flush", "ingestion"):
+            finish_bulk_load()
+
+        cache_after = get_embedding_cache_stats()
+        scheduler_after = get_embedding_scheduler_stats()
+        embedding_seconds = scheduler_after['seconds'] - scheduler_before['seconds']
+        cache_hits = cache_after['hits'] - cache_before['hits']
+        cache_lookups = cache_hits + cache_after['misses'] - cache_before['misses']
+        logger.info(f"Generated embeddings for {chunks_created} chunks ({cache_hits} from cache).")
+
+        if changes['added'] or changes['updated'] or changes['deleted']:
+            invalidate_cache()
 
         result_summary = {
-            "status":indexing_result['status'],
-            "documents_loaded": len(documents),
-            "chunks_created": len(chunks),
-            "collection": indexing_result['collection']
+            "status": "success",
+            "documents_loaded": documents_loaded,
+            "chunks_created": chunks_created,
+            "collection": config['vector_store']['collection_name'],
+            "batches": batch_count,
+            "files_added": len(changes['added']),
+            "files_updated": len(changes['updated']),
+            "files_deleted": len(changes['deleted']),
+            "files_skipped": len(changes['skipped']),
+            "files_failed": files_failed,
+            "embedding_cache": {
+                "hits": cache_hits,
+                "misses": cache_lookups - cache_hits,
+                "hit_rate": cache_hits / cache_lookups if cache_lookups else 0.0,
+                "evictions": cache_after['evictions'] - cache_before['evictions'],
+            },
+            "embedding_throughput": {
+                "requests": scheduler_after['requests'] - scheduler_before['requests'],
+                "retries": scheduler_after['retries'] - scheduler_before['retries'],
+                "rate_limited": scheduler_after['rate_limited'] - scheduler_before['rate_limited'],
+                "tokens_per_second": (scheduler_after['tokens'] - scheduler_before['tokens']) / embedding_seconds if embedding_seconds else 0.0,
+            }
         }
         
         return result_summary
@@ -38,33 +157,291 @@ def run_ingestion_pipeline(directory:str) -> dict:
         logger.error(f"Ingestion pipeline failed: {e}")
         return {"status": "failed", "documents_loaded": 0, "chunks_created": 0, "collection": ""}
 
-def run_query_pipeline(query:str) -> dict:
+def _lookup_answer(query_embedding, filters:dict | None, use_cache:bool = True) -> dict | None:
+    # the semantic cache matches on the query alone, so filtered queries neither read nor fill it
+    return None if not use_cache or is_filtered(filters) else lookup_answer(query_embedding)
+
+
+def _store_answer(query:str, query_embedding, result:dict, filters:dict | None, use_cache:bool = True) -> None:
+    if use_cache and not is_filtered(filters):
+        store_answer(query, query_embedding, result)
+
+
+def _with_contexts(result:dict, return_contexts:bool) -> dict:
+    # cached answers keep their contexts; answers cached before contexts were stored have none
+    if return_contexts:
+        return {"contexts": [], **result}
+    return {key: value for key, value in result.items() if key != "contexts"}
+
+
+def run_query_pipeline(query:str, return_contexts:bool = False, filters:dict | None = None,
+                       use_cache:bool = True) -> dict:
+    """Answer one query. With `return_contexts`, the result also has the reranked chunk texts the answer was generated from.
+
+    `filters` (see src/indexing/filters.py) restrict retrieval to matching chunks. With `use_cache=False` the
+    semantic cache is neither read nor filled, so the answer is always generated from freshly retrieved chunks.
+    """
     try:
-        is_valid, reason = validate_query(query)
+        with span("validate_query"):
+            is_valid, reason = validate_query(query)
         if not is_valid:
             logger.warning(f"Query validation failed: {reason}")
             return {"answer": reason, "sources": [], "model": ""}
         
         logger.info(f"Starting query pipeline for query: {query[:50]}...")
-        retrieved_docs = retrieve_documents(query)
-        logger.info(f"Retrieved {len(retrieved_docs)} documents for the query.")
+        query_embedding = None
+        if uses_embeddings():
+            with span("embed"):
+                query_embedding = embed_query(query)
+        with span("semantic_cache"):
+            cached = _lookup_answer(query_embedding, filters, use_cache)
+        if cached is not None:
+            logger.debug("Serving answer from semantic cache.")
+            return _with_contexts(cached, return_contexts)
 
-        reranked_docs = rerank_documents(query, retrieved_docs)
-        logger.info(f"Reranked documents, top score: {reranked_docs[0]['score'] if reranked_docs else 'N/A'}")
+        with span("retrieve"):
+            retrieved_docs = retrieve_documents(query, query_embedding, filters)
+        record_items("retrieve", len(retrieved_docs))
+        logger.debug(f"Retrieved {len(retrieved_docs)} documents for the query.")
 
-        response = generate_response(query, reranked_docs)
-        logger.info(f"Generated response for the query.")
+        with span("rerank"):
+            reranked_docs = rerank_documents(query, retrieved_docs)
+        record_items("rerank", len(reranked_docs))
+        logger.debug(f"Reranked documents, top score: {reranked_docs[0]['score'] if reranked_docs else 'N/A'}")
+        with span("assemble_context"):
+            context_docs = assemble_context(reranked_docs)
+
+        with span("generate"):
+            response = generate_response(query, context_docs)
+        logger.debug(f"Generated response for the query.")
         
         result_summary = {
             "answer": response['answer'],
             "sources": response['sources'],
             "model": response['model']
         }
-        is_valid, reason = validate_response(result_summary)
+        contexts = [doc['content'] for doc in context_docs]
+        with span("validate_response"):
+            is_valid, reason = validate_response(result_summary)
         if not is_valid:
             logger.warning(f"Response validation failed: {reason}")
+        else:
+            _store_answer(query, query_embedding, {**result_summary, "contexts": contexts}, filters, use_cache)
         
-        return result_summary
+        return {**result_summary, "contexts": contexts} if return_contexts else result_summary
+    except Exception as e:
+        logger.error(f"Query pipeline failed: {e}")
+        return {"answer": "Sorry, an error occurred while processing your query.", "sources": [], "model": ""}
+
+
+async def arun_query_pipeline(query:str, return_contexts:bool = False, filters:dict | None = None,
+                              use_cache:bool = True) -> dict:
+    """Answer one query. With `return_contexts`, the result also has the reranked chunk texts the answer was generated from.
+
+    `filters` (see src/indexing/filters.py) restrict retrieval to matching chunks. With `use_cache=False` the
+    semantic cache is neither read nor filled, so the answer is always generated from freshly retrieved chunks.
+    """
+    try:
+        with span("validate_query"):
+            is_valid, reason = validate_query(query)
+        if not is_valid:
+            logger.warning(f"Query validation failed: {reason}")
+            return {"answer": reason, "sources": [], "model": ""}
+
+        logger.info(f"Starting async query pipeline for query: {query[:50]}...")
+        query_embedding = None
+        if uses_embeddings():
+            with span("embed"):
+                query_embedding = await aembed_query(query)
+        with span("semantic_cache"):
+            cached = _lookup_answer(query_embedding, filters, use_cache)
+        if cached is not None:
+            logger.debug("Serving answer from semantic cache.")
+            return _with_contexts(cached, return_contexts)
+
+        with span("retrieve"):
+            retrieved_docs = await aretrieve_documents(query, query_embedding, filters)
+        record_items("retrieve", len(retrieved_docs))
+        logger.debug(f"Retrieved {len(retrieved_docs)} documents for the query.")
+
+        with span("rerank"):
+            reranked_docs = await arerank_documents(query, retrieved_docs)
+        record_items("rerank", len(reranked_docs))
+        logger.debug(f"Reranked documents, top score: {reranked_docs[0]['score'] if reranked_docs else 'N/A'}")
+        with span("assemble_context"):
+            context_docs = assemble_context(reranked_docs)
+
+        with span("generate"):
+            response = await agenerate_response(query, context_docs)
+        logger.debug(f"Generated response for the query.")
+
+        result_summary = {
+            "answer": response['answer'],
+            "sources": response['sources'],
+            "model": response['model']
+        }
+        contexts = [doc['content'] for doc in context_docs]
+        with span("validate_response"):
+            is_valid, reason = validate_response(result_summary)
+        if not is_valid:
+            logger.warning(f"Response validation failed: {reason}")
+        else:
+            _store_answer(query, query_embedding, {**result_summary, "contexts": contexts}, filters, use_cache)
+
+        return {**result_summary, "contexts": contexts} if return_contexts else result_summary
     except Exception as e:
         logger.error(f"Query pipeline failed: {e}")
         return {"answer": "Sorry, an error occurred while processing your query.", "sources": [], "model": ""}
+
+
+def _batch_error(message:str) -> dict:
+    return {"answer": "", "sources": [], "model": "", "error": message}
+
+
+async def arun_query_pipeline_batch(queries:list[str], filters:dict | None = None) -> list[dict]:
+    """Answer many queries; returns one {"answer", "sources", "model", "error"} per query, in input order.
+
+    Identical queries are answered once. All queries are embedded in token-budgeted batches and searched
+    in one vector-store call; reranking and generation then run `query_batch.concurrency` queries at a time.
+    A failure only sets `error` on the queries it affects. `filters` apply to every query.
+    """
+    results = {}
+    unique = []
+    for query in dict.fromkeys(queries):
+        with span("validate_query", "query_batch"):
+            is_valid, reason = validate_query(query)
+        if is_valid:
+            unique.append(query)
+        else:
+            logger.warning(f"Query validation failed: {reason}")
+            results[query] = _batch_error(reason)
+    logger.info(f"Starting batch query pipeline for {len(queries)} queries ({len(unique)} unique and valid).")
+
+    pending = []
+    try:
+        embeddings = [None] * len(unique)
+        if uses_embeddings() and unique:
+            with span("embed", "query_batch"):
+                embeddings = await asyncio.to_thread(embed_queries, unique)
+        for query, query_embedding in zip(unique, embeddings):
+            with span("semantic_cache", "query_batch"):
+                cached = _lookup_answer(query_embedding, filters)
+            if cached is not None:
+                results[query] = {**_with_contexts(cached, False), "error": None}
+            else:
+                pending.append((query, query_embedding))
+        logger.info(f"Served {len(unique) - len(pending)} batch queries from semantic cache.")
+
+        retrieved = []
+        if pending:
+            with span("retrieve", "query_batch"):
+                retrieved = await aretrieve_documents_batch([query for query, _ in pending], [e for _, e in pending], filters)
+        for docs in retrieved:
+            record_items("retrieve", len(docs), "query_batch")
+    except Exception as e:
+        logger.error(f"Batch query pipeline failed: {e}")
+        for query in unique:
+            results.setdefault(query, _batch_error("Sorry, an error occurred while processing your query."))
+        return [dict(results[query]) for query in queries]
+
+    semaphore = asyncio.Semaphore(config['query_batch']['concurrency'])
+
+    async def answer(query:str, query_embedding:list[float] | None, retrieved_docs:list[dict]) -> dict:
+        async with semaphore:
+            try:
+                with span("rerank", "query_batch"):
+                    reranked_docs = await arerank_documents(query, retrieved_docs)
+                record_items("rerank", len(reranked_docs), "query_batch")
+                with span("assemble_context", "query_batch"):
+                    context_docs = assemble_context(reranked_docs)
+                with span("generate", "query_batch"):
+                    response = await agenerate_response(query, context_docs)
+                result_summary = {
+                    "answer": response['answer'],
+                    "sources": response['sources'],
+                    "model": response['model']
+                }
+                with span("validate_response", "query_batch"):
+                    is_valid, reason = validate_response(result_summary)
+                if not is_valid:
+                    logger.warning(f"Response validation failed: {reason}")
+                else:
+                    _store_answer(query, query_embedding, {**result_summary, "contexts": [doc['content'] for doc in context_docs]}, filters)
+                return {**result_summary, "error": None}
+            except Exception as e:
+                logger.error(f"Query pipeline failed for batch query '{query[:50]}': {e}")
+                return _batch_error("Sorry, an error occurred while processing your query.")
+
+    answers = await asyncio.gather(*(
+        answer(query, query_embedding, docs) for (query, query_embedding), docs in zip(pending, retrieved)
+    ))
+    for (query, _), result in zip(pending, answers):
+        results[query] = result
+    logger.info(f"Finished batch query pipeline: {sum(r['error'] is None for r in results.values())}/{len(results)} unique queries answered.")
+    return [dict(results[query]) for query in queries]
+
+
+def run_query_pipeline_batch(queries:list[str], filters:dict | None = None) -> list[dict]:
+    """Blocking wrapper around arun_query_pipeline_batch for scripts and offline jobs."""
+    return asyncio.run(arun_query_pipeline_batch(queries, filters))
+
+
+async def astream_query_pipeline(query:str, filters:dict | None = None):
+    """Yield pipeline events: sources once reranking finishes, then answer tokens, then a final done event."""
+    try:
+        with span("validate_query", "query_stream"):
+            is_valid, reason = validate_query(query)
+        if not is_valid:
+            logger.warning(f"Query validation failed: {reason}")
+            yield {"event": "error", "data": {"detail": reason}}
+            return
+
+        logger.info(f"Starting streaming query pipeline for query: {query[:50]}...")
+        query_embedding = None
+        if uses_embeddings():
+            with span("embed", "query_stream"):
+                query_embedding = await aembed_query(query)
+        with span("semantic_cache", "query_stream"):
+            cached = _lookup_answer(query_embedding, filters)
+        if cached is not None:
+            logger.debug("Serving streamed answer from semantic cache.")
+            yield {"event": "sources", "data": {"sources": cached['sources'], "model": cached['model']}}
+            yield {"event": "token", "data": {"text": cached['answer']}}
+            yield {"event": "done", "data": {"valid": True, "reason": "Served from semantic cache.", "model": cached['model']}}
+            return
+
+        with span("retrieve", "query_stream"):
+            retrieved_docs = await aretrieve_documents(query, query_embedding, filters)
+        record_items("retrieve", len(retrieved_docs), "query_stream")
+        logger.debug(f"Retrieved {len(retrieved_docs)} documents for the query.")
+
+        with span("rerank", "query_stream"):
+            reranked_docs = await arerank_documents(query, retrieved_docs)
+        record_items("rerank", len(reranked_docs), "query_stream")
+        logger.debug(f"Reranked documents, top score: {reranked_docs[0]['score'] if reranked_docs else 'N/A'}")
+        with span("assemble_context", "query_stream"):
+            context_docs = assemble_context(reranked_docs)
+
+        sources = list(set([doc['metadata']['source'] for doc in context_docs]))
+        yield {"event": "sources", "data": {"sources": sources, "model": config['llm']['model_name']}}
+
+        answer = ""
+        # includes the time the client takes to read each token
+        with span("generate", "query_stream"):
+            async for token in astream_response(query, context_docs):
+                answer += token
+                yield {"event": "token", "data": {"text": token}}
+        logger.debug(f"Streamed response for the query.")
+
+        result_summary = {"answer": answer, "sources": sources, "model": config['llm']['model_name']}
+        with span("validate_response", "query_stream"):
+            is_valid, reason = validate_response(result_summary)
+        if not is_valid:
+            logger.warning(f"Response validation failed: {reason}")
+        else:
+            _store_answer(query, query_embedding, {**result_summary, "contexts": [doc['content'] for doc in context_docs]}, filters)
+
+        yield {"event": "done", "data": {"valid": is_valid, "reason": reason, "model": result_summary['model']}}
+    except Exception as e:
+        logger.error(f"Streaming query pipeline failed: {e}")
+        yield {"event": "error", "data": {"detail": "Sorry, an error occurred while processing your query."}}
@@ -1,8 +1,145 @@
-import cohere
-from src.config_loader import load_config
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from src.clients import get_cohere_client, get_async_cohere_client, get_cross_encoder
+from src.metrics import record_error
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
+
+# Rerank scores are absolute relevance values for a (query, chunk) pair, so they are cached per
+# (query hash, chunk id) and reused whatever the other candidates are; only unseen chunks are scored.
+_lock = threading.Lock()
+_score_cache = OrderedDict()
+_stats = {"requests": 0, "reranked": 0, "skipped_single": 0, "skipped_all_kept": 0, "skipped_margin": 0,
+          "cache_hits": 0, "cache_misses": 0, "errors": 0}
+
+
+def _settings() -> dict:
+    return config['reranker']
+
+
+def _cohere_scores(query:str, contents:list[str]) -> list[float]:
+    response = get_cohere_client().rerank(
+        model=_settings()['model_name'], top_n=len(contents), query=query, documents=contents
+    )
+    scores = [0.0] * len(contents)
+    for result in response.results:
+        scores[result.index] = result.relevance_score
+    return scores
+
+
+async def _acohere_scores(query:str, contents:list[str]) -> list[float]:
+    response = await get_async_cohere_client().rerank(
+        model=_settings()['model_name'], top_n=len(contents), query=query, documents=contents
+    )
+    scores = [0.0] * len(contents)
+    for result in response.results:
+        scores[result.index] = result.relevance_score
+    return scores
+
+
+def _cross_encoder_scores(query:str, contents:list[str]) -> list[float]:
+    scores = get_cross_encoder().predict([(query, content) for content in contents], batch_size=_settings()['batch_size'])
+    return [float(score) for score in scores]
+
+
+async def _across_encoder_scores(query:str, contents:list[str]) -> list[float]:
+    # CPU-bound model inference runs off the event loop
+    return await asyncio.to_thread(_cross_encoder_scores, query, contents)
+
+
+# backend name -> (sync scorer, async scorer); each returns one relevance score per content, in order
+_SCORERS = {
+    "cohere": (_cohere_scores, _acohere_scores),
+    "cross_encoder": (_cross_encoder_scores, _across_encoder_scores),
+}
+
+
+def _skip_reason(documents:list[dict]) -> str | None:
+    if len(documents) < 2:
+        return "single"
+    if _settings()['skip_when_all_kept'] and len(documents) <= _settings()['top_n']:
+        return "all_kept"
+    # dense cosine scores are comparable across queries; RRF and BM25 scores are not
+    if config['retriever']['mode'] == "dense" and _settings()['skip_margin'] > 0:
+        best, runner_up = sorted((doc['score'] for doc in documents), reverse=True)[:2]
+        if best - runner_up >= _settings()['skip_margin']:
+            return "margin"
+    return None
+
+
+def _cache_keys(query:str, documents:list[dict]) -> list[tuple[str, str]]:
+    query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+    return [
+        (query_hash, doc.get('id') or hashlib.sha256(doc['content'].encode("utf-8")).hexdigest())
+        for doc in documents
+    ]
+
+
+def _lookup_scores(keys:list[tuple[str, str]]) -> dict[int, float]:
+    with _lock:
+        found = {}
+        for i, key in enumerate(keys):
+            if key in _score_cache:
+                _score_cache.move_to_end(key)
+                found[i] = _score_cache[key]
+        _stats['cache_hits'] += len(found)
+        _stats['cache_misses'] += len(keys) - len(found)
+        return found
+
+
+def _store_scores(keys:list[tuple[str, str]], scores:dict[int, float]) -> None:
+    with _lock:
+        for i, score in scores.items():
+            _score_cache[keys[i]] = score
+            _score_cache.move_to_end(keys[i])
+        while len(_score_cache) > _settings()['cache_size']:
+            _score_cache.popitem(last=False)
+
+
+def _to_reranked(documents:list[dict], scores:list[float]) -> list[dict]:
+    reranked_docs = []
+    for doc, score in zip(documents, scores):
+        reranked_docs.append({
+            "id": doc.get('id'),
+            "content": doc['content'],
+            "metadata": doc['metadata'],
+            "original_score": doc['score'],
+            "score": score
+        })
+    # Sort by rerank score
+    reranked_docs.sort(key=lambda x: x['score'], reverse=True)
+    reranked_docs = reranked_docs[:_settings()['top_n']]
+    logger.debug(f"Reranked to top {len(reranked_docs)} documents based on relevance scores.")
+    return reranked_docs
+
+
+def _start(query:str, documents:list[dict]) -> tuple[str | None, list, dict, list[int]]:
+    """Count the request and return (skip reason, cache keys, cached scores, positions still to score)."""
+    with _lock:
+        _stats['requests'] += 1
+    reason = _skip_reason(documents)
+    if reason is not None:
+        with _lock:
+            _stats[f"skipped_{reason}"] += 1
+        logger.debug(f"Skipping rerank of {len(documents)} documents ({reason}).")
+        return reason, [], {}, []
+
+    keys = _cache_keys(query, documents)
+    scores = _lookup_scores(keys)
+    return None, keys, scores, [i for i in range(len(documents)) if i not in scores]
+
+
+def _finish(documents:list[dict], keys:list, scores:dict, missing:list[int], new_scores:list[float]) -> list[dict]:
+    fresh = dict(zip(missing, new_scores))
+    _store_scores(keys, fresh)
+    scores.update(fresh)
+    with _lock:
+        _stats['reranked'] += 1
+    return _to_reranked(documents, [scores[i] for i in range(len(documents))])
 
 
 def rerank_documents(query:str, documents:list[dict]) -> list[dict]:
@@ -14,34 +151,57 @@ def rerank_documents(query:str, documents:list[dict]) -> list[dict]:
         logger.warning("No documents provided for reranking")
         return []
 
-    cohere_client = cohere.Client(api_key=config['credentials']['cohere_api_key'])
+    skip_reason, keys, scores, missing = _start(query, documents)
+    if skip_reason is not None:
+        return _to_reranked(documents, [doc['score'] for doc in documents])
+
+    try:
+        score = _SCORERS[_settings()['backend']][0]
+        new_scores = score(query, [documents[i]['content'] for i in missing]) if missing else []
+        return _finish(documents, keys, scores, missing, new_scores)
+    except Exception as e:
+        with _lock:
+            _stats['errors'] += 1
+        # the original order is served, so the rerank span itself succeeds
+        record_error("rerank")
+        logger.error(f"Error during reranking: {e}")
+        return documents
+
 
-    
-    # Prepare the input for the reranking model
-    inputs = [doc['content'] for doc in documents]
+async def arerank_documents(query:str, documents:list[dict]) -> list[dict]:
+    if not query:
+        logger.warning("No query provided for reranking")
+        return documents
 
+    if not documents:
+        logger.warning("No documents provided for reranking")
+        return []
+
+    skip_reason, keys, scores, missing = _start(query, documents)
+    if skip_reason is not None:
+        return _to_reranked(documents, [doc['score'] for doc in documents])
 
-    # Get relevance scores from Cohere
     try:
-        response = cohere_client.rerank(
-            model=config['reranker']['model_name'],
-            top_n=config['reranker']['top_n'],
-            query=query,
-            documents=inputs
-        )
-        reranked_docs = []
-        for i, result in enumerate(response.results):
-            doc = documents[result.index]
-            reranked_docs.append({
-                "content": doc['content'],
-                "metadata": doc['metadata'],
-                "original_score": doc['score'],
-                "score": result.relevance_score
-            })
-        # Sort by rerank score
-        reranked_docs.sort(key=lambda x: x['score'], reverse=True)
-        logger.info(f"Reranked to top {len(reranked_docs)} documents based on relevance scores.")
-        return reranked_docs
+        ascore = _SCORERS[_settings()['backend']][1]
+        new_scores = await ascore(query, [documents[i]['content'] for i in missing]) if missing else []
+        return _finish(documents, keys, scores, missing, new_scores)
     except Exception as e:
+        with _lock:
+            _stats['errors'] += 1
+        # the original order is served, so the rerank span itself succeeds
+        record_error("rerank")
         logger.error(f"Error during reranking: {e}")
-        return documents
\ No newline at end of file
+        return documents
+
+
+def get_reranker_stats() -> dict:
+    with _lock:
+        lookups = _stats['cache_hits'] + _stats['cache_misses']
+        skipped = _stats['skipped_single'] + _stats['skipped_all_kept'] + _stats['skipped_margin']
+        return {
+            **_stats,
+            "skipped": skipped,
+            "skip_rate": skipped / _stats['requests'] if _stats['requests'] else 0.0,
+            "cache_size": len(_score_cache),
+            "cache_hit_rate": _stats['cache_hits'] / lookups if lookups else 0.0,
+        }
@@ -1,47 +1,125 @@
-from qdrant_client import QdrantClient
-from langchain_openai.embeddings import OpenAIEmbeddings
-from src.config_loader import load_config
+import asyncio
+from src.clients import get_embedding_model
+from src.indexing.vector_store import search_vectors, asearch_vectors, asearch_vectors_batch
+from src.ingestion.embedding_scheduler import embed_texts, estimate_tokens
+from src.metrics import record_tokens
+from src.indexing import sparse_index
+from src.config_loader import get_config
 from src.logger import get_logger
 logger = get_logger(__name__)
-config = load_config()
+config = get_config()
 
 
-def retrieve_documents(query:str) -> list[dict]:
+def _to_documents(hits:list[dict], threshold:float | None = None) -> list[dict]:
+    retrieved_docs = []
+    for hit in hits:
+        retrieved_docs.append({
+            "id": hit['id'],
+            "content": hit['payload'].get("content", ""),
+            "metadata": {k: v for k, v in hit['payload'].items() if k != "content"},
+            "score": hit['score'],
+        })
+    results = [r for r in retrieved_docs if threshold is None or r['score'] >= threshold]
+
+    logger.debug(f"Retrieved {len(retrieved_docs)} documents for the query.")
+    if threshold is not None:
+        logger.debug(f"Filtered to {len(results)} documents based on similarity threshold.")
+
+    return results
+
+
+def _fuse(result_lists:list[list[dict]]) -> list[dict]:
+    """Reciprocal rank fusion: a document at rank r of any list gains 1 / (rrf_k + r)."""
+    fused = {}
+    for docs in result_lists:
+        for rank, doc in enumerate(docs, start=1):
+            entry = fused.setdefault(doc['id'], {**doc, "score": 0.0})
+            entry['score'] += 1 / (config['retriever']['rrf_k'] + rank)
+    return sorted(fused.values(), key=lambda doc: doc['score'], reverse=True)[:config['retriever']['top_k']]
+
+
+def _fields() -> list[str]:
+    return config['retriever']['payload_fields']
+
+
+def _lexical_documents(query:str, filters:dict | None = None) -> list[dict]:
+    return _to_documents(sparse_index.search(query, config['retriever']['top_k'], filters, _fields()))
+
+
+async def _alexical_documents(queries:list[str], filters:dict | None = None) -> list[list[dict]]:
+    # BM25 scoring and the SQLite payload reads block, so async callers run them on a worker thread
+    return await asyncio.to_thread(lambda: [_lexical_documents(query, filters) for query in queries])
+
+
+def uses_embeddings() -> bool:
+    """False in lexical mode, where retrieval needs no query embedding at all."""
+    return config['retriever']['mode'] != "lexical"
+
+
+def embed_query(query:str) -> list[float]:
+    # only feeds a counter, and tokenizing would load (and may download) the tiktoken encoding on the request path
+    record_tokens("embedding", estimate_tokens(query))
+    return get_embedding_model().embed_query(query)
+
+
+async def aembed_query(query:str) -> list[float]:
+    record_tokens("embedding", estimate_tokens(query))
+    return await get_embedding_model().aembed_query(query)
+
+
+def embed_queries(queries:list[str]) -> list[list[float]]:
+    """Embed many queries through the token-budgeted, rate-limited batch embedder."""
+    return embed_texts(queries)
+
+
+def retrieve_documents(query:str, query_embedding:list[float] | None = None, filters:dict | None = None) -> list[dict]:
+    """Top-k chunks for the query; `filters` (see src/indexing/filters.py) restrict the search to matching chunks."""
     if not query:
         logger.warning("No query provided for retrieval")
         return []
 
-    client = QdrantClient(
-        url=config['vector_store']['url'],
-        prefer_grpc=True,
-    )
+    if not uses_embeddings():
+        return _lexical_documents(query, filters)
+
+    # Generate embedding for the query unless the caller already has one
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+
+    # Search for similar documents
+    hits = search_vectors(query_embedding, config['retriever']['top_k'], filters, _fields())
+    dense_docs = _to_documents(hits, config['retriever']['similarity_threshold'])
+    if config['retriever']['mode'] == "hybrid":
+        return _fuse([dense_docs, _lexical_documents(query, filters)])
+    return dense_docs
+
 
-    if not client.has_collection(config['vector_store']['collection_name']):
-        logger.warning(f"Collection '{config['vector_store']['collection_name']}' does not exist.")
+async def aretrieve_documents(query:str, query_embedding:list[float] | None = None, filters:dict | None = None) -> list[dict]:
+    if not query:
+        logger.warning("No query provided for retrieval")
         return []
 
-    # Generate embedding for the query
-    embedding_model = OpenAIEmbeddings(model=config["embedding"]["model_name"], openai_api_key=config["credentials"]['openai_api_key'])
-    query_embedding = embedding_model.embed_query(query)
+    if not uses_embeddings():
+        return (await _alexical_documents([query], filters))[0]
 
-    # Search for similar documents
-    search_result = client.search(
-        collection_name=config['vector_store']['collection_name'],
-        query_vector=query_embedding,
-        limit=config['retriever']['top_k']
-    )
-    
+    if query_embedding is None:
+        query_embedding = await aembed_query(query)
 
-    retrieved_docs = []
-    for hit in search_result:
-        retrieved_docs.append({
-            "content": hit.payload.get("content", ""),
-            "metadata": {k: v for k, v in hit.payload.items() if k != "content"},
-            "score": hit.score,
-        })
-    results = [r for r in retrieved_docs if r['score'] >= config['retriever']['similarity_threshold']]
+    hits = await asearch_vectors(query_embedding, config['retriever']['top_k'], filters, _fields())
+    dense_docs = _to_documents(hits, config['retriever']['similarity_threshold'])
+    if config['retriever']['mode'] == "hybrid":
+        return _fuse([dense_docs, (await _alexical_documents([query], filters))[0]])
+    return dense_docs
+
+
+async def aretrieve_documents_batch(queries:list[str], query_embeddings:list[list[float] | None],
+                                    filters:dict | None = None) -> list[list[dict]]:
+    """Retrieve for many queries with a single vector-store call; returns one document list per query, in order."""
+    if not uses_embeddings():
+        return await _alexical_documents(queries, filters)
 
-    logger.info(f"Retrieved {len(retrieved_docs)} documents for the query.")
-    logger.info(f"Filtered to {len(results)} documents based on similarity threshold.")
-    
-    return results
\ No newline at end of file
+    hits = await asearch_vectors_batch(query_embeddings, config['retriever']['top_k'], filters, _fields())
+    dense_docs = [_to_documents(query_hits, config['retriever']['similarity_threshold']) for query_hits in hits]
+    if config['retriever']['mode'] == "hybrid":
+        lexical_docs = await _alexical_documents(queries, filters)
+        return [_fuse([docs, lexical]) for docs, lexical in zip(dense_docs, lexical_docs)]
+    return dense_docs
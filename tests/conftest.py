@@ -0,0 +1,16 @@
+import tempfile
+from pathlib import Path
+import pytest
+from src.config_loader import get_config
+
+# Test runs log to a throwaway directory instead of the configured app.log (and its rotated backups) in the repo root.
+# Set before any test module is imported, so the first record already opens this file.
+_LOG_FILE = str(Path(tempfile.mkdtemp(prefix="rag-test-logs-")) / "app.log")
+get_config()["logging"]["file"] = _LOG_FILE
+
+
+@pytest.fixture(autouse=True)
+def _log_to_temp_file():
+    # reload_config() re-reads config.yaml into the shared dict, which points logging back at app.log
+    yield
+    get_config()["logging"]["file"] = _LOG_FILE
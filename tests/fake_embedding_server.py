@@ -0,0 +1,71 @@
+import base64
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+def fake_embedding(text:str, dim:int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def start_fake_embedding_server(dim:int = 8, rate_limit_first:int = 0) -> dict:
+    """Serve an OpenAI-compatible POST /v1/embeddings on localhost.
+
+    The first `rate_limit_first` requests get a 429. Returns {"url", "requests", "inputs", "stop"}.
+    """
+    state = {"requests": 0, "inputs": 0, "lock": threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with state["lock"]:
+                state["requests"] += 1
+                throttled = state["requests"] <= rate_limit_first
+            if throttled:
+                payload = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode()
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("retry-after", "0.01")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            with state["lock"]:
+                state["inputs"] += len(inputs)
+            data = []
+            for i, text in enumerate(inputs):
+                vector = fake_embedding(str(text), dim)
+                if body.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            payload = json.dumps({
+                "object": "list", "data": data, "model": body["model"],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    state["stop"] = stop
+    return state
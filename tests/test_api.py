@@ -1,6 +1,8 @@
+import asyncio
 from fastapi.testclient import TestClient
 from unittest.mock import patch
 from api.main import app
+from src.metrics import span, finish_trace
 
 client = TestClient(app)
 
@@ -29,15 +31,138 @@ def test_ingest_failure():
 
 def test_query_success():
     mock_result = {"answer": "Attention is a mechanism in neural networks.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
-    with patch("api.main.run_query_pipeline", return_value=mock_result):
+    with patch("api.main.arun_query_pipeline", return_value=mock_result):
         response = client.post("/query", json={"query": "What is attention?"})
     assert response.status_code == 200
     assert response.json()["answer"].startswith("Attention is a mechanism")
 
 
+def test_query_filters_reach_the_pipeline_as_unix_seconds():
+    mock_result = {"answer": "Attention is a mechanism in neural networks.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    body = {"query": "What is attention?",
+            "filters": {"file_types": ["pdf"], "ingested_after": "2024-01-01T00:00:00Z"}}
+    with patch("api.main.arun_query_pipeline", return_value=mock_result) as run:
+        response = client.post("/query", json=body)
+    assert response.status_code == 200
+    assert run.call_args.kwargs["filters"] == {"file_types": ["pdf"], "ingested_after": 1704067200.0}
+
+
 def test_query_failure():
     mock_result = {"answer": "", "sources": [], "model": ""}
-    with patch("api.main.run_query_pipeline", return_value=mock_result):
+    with patch("api.main.arun_query_pipeline", return_value=mock_result):
         response = client.post("/query", json={"query": "What is attention?"})
     assert response.status_code == 500
     assert response.json()["detail"] == "Query pipeline failed"
+
+
+def test_client_stats():
+    mock_stats = {"clients": {"qdrant": {"created": 1, "reused": 4, "active": True}}, "http_pools": {}}
+    with patch("api.main.get_pool_stats", return_value=mock_stats):
+        response = client.get("/stats/clients")
+    assert response.status_code == 200
+    assert response.json()["clients"]["qdrant"]["reused"] == 4
+
+
+def test_reranker_stats():
+    with patch("api.main.get_reranker_stats", return_value={"requests": 10, "skipped": 4, "cache_hits": 3}):
+        response = client.get("/stats/reranker")
+    assert response.status_code == 200
+    assert response.json()["skipped"] == 4
+
+
+def test_query_stream_emits_sse_events():
+    async def mock_stream(query, filters):
+        yield {"event": "sources", "data": {"sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}}
+        yield {"event": "token", "data": {"text": "Attention"}}
+        yield {"event": "done", "data": {"valid": True, "reason": "Response is valid.", "model": "gpt-4.1-mini"}}
+
+    with patch("api.main.astream_query_pipeline", mock_stream):
+        response = client.post("/query/stream", json={"query": "What is attention?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events == ["sources", "token", "done"]
+
+
+def test_query_batch_returns_results_in_order():
+    mock_results = [
+        {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini", "error": None},
+        {"answer": "", "sources": [], "model": "", "error": "Query must be at more than 9 characters long."},
+    ]
+    with patch("api.main.arun_query_pipeline_batch", return_value=mock_results):
+        response = client.post("/query/batch", json={"queries": ["What is attention?", "hi"]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["query"] for r in results] == ["What is attention?", "hi"]
+    assert results[1]["error"].startswith("Query must be")
+
+
+def test_query_batch_rejects_oversized_batches():
+    with patch.dict("api.main.config", {"query_batch": {"max_queries": 2, "concurrency": 1}}):
+        response = client.post("/query/batch", json={"queries": ["a", "b", "c"]})
+    assert response.status_code == 413
+
+
+def test_evaluate_starts_a_background_job():
+    job = {"job_id": "abc123", "status": "running", "total": 1, "completed": 0, "failed": 0, "results": None}
+    with patch("api.main.start_evaluation_job", return_value=job) as start:
+        response = client.post("/evaluate", json={"eval_dataset": [{"question": "What is attention?", "ground_truth": "A mechanism."}]})
+    assert response.status_code == 202
+    assert response.json()["job_id"] == "abc123"
+    start.assert_called_once_with([{"question": "What is attention?", "ground_truth": "A mechanism."}])
+
+
+def test_evaluation_job_polling():
+    job = {"job_id": "abc123", "status": "success", "total": 1, "completed": 1, "failed": 0, "results": {"scores": {"faithfulness": 0.9}}}
+    with patch("api.main.get_evaluation_job", side_effect=lambda job_id: job if job_id == "abc123" else None):
+        assert client.get("/evaluate/abc123").json()["results"]["scores"]["faithfulness"] == 0.9
+        assert client.get("/evaluate/missing").status_code == 404
+
+
+def test_responses_carry_a_trace_id_that_resolves_to_its_spans():
+    mock_result = {"answer": "Attention is a mechanism in neural networks.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    with patch("api.main.arun_query_pipeline", return_value=mock_result):
+        response = client.post("/query", json={"query": "What is attention?"})
+    trace_id = response.json()["trace_id"]
+    assert trace_id and response.headers["X-Trace-Id"] == trace_id
+    trace = client.get(f"/traces/{trace_id}").json()
+    assert trace["name"] == "POST /query"
+    assert client.get("/traces/unknown").status_code == 404
+
+
+def test_metrics_endpoint_exposes_request_latency_by_route():
+    client.get("/evaluate/0123456789abcdef")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'rag_request_duration_seconds_count{route="/evaluate/{job_id}",status="404"}' in response.text
+
+
+def test_streamed_request_is_traced_until_its_body_is_sent():
+    async def mock_stream(query, filters):
+        yield {"event": "sources", "data": {"sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}}
+        with span("generate"):
+            await asyncio.sleep(0.2)
+        yield {"event": "done", "data": {"valid": True, "reason": "Response is valid.", "model": "gpt-4.1-mini"}}
+
+    with patch("api.main.astream_query_pipeline", mock_stream):
+        response = client.post("/query/stream", json={"query": "What is attention?"})
+    trace = client.get(f"/traces/{response.headers['X-Trace-Id']}").json()
+    assert trace["duration_ms"] >= 200
+    assert [s["stage"] for s in trace["spans"]] == ["generate"]
+
+
+def test_failing_route_still_finishes_its_trace_and_records_latency():
+    failing_client = TestClient(app, raise_server_exceptions=False)
+    with patch("api.main.arun_query_pipeline", side_effect=RuntimeError("boom")), \
+         patch("api.main.finish_trace", wraps=finish_trace) as finish:
+        response = failing_client.post("/query", json={"query": "What is attention?"})
+    assert response.status_code == 500
+    finish.assert_called_once()
+    assert 'rag_request_duration_seconds_count{route="/query",status="500"}' in client.get("/metrics").text
+
+
+def test_logging_stats():
+    response = client.get("/stats/logging")
+    assert response.status_code == 200
+    assert set(response.json()) == {"queued", "dropped"}
@@ -0,0 +1,39 @@
+import numpy as np
+from src.ingestion.chunk_batch import make_chunk_batch, from_chunks, chunk_count, chunk_texts, iter_chunks
+from src.indexing.vector_store import point_id, point_ids
+from benchmarks.chunk_memory import run_benchmark
+
+CHUNKS = [
+    {"content": "first chunk", "metadata": {"source": "a.pdf", "file_type": "pdf", "chunk_index": 0}},
+    {"content": "second chunk", "metadata": {"source": "a.pdf", "file_type": "pdf", "chunk_index": 1}},
+    {"content": "", "metadata": {"source": "b.txt", "file_type": "txt", "chunk_index": 0}},
+]
+
+
+def test_round_trip_through_columns():
+    batch = from_chunks(CHUNKS)
+    assert chunk_count(batch) == 3
+    assert chunk_texts(batch) == ["first chunk", "second chunk", ""]
+    assert list(iter_chunks(batch)) == [{"content": c["content"], "metadata": c["metadata"]} for c in CHUNKS]
+    assert batch["embeddings"] is None
+
+def test_document_metadata_is_stored_once():
+    a, b = {"source": "a.pdf"}, {"source": "b.txt"}
+    batch = make_chunk_batch(["x", "y", "z"], [a, a, b], [0, 1, 0])
+    assert batch["documents"] == [a, b]
+    assert batch["document"].tolist() == [0, 0, 1]
+
+def test_embeddings_are_one_float32_matrix():
+    batch = from_chunks([{**chunk, "embedding": [float(i), 1.0]} for i, chunk in enumerate(CHUNKS)])
+    assert batch["embeddings"].dtype == np.float32
+    assert batch["embeddings"].shape == (3, 2)
+    assert batch["embeddings"].flags["C_CONTIGUOUS"]
+
+def test_point_ids_match_per_chunk_ids():
+    assert point_ids(from_chunks(CHUNKS)) == [point_id(chunk) for chunk in CHUNKS]
+
+def test_memory_benchmark_shows_peak_reduction():
+    report = run_benchmark(chunks=300, dim=1536, chunks_per_document=20)
+    assert report["chunk_batch"]["retained_bytes_per_chunk"] < report["chunk_dicts"]["retained_bytes_per_chunk"] / 3
+    # the peak also holds one embedding request of Python floats, so the gap widens with larger batches
+    assert report["peak_reduction"] > 1.5
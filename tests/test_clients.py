@@ -0,0 +1,38 @@
+from unittest.mock import patch, MagicMock
+from src import clients
+
+
+def test_client_created_once_and_reused():
+    clients.close_clients()
+    with patch("qdrant_client.QdrantClient", return_value=MagicMock()) as mock_qdrant:
+        first = clients.get_qdrant_client()
+        second = clients.get_qdrant_client()
+    assert first is second
+    assert mock_qdrant.call_count == 1
+    assert clients.get_pool_stats()["clients"]["qdrant"]["reused"] >= 1
+    clients.close_clients()
+
+def test_close_clients_releases_registry():
+    clients.close_clients()
+    mock_client = MagicMock()
+    with patch("qdrant_client.QdrantClient", return_value=mock_client):
+        clients.get_qdrant_client()
+    clients.close_clients()
+    mock_client.close.assert_called_once()
+    assert clients.get_pool_stats()["clients"]["qdrant"]["active"] is False
+
+def test_pool_stats_reports_http_pools():
+    clients.close_clients()
+    with patch("cohere.Client", return_value=MagicMock()):
+        clients.get_cohere_client()
+    stats = clients.get_pool_stats()
+    assert "cohere" in stats["http_pools"]
+    assert stats["http_pools"]["cohere"]["open_connections"] == 0
+    clients.close_clients()
+
+def test_llm_streams_report_token_usage():
+    clients.close_clients()
+    with patch("langchain_openai.ChatOpenAI", return_value=MagicMock()) as chat:
+        clients.get_llm()
+    assert chat.call_args.kwargs["stream_usage"] is True
+    clients.close_clients()
@@ -0,0 +1,104 @@
+from unittest.mock import patch
+from src.generation import context_assembler
+from src.generation.context_assembler import assemble_context
+from src.metrics import start_trace, get_trace
+
+WORDS = [f"word{i}" for i in range(300)]
+
+
+def _settings(**overrides):
+    return patch.dict(context_assembler.config["context"], {
+        "enabled": True, "max_tokens": 3000, "merge_adjacent": True, "dedupe_threshold": 0.8, **overrides,
+    })
+
+
+def _doc(source, index, content, score):
+    return {"id": f"{source}-{index}", "content": content, "metadata": {"source": source, "chunk_index": index}, "score": score}
+
+
+def test_adjacent_chunks_are_merged_with_the_overlap_written_once():
+    first, second = " ".join(WORDS[:60]), " ".join(WORDS[45:100])
+    with _settings():
+        packed = assemble_context([_doc("a.pdf", 4, second, 0.6), _doc("a.pdf", 3, first, 0.9)])
+    assert len(packed) == 1
+    assert packed[0]["content"] == " ".join(WORDS[:100])
+    assert packed[0]["metadata"]["chunk_indices"] == [3, 4]
+    assert packed[0]["score"] == 0.9
+
+
+def test_non_adjacent_chunks_and_other_sources_stay_separate_in_score_order():
+    docs = [_doc("a.pdf", 1, "alpha beta gamma", 0.5), _doc("a.pdf", 5, "delta epsilon zeta", 0.9),
+            _doc("b.pdf", 2, "eta theta iota", 0.7)]
+    with _settings():
+        packed = assemble_context(docs)
+    assert [doc["content"] for doc in packed] == ["delta epsilon zeta", "eta theta iota", "alpha beta gamma"]
+
+
+def _page(page, index, content, score, num_pages=8):
+    return {"id": f"a.pdf-{page}-{index}", "content": content, "score": score,
+            "metadata": {"source": "a.pdf", "file_type": "pdf", "num_pages": num_pages, "page": page, "chunk_index": index}}
+
+
+def test_chunks_of_a_multi_page_pdf_merge_only_within_their_page():
+    first, second = " ".join(WORDS[:60]), " ".join(WORDS[45:100])
+    docs = [_page(0, 2, "alpha beta gamma", 0.9), _page(4, 2, "delta epsilon zeta", 0.8),
+            _page(0, 3, "eta theta iota", 0.7), _page(6, 4, "kappa lambda mu", 0.6),
+            _page(5, 0, first, 0.5), _page(5, 1, second, 0.4)]
+    with _settings():
+        packed = assemble_context(docs)
+    # equal indices on different pages are different chunks; consecutive indices on different pages aren't neighbours
+    assert [doc["content"] for doc in packed] == [
+        "alpha beta gamma\neta theta iota", "delta epsilon zeta", "kappa lambda mu", " ".join(WORDS[:100])
+    ]
+    assert [doc["metadata"].get("chunk_indices") for doc in packed] == [[2, 3], None, None, [0, 1]]
+
+
+def test_the_same_chunk_retrieved_twice_is_kept_once_with_its_best_score():
+    with _settings():
+        packed = assemble_context([_page(1, 0, "alpha beta gamma", 0.4), _page(1, 0, "alpha beta gamma", 0.8)])
+    assert [(doc["content"], doc["score"]) for doc in packed] == [("alpha beta gamma", 0.8)]
+
+
+def test_pdf_chunks_stored_without_a_page_are_not_merged():
+    legacy = [_page(None, 3, "alpha beta gamma", 0.9), _page(None, 4, "delta epsilon zeta", 0.8)]
+    with _settings():
+        packed = assemble_context(legacy)
+    assert [doc["content"] for doc in packed] == ["alpha beta gamma", "delta epsilon zeta"]
+
+
+def test_near_duplicates_of_better_passages_are_dropped():
+    text = " ".join(WORDS[:80])
+    docs = [_doc("a.pdf", 0, text, 0.9), _doc("copy.pdf", 7, text + " trailing", 0.8), _doc("b.pdf", 0, "something else entirely", 0.7)]
+    with _settings():
+        packed = assemble_context(docs)
+    assert [doc["metadata"]["source"] for doc in packed] == ["a.pdf", "b.pdf"]
+
+
+def test_budget_keeps_best_passages_and_reports_tokens_saved():
+    docs = [_doc(f"{i}.pdf", 0, " ".join(WORDS[i * 50:(i + 1) * 50]), 1 - i / 10) for i in range(5)]
+    trace_id = start_trace("test")
+    with _settings(max_tokens=120), patch("src.generation.context_assembler.count_tokens", side_effect=lambda text: len(text.split())):
+        packed = assemble_context(docs)
+    assert [doc["metadata"]["source"] for doc in packed] == ["0.pdf", "1.pdf"]
+    assert get_trace(trace_id)["attributes"] == {"context_tokens": 100, "context_tokens_saved": 150}
+
+
+def test_oversized_best_passage_is_truncated_rather_than_dropped():
+    with _settings(max_tokens=10), patch("src.generation.context_assembler.count_tokens", side_effect=lambda text: len(text) // 4):
+        packed = assemble_context([_doc("a.pdf", 0, "x" * 400, 0.9)])
+    # the longest prefix within the budget
+    assert len(packed) == 1 and len(packed[0]["content"]) == 43
+
+
+def test_truncation_is_measured_with_the_token_counter():
+    # short words first: cutting by the passage's average characters per token would keep ~50 words
+    content = "a " * 100 + "x" * 800
+    with _settings(max_tokens=10), patch("src.generation.context_assembler.count_tokens", side_effect=lambda text: len(text.split())):
+        packed = assemble_context([_doc("a.pdf", 0, content, 0.9)])
+    assert len(packed[0]["content"].split()) == 10
+
+
+def test_disabled_passes_documents_through():
+    docs = [_doc("a.pdf", 0, "alpha", 0.9), _doc("a.pdf", 1, "beta", 0.8)]
+    with _settings(enabled=False):
+        assert assemble_context(docs) is docs
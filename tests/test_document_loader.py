@@ -0,0 +1,64 @@
+from unittest.mock import patch
+from src.ingestion import document_loader
+from src.ingestion.document_loader import list_files, iter_loaded_files
+
+
+def _make_tree(root):
+    (root / "docs" / "nested" / "drafts").mkdir(parents=True)
+    for relative in ["a.txt", "nested/b.md", "nested/drafts/c.txt", "nested/image.png"]:
+        (root / "docs" / relative).write_text("some text")
+
+
+def test_list_files_is_recursive_and_filtered(tmp_path):
+    _make_tree(tmp_path)
+    settings = {"include": ["*.txt", "*.md"], "exclude": ["*/drafts/*"]}
+    with patch.dict(document_loader.config["source_data"], {"document_directory": str(tmp_path)}), \
+         patch.dict(document_loader.config["ingestion"], settings):
+        files = list_files("docs")
+    assert files == [str(tmp_path / "docs" / "a.txt"), str(tmp_path / "docs" / "nested" / "b.md")]
+
+def test_failed_file_is_isolated(tmp_path):
+    good = tmp_path / "good.txt"
+    good.write_text("hello world")
+    missing = str(tmp_path / "missing.txt")
+    results = {path: (docs, error) for path, docs, error in iter_loaded_files([missing, str(good)], workers=1)}
+    assert results[missing][0] == [] and results[missing][1] is not None
+    assert results[str(good)][0][0]["content"] == "hello world"
+    assert results[str(good)][0][0]["metadata"]["file_type"] == "txt"
+
+def test_process_pool_loads_every_file(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"document number {i}")
+        paths.append(str(path))
+    results = {path: docs for path, docs, error in iter_loaded_files(paths, workers=2)}
+    assert sorted(results) == sorted(paths)
+    assert all(len(docs) == 1 for docs in results.values())
+
+def _worker_view(file_path):
+    return [{"content": "",
+             "metadata": {"parse_workers": document_loader.config["ingestion"]["parse_workers"]}}]
+
+def test_pool_workers_are_not_forked_and_see_the_parents_config(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("text")
+    with patch.dict(document_loader.config["ingestion"], {"parse_workers": 7}), \
+         patch.object(document_loader, "ProcessPoolExecutor", wraps=document_loader.ProcessPoolExecutor) as pool:
+        [(_, documents, error)] = list(iter_loaded_files([str(path)], workers=2, loader=_worker_view))
+    assert error is None
+    assert pool.call_args.kwargs["mp_context"].get_start_method() != "fork"
+    assert documents[0]["metadata"]["parse_workers"] == 7
+
+def test_pdf_pages_keep_their_position_through_chunking(tmp_path):
+    from langchain_core.documents import Document
+    from src.ingestion.chunker import load_and_split
+
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    pages = [Document(page_content=f"Page {i} text.", metadata={"source": str(path)}) for i in range(3)]
+    with patch("langchain_community.document_loaders.PyMuPDFLoader") as loader:
+        loader.return_value.load.return_value = pages
+        documents = load_and_split(str(path))
+    # every page's chunks start again at chunk_index 0, so the page is what tells them apart
+    assert [(meta["page"], meta["num_pages"], len(spans)) for meta, _, spans in documents] == [(0, 3, 1), (1, 3, 1), (2, 3, 1)]
@@ -0,0 +1,92 @@
+from pathlib import Path
+from unittest.mock import patch
+import pytest
+import numpy as np
+from src.cache import embedding_cache
+from src.cache.embedding_cache import lookup_embeddings, store_embeddings, get_embedding_cache_stats
+from src.ingestion.embedder import embed_documents
+from src.ingestion.chunk_batch import from_chunks
+
+MODEL = "test-embedding-model"
+
+
+def _isolated(tmp_path, **settings):
+    embedding_cache._stores.clear()
+    return patch.dict(embedding_cache.config["embedding_cache"], {"directory": str(tmp_path), **settings})
+
+
+def _lists(found):
+    return {i: vector.tolist() for i, vector in found.items()}
+
+
+def test_stored_vectors_are_found(tmp_path):
+    with _isolated(tmp_path):
+        store_embeddings(["alpha", "beta"], [[1.0, 2.0], [3.0, 4.0]], MODEL)
+        found = lookup_embeddings(["beta", "gamma", "alpha"], MODEL)
+    assert _lists(found) == {0: [3.0, 4.0], 2: [1.0, 2.0]}
+
+def test_cache_survives_restart(tmp_path):
+    with _isolated(tmp_path):
+        store_embeddings(["alpha"], [[1.0, 2.0]], MODEL)
+        embedding_cache._stores.clear()
+        assert _lists(lookup_embeddings(["alpha"], MODEL)) == {0: [1.0, 2.0]}
+
+def test_truncated_index_is_treated_as_an_empty_cache(tmp_path):
+    with _isolated(tmp_path):
+        store_embeddings(["alpha"], [[1.0, 2.0]], MODEL)
+        vectors_path = Path(embedding_cache._model_dir(MODEL)) / "vectors.f32"
+        vectors_path.write_bytes(vectors_path.read_bytes()[:40])
+        embedding_cache._stores.clear()
+        assert lookup_embeddings(["alpha"], MODEL) == {}
+        store_embeddings(["beta"], [[3.0, 4.0]], MODEL)
+        embedding_cache._stores.clear()
+        assert _lists(lookup_embeddings(["alpha", "beta"], MODEL)) == {1: [3.0, 4.0]}
+
+def test_evicted_key_is_cleared_before_its_slot_is_overwritten(tmp_path):
+    flush = np.memmap.flush
+
+    def failing_vector_flush(matrix):
+        if matrix.dtype == np.float32:
+            raise OSError("disk full")
+        flush(matrix)
+
+    with _isolated(tmp_path, max_entries=1):
+        store_embeddings(["alpha"], [[1.0, 2.0]], MODEL)
+        with patch.object(np.memmap, "flush", failing_vector_flush), pytest.raises(OSError):
+            store_embeddings(["beta"], [[3.0, 4.0]], MODEL)
+        embedding_cache._stores.clear()
+        # the slot may hold either vector now, so neither key may point at it
+        assert lookup_embeddings(["alpha", "beta"], MODEL) == {}
+
+def test_stores_only_write_the_rows_they_touch(tmp_path):
+    with _isolated(tmp_path, max_entries=2), patch.object(embedding_cache, "_save_meta", wraps=embedding_cache._save_meta) as save:
+        store_embeddings(["alpha"], [[1.0]], MODEL)
+        store_embeddings(["beta"], [[2.0]], MODEL)
+        lookup_embeddings(["alpha"], MODEL)
+        embedding_cache._stores.clear()
+        # the recency of the lookup survives the restart, so beta is evicted
+        store_embeddings(["gamma"], [[3.0]], MODEL)
+        assert _lists(lookup_embeddings(["alpha", "beta", "gamma"], MODEL)) == {0: [1.0], 2: [3.0]}
+    assert save.call_count == 1
+
+def test_model_is_part_of_the_key(tmp_path):
+    with _isolated(tmp_path):
+        store_embeddings(["alpha"], [[1.0, 2.0]], MODEL)
+        assert lookup_embeddings(["alpha"], "another-model") == {}
+
+def test_least_recently_used_vector_is_evicted(tmp_path):
+    with _isolated(tmp_path, max_entries=2):
+        store_embeddings(["alpha", "beta"], [[1.0], [2.0]], MODEL)
+        lookup_embeddings(["alpha"], MODEL)
+        store_embeddings(["gamma"], [[3.0]], MODEL)
+        assert _lists(lookup_embeddings(["alpha", "beta", "gamma"], MODEL)) == {0: [1.0], 2: [3.0]}
+    assert get_embedding_cache_stats()["evictions"] >= 1
+
+def test_embed_documents_only_embeds_misses(tmp_path):
+    documents = [{"content": "cached chunk", "metadata": {}}, {"content": "new chunk", "metadata": {}}]
+    with _isolated(tmp_path), patch("src.ingestion.embedder.embed_texts", return_value=[[0.5, 0.5]]) as embed:
+        store_embeddings(["cached chunk"], [[1.0, 0.0]], embedding_cache.config["embedding"]["model_name"])
+        result = embed_documents(from_chunks(documents))
+    embed.assert_called_once_with(["new chunk"])
+    assert result["embeddings"].dtype == "float32"
+    assert result["embeddings"].tolist() == [[1.0, 0.0], [0.5, 0.5]]
@@ -0,0 +1,53 @@
+from unittest.mock import patch
+import numpy as np
+from src import clients
+from src.ingestion import embedding_scheduler
+from src.ingestion.embedding_scheduler import pack_batches, embed_texts, get_embedding_scheduler_stats
+from tests.fake_embedding_server import start_fake_embedding_server, fake_embedding
+
+
+def _against(server, **settings):
+    clients.close_clients()
+    embedding_scheduler._limiter.update(requests=None, tokens=None, updated=None, paused_until=0.0)
+    embedding_settings = {"base_url": server["url"], "backoff_base_seconds": 0.01, **settings}
+    return patch.dict(embedding_scheduler.config["embedding"], embedding_settings), \
+        patch.dict(embedding_scheduler.config["credentials"], {"openai_api_key": "test-key"})
+
+
+def test_pack_batches_respects_token_and_item_budgets():
+    assert pack_batches([5, 5, 5, 20, 1], max_tokens=10, max_items=10) == [[0, 1], [2], [3], [4]]
+    assert pack_batches([1, 1, 1, 1, 1], max_tokens=100, max_items=2) == [[0, 1], [2, 3], [4]]
+
+def test_embeds_in_order_with_concurrent_batches():
+    server = start_fake_embedding_server(dim=8)
+    texts = [f"chunk number {i}" for i in range(40)]
+    config_patch, key_patch = _against(server, batch_max_items=5, concurrency=4)
+    with config_patch, key_patch:
+        embeddings = embed_texts(texts)
+    server["stop"]()
+    clients.close_clients()
+    assert server["requests"] == 8
+    for text, embedding in zip(texts, embeddings):
+        assert np.allclose(embedding, fake_embedding(text, 8), atol=1e-6)
+
+def test_rate_limited_batches_are_retried():
+    server = start_fake_embedding_server(dim=8, rate_limit_first=3)
+    before = get_embedding_scheduler_stats()["rate_limited"]
+    config_patch, key_patch = _against(server, batch_max_items=10, concurrency=2)
+    with config_patch, key_patch:
+        embeddings = embed_texts([f"text {i}" for i in range(20)])
+    server["stop"]()
+    clients.close_clients()
+    assert len(embeddings) == 20 and all(e is not None for e in embeddings)
+    assert server["inputs"] == 20
+    assert get_embedding_scheduler_stats()["rate_limited"] - before == 3
+
+def test_limiter_waits_when_request_budget_is_spent():
+    embedding_scheduler._limiter.update(requests=None, tokens=None, updated=None, paused_until=0.0)
+    with patch.dict(embedding_scheduler.config["embedding"], {"requests_per_minute": 60, "tokens_per_minute": 10**6}), \
+         patch("src.ingestion.embedding_scheduler.time.sleep") as sleep:
+        embedding_scheduler._limiter.update(requests=0.5, tokens=10**6, updated=embedding_scheduler.time.monotonic())
+        sleep.side_effect = lambda seconds: embedding_scheduler._limiter.update(requests=1.0)
+        embedding_scheduler._wait_for_capacity(10)
+    assert sleep.call_args[0][0] > 0.4
+    embedding_scheduler._limiter.update(requests=None, tokens=None, updated=None, paused_until=0.0)
@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import patch
+from src.evaluation import evaluator
+from src.evaluation.evaluator import aevaluate_pipeline, start_evaluation_job, get_evaluation_job, job_id
+
+DATASET = [{"question": f"What is topic number {i}?", "ground_truth": f"Topic {i}."} for i in range(6)]
+
+
+def _isolated(tmp_path, concurrency=3):
+    evaluator._jobs.clear()
+    return patch.dict(evaluator.config["evaluation"], {"checkpoint_directory": str(tmp_path), "concurrency": concurrency})
+
+
+def _answer(question, return_contexts=False, use_cache=True):
+    return {"answer": f"Answer: {question}", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini", "contexts": [f"Context for {question}"]}
+
+
+def _scores(records):
+    return {"faithfulness": 1.0, "evaluated": [record["index"] for record in records]}
+
+
+def test_samples_run_concurrently_and_reuse_pipeline_contexts(tmp_path):
+    running, peak = 0, 0
+
+    async def query(question, return_contexts=False, use_cache=True):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return _answer(question)
+
+    with _isolated(tmp_path), patch("src.evaluation.evaluator.arun_query_pipeline", side_effect=query) as pipeline, \
+         patch("src.evaluation.evaluator._score_samples", side_effect=_scores) as score:
+        result = asyncio.run(aevaluate_pipeline(DATASET))
+
+    assert result["status"] == "success"
+    assert result["results"]["num_evaluated_samples"] == 6
+    assert peak == 3
+    assert all(call.kwargs == {"return_contexts": True, "use_cache": False} for call in pipeline.call_args_list)
+    records = score.call_args.args[0]
+    assert records[2]["contexts"] == ["Context for What is topic number 2?"]
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    async def flaky(question, return_contexts=False, use_cache=True):
+        if question.endswith("4?"):
+            raise RuntimeError("worker killed")
+        return _answer(question)
+
+    with _isolated(tmp_path), patch("src.evaluation.evaluator._score_samples", side_effect=_scores):
+        with patch("src.evaluation.evaluator.arun_query_pipeline", side_effect=flaky):
+            assert asyncio.run(aevaluate_pipeline(DATASET))["status"] == "failed"
+        evaluator._jobs.clear()
+        assert get_evaluation_job(job_id(DATASET))["status"] == "interrupted"
+
+        with patch("src.evaluation.evaluator.arun_query_pipeline", side_effect=_answer) as pipeline:
+            result = asyncio.run(aevaluate_pipeline(DATASET))
+
+    assert [call.args[0] for call in pipeline.call_args_list] == ["What is topic number 4?"]
+    assert result["results"]["scores"]["evaluated"] == list(range(6))
+
+def test_unanswered_samples_are_counted_and_left_out_of_scoring(tmp_path):
+    def answer(question, return_contexts=False, use_cache=True):
+        if question.endswith("0?"):
+            return {"answer": "Query must be longer.", "sources": [], "model": ""}
+        return _answer(question)
+
+    with _isolated(tmp_path), patch("src.evaluation.evaluator.arun_query_pipeline", side_effect=answer), \
+         patch("src.evaluation.evaluator._score_samples", side_effect=_scores):
+        result = asyncio.run(aevaluate_pipeline(DATASET))
+    assert result["results"]["num_failed_samples"] == 1
+    assert result["results"]["scores"]["evaluated"] == [1, 2, 3, 4, 5]
+
+def test_job_can_be_polled_while_running_and_after_restart(tmp_path):
+    async def run():
+        job = start_evaluation_job(DATASET)
+        assert job["status"] == "running" and job["total"] == 6
+        # submitting the same dataset again while it runs returns the same job
+        assert start_evaluation_job(DATASET)["job_id"] == job["job_id"]
+        assert len(evaluator._tasks) == 1
+        await asyncio.gather(*evaluator._tasks)
+        return job["job_id"]
+
+    with _isolated(tmp_path), patch("src.evaluation.evaluator.arun_query_pipeline", side_effect=_answer), \
+         patch("src.evaluation.evaluator._score_samples", side_effect=_scores):
+        job = asyncio.run(run())
+        assert get_evaluation_job(job)["status"] == "success"
+        evaluator._jobs.clear()
+        restored = get_evaluation_job(job)
+
+    assert restored["status"] == "success"
+    assert restored["completed"] == 6
+    assert get_evaluation_job("unknown") is None
@@ -0,0 +1,44 @@
+import json
+import sqlite3
+from src.indexing.filters import create_indexes, is_filtered, matching_rows, select_fields, sql_condition
+
+
+def _db(payloads):
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE points (row INTEGER PRIMARY KEY, source TEXT, payload TEXT)")
+    create_indexes(db, "points")
+    db.executemany("INSERT INTO points VALUES (?, ?, ?)",
+                   [(row, payload["source"], json.dumps(payload)) for row, payload in enumerate(payloads)])
+    return db
+
+
+PAYLOADS = [
+    {"source": "a.pdf", "file_type": "pdf", "ingested_at": 100.0},
+    {"source": "b.md", "file_type": "md", "ingested_at": 200.0},
+    {"source": "c.txt", "file_type": "txt", "ingested_at": 300.0},
+    {"source": "d.pdf", "file_type": "pdf"},
+]
+
+
+def test_empty_filters_match_everything():
+    assert sql_condition(None) == ("1", [])
+    assert not is_filtered({"sources": [], "file_types": None, "ingested_after": None})
+    assert set(matching_rows(_db(PAYLOADS), "points", "row", {})) == {0, 1, 2, 3}
+
+def test_conditions_combine_and_date_bounds_are_inclusive():
+    db = _db(PAYLOADS)
+    assert set(matching_rows(db, "points", "row", {"file_types": ["pdf", "md"]})) == {0, 1, 3}
+    assert set(matching_rows(db, "points", "row", {"file_types": ["pdf"], "sources": ["a.pdf", "c.txt"]})) == {0}
+    assert set(matching_rows(db, "points", "row", {"ingested_after": 200.0, "ingested_before": 300.0})) == {1, 2}
+    # chunks without an ingestion time never match a date bound
+    assert set(matching_rows(db, "points", "row", {"ingested_before": 1e12})) == {0, 1, 2}
+
+def test_file_type_filter_uses_the_expression_index():
+    condition, params = sql_condition({"file_types": ["pdf"]})
+    plan = _db(PAYLOADS).execute(f"EXPLAIN QUERY PLAN SELECT row FROM points WHERE {condition}", params).fetchall()
+    assert "points_file_type" in str(plan)
+
+def test_select_fields_keeps_only_requested_fields():
+    payload = {"content": "text", "source": "a.pdf", "num_pages": 3}
+    assert select_fields(payload, None) is payload
+    assert select_fields(payload, ["content", "source", "chunk_index"]) == {"content": "text", "source": "a.pdf"}
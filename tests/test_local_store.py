@@ -0,0 +1,234 @@
+import asyncio
+import sqlite3
+import threading
+from unittest.mock import patch
+import pytest
+import numpy as np
+from src.indexing import local_store, vector_store
+from src.indexing.vector_store import index_documents, delete_documents, search_vectors, asearch_vectors
+from src.ingestion.chunk_batch import from_chunks
+from benchmarks.vector_storage import run_benchmark
+
+
+def _isolated(tmp_path, quantization="none", short_dim=0, **settings):
+    local_store._stores.clear()
+    return patch.dict(local_store.config["vector_store"], {
+        "name": "local",
+        "quantization": {"mode": quantization, "oversampling": 3.0, "rescore": True},
+        "matryoshka": {"enabled": short_dim > 0, "dim": short_dim, "oversampling": 4.0},
+        "local": {"path": str(tmp_path), "dtype": "float32", "ann_threshold": 50000, "ivf_lists": 0, "ivf_probes": 8,
+                  **settings},
+    })
+
+
+def _clustered(count, dim=32, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    return centers[rng.integers(20, size=count)] + rng.normal(scale=0.3, size=(count, dim))
+
+
+def _chunk(source, index, vector):
+    return {"content": f"{source} chunk {index}", "embedding": vector,
+            "metadata": {"source": source, "chunk_index": index}}
+
+
+def _points(vectors):
+    return [str(i) for i in range(len(vectors))], vectors, [{"source": f"doc{i % 10}.txt"} for i in range(len(vectors))]
+
+
+def test_search_returns_nearest_chunks_with_payload(tmp_path):
+    with _isolated(tmp_path):
+        index_documents(from_chunks([_chunk("a.txt", 0, [1.0, 0.0, 0.0]), _chunk("b.txt", 0, [0.0, 1.0, 0.0]),
+                                     _chunk("c.txt", 0, [0.7, 0.7, 0.0])]))
+        hits = search_vectors([1.0, 0.1, 0.0], 2)
+    assert [hit["payload"]["source"] for hit in hits] == ["a.txt", "c.txt"]
+    assert hits[0]["payload"]["content"] == "a.txt chunk 0"
+    assert hits[0]["score"] > hits[1]["score"]
+
+def test_upsert_overwrites_and_delete_removes_by_source(tmp_path):
+    with _isolated(tmp_path):
+        index_documents(from_chunks([_chunk("a.txt", 0, [1.0, 0.0]), _chunk("b.txt", 0, [0.0, 1.0])]))
+        index_documents(from_chunks([_chunk("a.txt", 0, [1.0, 0.0])]))
+        assert local_store.count() == 2
+
+        delete_documents(["a.txt"])
+        hits = search_vectors([1.0, 0.0], 5)
+        assert [hit["payload"]["source"] for hit in hits] == ["b.txt"]
+
+        # the freed row is reused by the next insert
+        index_documents(from_chunks([_chunk("c.txt", 0, [1.0, 0.0])]))
+        assert local_store.count() == 2
+        assert search_vectors([1.0, 0.0], 1)[0]["payload"]["source"] == "c.txt"
+
+def test_index_survives_restart(tmp_path):
+    with _isolated(tmp_path):
+        index_documents(from_chunks([_chunk("a.txt", 0, [1.0, 0.0]), _chunk("b.txt", 0, [0.0, 1.0])]))
+        delete_documents(["b.txt"])
+        local_store._stores.clear()
+        assert local_store.count() == 1
+        assert asyncio.run(asearch_vectors([0.0, 1.0], 5))[0]["payload"]["source"] == "a.txt"
+
+def test_missing_collection_returns_no_hits(tmp_path):
+    with _isolated(tmp_path):
+        assert search_vectors([1.0, 0.0], 5) == []
+        assert delete_documents(["a.txt"]) == 1
+
+def test_ivf_search_keeps_recall_close_to_exact(tmp_path):
+    vectors, queries = _clustered(4000), _clustered(50, seed=2)
+
+    with _isolated(tmp_path / "exact"):
+        local_store.upsert_points(*_points(vectors))
+        exact = [{hit["id"] for hit in local_store.search(query.tolist(), 10)} for query in queries]
+
+    with _isolated(tmp_path / "ivf", ann_threshold=1000, ivf_probes=8):
+        local_store.upsert_points(*_points(vectors))
+        assert local_store._get_store()["ivf"] is not None
+        approximate = [{hit["id"] for hit in local_store.search(query.tolist(), 10)} for query in queries]
+
+    recall = np.mean([len(e & a) / len(e) for e, a in zip(exact, approximate)])
+    assert recall >= 0.9
+
+def test_filtered_search_scores_only_matching_points(tmp_path):
+    vectors = _clustered(1500)
+    ids, rows, payloads = _points(vectors)
+    payloads = [{**payload, "file_type": "pdf" if i % 3 else "md", "ingested_at": float(i), "content": f"chunk {i}"}
+                for i, payload in enumerate(payloads)]
+    filters = {"sources": ["doc1.txt", "doc2.txt"], "file_types": ["pdf"], "ingested_after": 100.0}
+    for name, settings in (("exact", {}), ("ivf", {"ann_threshold": 1000, "ivf_probes": 64})):
+        with _isolated(tmp_path / name, **settings):
+            local_store.upsert_points(ids, rows, payloads)
+            hits = local_store.search(vectors[0].tolist(), 10, filters, ["source", "file_type"])
+        assert len(hits) == 10
+        assert all(hit["payload"]["source"] in ("doc1.txt", "doc2.txt") and hit["payload"]["file_type"] == "pdf"
+                   and int(hit["id"]) >= 100 for hit in hits)
+        assert all(set(hit["payload"]) == {"source", "file_type"} for hit in hits)
+
+def test_backend_is_chosen_from_config(tmp_path):
+    with _isolated(tmp_path):
+        assert vector_store._backend() is local_store
+
+def test_quantized_search_rescores_with_original_vectors(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(2000, 128))
+    # each query is a slightly perturbed copy of an indexed vector
+    targets = rng.choice(2000, size=30, replace=False)
+    queries = vectors[targets] + rng.normal(scale=0.1, size=(30, 128))
+    with _isolated(tmp_path / "exact"):
+        local_store.upsert_points(*_points(vectors))
+        exact = [local_store.search(query.tolist(), 5) for query in queries]
+
+    with _isolated(tmp_path / "scalar", quantization="scalar"):
+        local_store.upsert_points(*_points(vectors))
+        scalar = [local_store.search(query.tolist(), 5) for query in queries]
+    recall = np.mean([len({h["id"] for h in e} & {h["id"] for h in a}) / 5 for e, a in zip(exact, scalar)])
+    assert recall >= 0.8
+    # rescored hits carry the exact cosine score
+    assert all(abs(a[0]["score"] - e[0]["score"]) < 1e-5 for e, a in zip(exact, scalar) if a[0]["id"] == e[0]["id"])
+
+    with _isolated(tmp_path / "binary", quantization="binary"):
+        local_store.upsert_points(*_points(vectors))
+        binary = [local_store.search(query.tolist(), 1)[0]["id"] for query in queries]
+    assert np.mean([hit == str(target) for hit, target in zip(binary, targets)]) >= 0.9
+
+def test_quantization_mode_is_fixed_when_the_collection_is_created(tmp_path):
+    with _isolated(tmp_path, quantization="binary"):
+        index_documents(from_chunks([_chunk("a.txt", 0, [1.0, 0.0]), _chunk("b.txt", 0, [0.0, 1.0])]))
+    with _isolated(tmp_path):
+        assert local_store._get_store()["quantization"] == "binary"
+        assert search_vectors([0.0, 1.0], 1)[0]["payload"]["source"] == "b.txt"
+
+def test_two_stage_search_rescores_short_vector_candidates(tmp_path):
+    rng = np.random.default_rng(1)
+    # Matryoshka-like: most of the signal sits in the leading dimensions
+    vectors = rng.normal(size=(2000, 128)) * np.linspace(3, 0.1, 128)
+    targets = rng.choice(2000, size=30, replace=False)
+    queries = vectors[targets] + rng.normal(scale=0.05, size=(30, 128))
+    with _isolated(tmp_path, short_dim=32):
+        local_store.upsert_points(*_points(vectors))
+        local_store._stores.clear()
+        assert local_store._get_store()["short_dim"] == 32
+        hits = [local_store.search(query.tolist(), 1)[0] for query in queries]
+
+    assert np.mean([hit["id"] == str(target) for hit, target in zip(hits, targets)]) >= 0.9
+    normalised = queries[0] / np.linalg.norm(queries[0])
+    expected = normalised @ (vectors[targets[0]] / np.linalg.norm(vectors[targets[0]]))
+    assert abs(hits[0]["score"] - expected) < 1e-5
+
+def test_batch_search_matches_single_searches(tmp_path):
+    vectors, queries = _clustered(3000, dim=64), _clustered(20, dim=64, seed=2).tolist()
+    for mode in ("none", "scalar", "binary"):
+        with _isolated(tmp_path / mode, quantization=mode):
+            local_store.upsert_points(*_points(vectors))
+            single = [local_store.search(query, 5) for query in queries]
+            batch = vector_store.search_vectors_batch(queries, 5)
+            assert [[hit["id"] for hit in hits] for hits in batch] == [[hit["id"] for hit in hits] for hits in single]
+            assert np.allclose([[hit["score"] for hit in hits] for hits in batch],
+                               [[hit["score"] for hit in hits] for hits in single], atol=1e-5)
+            assert vector_store.search_vectors_batch([], 5) == []
+
+def test_storage_benchmark_reports_each_mode(tmp_path):
+    with _isolated(tmp_path):
+        report = run_benchmark(_clustered(500).astype(np.float32), queries=10, k=5, short_dims=[0, 8])
+    assert [(row["mode"], row["short_dim"]) for row in report] == [
+        ("none", 0), ("none", 8), ("scalar", 0), ("scalar", 8), ("binary", 0), ("binary", 8)
+    ]
+    assert report[0]["recall@5"] == 1.0
+    assert report[0]["vector_memory_mb"] == 4 * report[2]["vector_memory_mb"] == 4 * report[1]["vector_memory_mb"]
+
+def test_bulk_load_builds_ivf_once_at_the_end(tmp_path):
+    vectors = _clustered(1500)
+    with _isolated(tmp_path, ann_threshold=1000), patch.object(local_store, "_build_ivf", wraps=local_store._build_ivf) as build:
+        vector_store.begin_bulk_load()
+        for start in range(0, len(vectors), 500):
+            ids, rows, payloads = _points(vectors)
+            local_store.upsert_points(ids[start:start + 500], rows[start:start + 500], payloads[start:start + 500])
+        assert local_store._get_store()["ivf"] is None
+        vector_store.finish_bulk_load()
+        assert build.call_count == 1
+        assert local_store._get_store()["ivf"] is not None
+
+def test_reused_rows_are_filed_under_their_new_ivf_list(tmp_path):
+    vectors, new = _clustered(1500), _clustered(2, seed=3)
+    with _isolated(tmp_path, ann_threshold=1000, ivf_probes=1):
+        local_store.upsert_points(*_points(vectors))
+        local_store.delete_by_sources(["doc0.txt"])
+        local_store.upsert_points(["new0"], new[:1], [{"source": "new.txt"}])
+        local_store._build_ivf(local_store._get_store())
+        local_store.delete_by_sources(["new.txt"])
+        # new1 reuses a row that was alive when the index was built and is filed under the old vector's list;
+        # new0 reuses one of doc0's rows, which were already free then and are in no list at all
+        local_store.upsert_points(["new1"], new[1:], [{"source": "new.txt"}])
+        local_store.upsert_points(["new0"], new[:1], [{"source": "new.txt"}])
+        store = local_store._get_store()
+        assert store["rows"] == store["ivf"]["built_rows"]
+        assert [local_store.search(vector.tolist(), 1)[0]["id"] for vector in new] == ["new0", "new1"]
+
+        local_store._stores.clear()
+        assert [local_store.search(vector.tolist(), 1)[0]["id"] for vector in new] == ["new0", "new1"]
+
+def test_deleting_more_sources_than_sqlite_parameters(tmp_path):
+    with _isolated(tmp_path):
+        index_documents(from_chunks([_chunk(f"doc{i}.txt", 0, [1.0, float(i)]) for i in range(1200)]))
+        local_store._get_store()["db"].setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        delete_documents([f"doc{i}.txt" for i in range(1, 1200)])
+        assert local_store.count() == 1
+        assert search_vectors([1.0, 0.0], 5)[0]["payload"]["source"] == "doc0.txt"
+
+def test_async_search_scans_off_the_event_loop(tmp_path):
+    threads = []
+
+    def scan(*args):
+        threads.append(threading.get_ident())
+        return [[]]
+
+    with _isolated(tmp_path), patch.object(local_store, "search_batch", side_effect=scan):
+        asyncio.run(local_store.asearch([1.0, 0.0], 5))
+        asyncio.run(local_store.asearch_batch([[1.0, 0.0]], 5))
+    assert len(threads) == 2 and threading.get_ident() not in threads
+
+def test_overlapping_bulk_loads_are_rejected(tmp_path):
+    with _isolated(tmp_path):
+        vector_store.begin_bulk_load()
+        with pytest.raises(RuntimeError):
+            vector_store.begin_bulk_load()
+        vector_store.finish_bulk_load()
@@ -0,0 +1,77 @@
+import json
+import logging
+import threading
+from unittest.mock import patch
+import src.logger as log_module
+from src.logger import get_logger, shutdown_logging, get_logging_stats
+from src.metrics import start_trace
+
+SETTINGS = {
+    "level": "DEBUG", "format": "%(levelname)s %(message)s", "json": True,
+    "max_bytes": 10_000_000, "backup_count": 1, "queue_size": 100, "debug_sample_rate": 1.0,
+}
+
+
+def _read(path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_written_as_json_lines_by_the_background_writer(tmp_path):
+    shutdown_logging()
+    path = tmp_path / "app.log"
+    with patch.dict(log_module.config, {"logging": {**SETTINGS, "file": str(path)}}):
+        logger = get_logger("tests.logger.json")
+        trace_id = start_trace("test")
+        logger.info("Retrieved %d documents", 3)
+        try:
+            raise ValueError("bad chunk")
+        except ValueError:
+            logger.exception("Chunking failed")
+        shutdown_logging()
+
+    records = _read(path)
+    assert records[0]["message"] == "Retrieved 3 documents"
+    assert records[0]["level"] == "INFO" and records[0]["trace_id"] == trace_id
+    assert "ValueError: bad chunk" in records[1]["exception"]
+
+
+def test_debug_lines_are_sampled_per_trace(tmp_path):
+    shutdown_logging()
+    path = tmp_path / "app.log"
+    with patch.dict(log_module.config, {"logging": {**SETTINGS, "file": str(path), "debug_sample_rate": 0.5}}):
+        logger = get_logger("tests.logger.sampling")
+        traces = []
+        for _ in range(200):
+            traces.append(start_trace("test"))
+            logger.debug("first")
+            logger.debug("second")
+            logger.warning("always kept")
+        shutdown_logging()
+
+    records = _read(path)
+    kept = [r["trace_id"] for r in records if r["level"] == "DEBUG"]
+    assert sum(r["level"] == "WARNING" for r in records) == 200
+    # a sampled request keeps both of its debug lines, the others keep none
+    assert all(kept.count(trace_id) in (0, 2) for trace_id in traces)
+    assert 100 < len(kept) < 300
+
+
+def test_full_queue_drops_records_instead_of_blocking(tmp_path):
+    shutdown_logging()
+    path = tmp_path / "app.log"
+    release = threading.Event()
+
+    class SlowHandler(logging.Handler):
+        def emit(self, record):
+            release.wait()
+
+    with patch.dict(log_module.config, {"logging": {**SETTINGS, "file": str(path)}}), \
+         patch.object(log_module, "_build_handlers", return_value=[SlowHandler()]):
+        logger = get_logger("tests.logger.dropping")
+        dropped = get_logging_stats()["dropped"]
+        for i in range(log_module._queue.maxsize + 50):
+            logger.warning("line %d", i)
+        assert get_logging_stats()["dropped"] - dropped >= 49
+        release.set()
+        shutdown_logging()
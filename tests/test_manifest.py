@@ -0,0 +1,49 @@
+import os
+from unittest.mock import patch
+from src.ingestion import manifest
+from src.ingestion.manifest import diff_manifest, apply_changes
+from src.indexing.vector_store import point_id
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_diff_classifies_files(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    kept, changed, new = str(docs / "kept.txt"), str(docs / "changed.txt"), str(docs / "new.txt")
+    for path in (kept, changed):
+        _write(path, "original text")
+
+    with patch.dict(manifest.config["source_data"], {"document_directory": str(tmp_path)}):
+        first = diff_manifest({}, "docs", [kept, changed])
+        saved = apply_changes({}, first)
+        saved[str(docs / "removed.txt")] = {"size": 1, "mtime": 0.0, "hash": "x"}
+
+        _write(changed, "edited text, different length")
+        _write(new, "brand new")
+        second = diff_manifest(saved, "docs", [kept, changed, new])
+
+    assert sorted(first["added"]) == sorted([kept, changed])
+    assert second["added"] == [new]
+    assert second["updated"] == [changed]
+    assert second["skipped"] == [kept]
+    assert second["deleted"] == [str(docs / "removed.txt")]
+
+def test_touched_but_identical_file_is_skipped(tmp_path):
+    path = str(tmp_path / "same.txt")
+    _write(path, "same content")
+    with patch.dict(manifest.config["source_data"], {"document_directory": str(tmp_path.parent)}):
+        saved = apply_changes({}, diff_manifest({}, tmp_path.name, [path]))
+        os.utime(path, (1, 1))
+        changes = diff_manifest(saved, tmp_path.name, [path])
+    assert changes["skipped"] == [path]
+    assert changes["updated"] == []
+
+def test_point_id_is_deterministic():
+    chunk = {"content": "text", "metadata": {"source": "a.txt", "chunk_index": 0}}
+    edited = {"content": "other text", "metadata": {"source": "a.txt", "chunk_index": 0}}
+    assert point_id(chunk) == point_id(dict(chunk))
+    assert point_id(chunk) != point_id(edited)
@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.metrics import span, timed_iter, record_tokens, start_trace, finish_trace, get_trace, render_metrics, reset_metrics
+from src.ingestion.streaming import run_in_background
+from src.pipeline import arun_query_pipeline
+from src.retrieval.retriever import aembed_query
+from src.cache.semantic_cache import invalidate_cache
+
+DOCS = [{"content": "Attention weighs tokens.", "metadata": {"source": "doc1.pdf"}, "score": 0.9}]
+
+
+def test_span_records_histogram_error_count_and_trace():
+    reset_metrics()
+    trace_id = start_trace("test")
+    with span("retrieve"):
+        pass
+    with pytest.raises(RuntimeError):
+        with span("generate"):
+            raise RuntimeError("llm down")
+    finish_trace()
+
+    text = render_metrics()
+    assert "# TYPE rag_stage_duration_seconds histogram" in text
+    assert 'rag_stage_duration_seconds_count{pipeline="query",stage="retrieve"} 1' in text
+    assert 'rag_stage_duration_seconds_bucket{pipeline="query",stage="generate",le="+Inf"} 1' in text
+    assert 'rag_stage_errors_total{pipeline="query",stage="generate"} 1' in text
+    trace = get_trace(trace_id)
+    assert [s["stage"] for s in trace["spans"]] == ["retrieve", "generate"]
+    assert trace["duration_ms"] is not None
+
+
+def test_counters_render_with_labels():
+    reset_metrics()
+    record_tokens("input", 120)
+    record_tokens("input", 30)
+    record_tokens("output", 0)
+    text = render_metrics()
+    assert 'rag_tokens_total{kind="input"} 150' in text
+    assert 'kind="output"' not in text
+
+
+def test_query_embedding_tokens_are_estimated_without_a_tokenizer():
+    reset_metrics()
+    model = MagicMock(aembed_query=AsyncMock(return_value=[0.1, 0.2]))
+    with patch("src.retrieval.retriever.get_embedding_model", return_value=model), \
+         patch("src.ingestion.embedding_scheduler._encoding", MagicMock(encode=MagicMock(side_effect=AssertionError))):
+        asyncio.run(aembed_query("What is attention, exactly?"))
+    assert 'rag_tokens_total{kind="embedding"} 6' in render_metrics()
+
+
+def test_background_stage_spans_land_in_callers_trace():
+    reset_metrics()
+    trace_id = start_trace("ingest")
+    assert list(run_in_background(timed_iter(range(3), "load_and_chunk"), 1)) == [0, 1, 2]
+    assert [s["stage"] for s in get_trace(trace_id)["spans"]] == ["load_and_chunk"] * 3
+
+
+def test_query_pipeline_records_every_stage():
+    reset_metrics()
+    invalidate_cache()
+    response = {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+
+    async def run():
+        trace_id = start_trace("query")
+        await arun_query_pipeline("What is attention?")
+        return get_trace(trace_id)
+
+    with patch("src.pipeline.aembed_query", return_value=[0.1, 0.2, 0.3]), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS), \
+         patch("src.pipeline.arerank_documents", return_value=DOCS), \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        trace = asyncio.run(run())
+    assert [s["stage"] for s in trace["spans"]] == [
+        "validate_query", "embed", "semantic_cache", "retrieve", "rerank", "assemble_context",
+        "generate", "validate_response"
+    ]
+    assert 'rag_stage_items_count{pipeline="query",stage="retrieve"} 1' in render_metrics()
+
+
+def test_trace_history_is_bounded():
+    reset_metrics()
+    with patch.dict("src.metrics.config", {"metrics": {"trace_history": 2, "slow_request_ms": 2000}}):
+        first = start_trace("a")
+        start_trace("b")
+        start_trace("c")
+    assert get_trace(first) is None
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+from src import pipeline
+from src.ingestion.chunk_batch import from_chunks
+from src.pipeline import arun_query_pipeline, arun_query_pipeline_batch, astream_query_pipeline
+from src.cache.semantic_cache import invalidate_cache
+
+DOCS = [{"content": "Attention weighs tokens.", "metadata": {"source": "doc1.pdf"}, "score": 0.9}]
+EMBEDDING = [0.1, 0.2, 0.3]
+
+
+def test_arun_query_pipeline_invalid_query():
+    result = asyncio.run(arun_query_pipeline("short"))
+    assert result["sources"] == []
+    assert result["model"] == ""
+
+def test_arun_query_pipeline_awaits_each_stage():
+    invalidate_cache()
+    response = {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS) as retrieve, \
+         patch("src.pipeline.arerank_documents", return_value=DOCS) as rerank, \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        result = asyncio.run(arun_query_pipeline("What is attention?"))
+    retrieve.assert_awaited_once_with("What is attention?", EMBEDDING, None)
+    rerank.assert_awaited_once()
+    assert result == response
+
+def test_arun_query_pipeline_handles_stage_failure():
+    invalidate_cache()
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", side_effect=RuntimeError("qdrant down")):
+        result = asyncio.run(arun_query_pipeline("What is attention?"))
+    assert result["answer"].startswith("Sorry")
+
+
+def test_astream_query_pipeline_sends_sources_before_tokens():
+    async def mock_tokens(query, documents):
+        for token in ["Attention ", "weighs tokens."]:
+            yield token
+
+    async def collect():
+        return [event async for event in astream_query_pipeline("What is attention?")]
+
+    invalidate_cache()
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS), \
+         patch("src.pipeline.arerank_documents", return_value=DOCS), \
+         patch("src.pipeline.astream_response", mock_tokens):
+        events = asyncio.run(collect())
+    assert [e["event"] for e in events] == ["sources", "token", "token", "done"]
+    assert events[0]["data"]["sources"] == ["doc1.pdf"]
+    assert events[-1]["data"]["valid"] is True
+
+
+def test_arun_query_pipeline_serves_repeat_query_from_cache():
+    invalidate_cache()
+    response = {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS) as retrieve, \
+         patch("src.pipeline.arerank_documents", return_value=DOCS), \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        asyncio.run(arun_query_pipeline("What is attention?"))
+        result = asyncio.run(arun_query_pipeline("What is attention, exactly?"))
+    assert retrieve.await_count == 1
+    assert result == response
+
+
+def test_filtered_queries_bypass_the_semantic_cache():
+    invalidate_cache()
+    response = {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    filters = {"file_types": ["pdf"]}
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS) as retrieve, \
+         patch("src.pipeline.arerank_documents", return_value=DOCS), \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        asyncio.run(arun_query_pipeline("What is attention?"))
+        asyncio.run(arun_query_pipeline("What is attention?", filters=filters))
+        asyncio.run(arun_query_pipeline("What is attention?", filters=filters))
+    assert retrieve.await_count == 3
+    retrieve.assert_awaited_with("What is attention?", EMBEDDING, filters)
+
+def test_uncached_queries_neither_read_nor_fill_the_semantic_cache():
+    invalidate_cache()
+    response = {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS) as retrieve, \
+         patch("src.pipeline.arerank_documents", return_value=DOCS), \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        asyncio.run(arun_query_pipeline("What is attention?", use_cache=False))
+        asyncio.run(arun_query_pipeline("What is attention?"))
+        result = asyncio.run(arun_query_pipeline("What is attention?", return_contexts=True, use_cache=False))
+    assert retrieve.await_count == 3
+    assert result["contexts"] == ["Attention weighs tokens."]
+
+def test_batch_pipeline_dedupes_queries_and_keeps_order_with_per_item_errors():
+    invalidate_cache()
+    queries = ["What is attention?", "short", "How do transformers work?", "What is attention?"]
+
+    async def generate(query, documents):
+        if query.startswith("How"):
+            raise RuntimeError("llm down")
+        return {"answer": f"Answer to {query}", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+
+    with patch("src.pipeline.embed_queries", return_value=[EMBEDDING, [0.3, 0.2, 0.1]]) as embed, \
+         patch("src.pipeline.aretrieve_documents_batch", return_value=[DOCS, DOCS]) as retrieve, \
+         patch("src.pipeline.arerank_documents", side_effect=lambda query, docs: docs), \
+         patch("src.pipeline.agenerate_response", side_effect=generate):
+        results = asyncio.run(arun_query_pipeline_batch(queries))
+
+    embed.assert_called_once_with(["What is attention?", "How do transformers work?"])
+    retrieve.assert_awaited_once()
+    assert [r["answer"] for r in results] == ["Answer to What is attention?", "", "", "Answer to What is attention?"]
+    assert results[0]["error"] is None and results[3]["error"] is None
+    assert results[1]["error"] and results[2]["error"].startswith("Sorry")
+
+def test_batch_pipeline_reports_shared_stage_failure_on_every_query():
+    invalidate_cache()
+    with patch("src.pipeline.embed_queries", side_effect=RuntimeError("embedding api down")):
+        results = asyncio.run(arun_query_pipeline_batch(["What is attention?", "What is a transformer?"]))
+    assert all(r["error"].startswith("Sorry") and r["answer"] == "" for r in results)
+
+def test_pipeline_returns_reranked_contexts_also_from_cache():
+    invalidate_cache()
+    response = {"answer": "Attention weighs tokens.", "sources": ["doc1.pdf"], "model": "gpt-4.1-mini"}
+    with patch("src.pipeline.aembed_query", return_value=EMBEDDING), \
+         patch("src.pipeline.aretrieve_documents", return_value=DOCS), \
+         patch("src.pipeline.arerank_documents", return_value=DOCS), \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        fresh = asyncio.run(arun_query_pipeline("What is attention?", return_contexts=True))
+        cached = asyncio.run(arun_query_pipeline("What is attention?", return_contexts=True))
+        plain = asyncio.run(arun_query_pipeline("What is attention?"))
+    assert fresh["contexts"] == cached["contexts"] == ["Attention weighs tokens."]
+    assert plain == response
+
+
+def _ingest_patches(index_documents, finish_bulk_load):
+    changes = {"added": ["a.txt"], "updated": [], "deleted": [], "skipped": [], "entries": {"a.txt": {}}}
+    batch = {"chunks": from_chunks([{"content": "text", "metadata": {"source": "a.txt", "chunk_index": 0}}]),
+             "files": ["a.txt"], "failed": [], "documents": 1}
+    return [
+        patch("src.pipeline.load_manifest", return_value={}), patch("src.pipeline.save_manifest"),
+        patch("src.pipeline.list_files", return_value=["a.txt"]), patch("src.pipeline.diff_manifest", return_value=changes),
+        patch("src.pipeline.delete_documents"), patch("src.pipeline.iter_chunk_batches", return_value=iter([batch])),
+        patch("src.pipeline.embed_documents", side_effect=lambda chunks: chunks),
+        patch("src.pipeline.index_documents", side_effect=index_documents), patch("src.pipeline.begin_bulk_load"),
+        patch("src.pipeline.finish_bulk_load", side_effect=finish_bulk_load),
+        patch.dict(pipeline.config["sparse_index"], {"enabled": False}),
+    ]
+
+
+def test_failed_flush_does_not_replace_the_ingest_error():
+    with ExitStack() as stack:
+        for p in _ingest_patches(RuntimeError("qdrant down"), ConnectionError("barrier timed out")):
+            stack.enter_context(p)
+        logger = stack.enter_context(patch("src.pipeline.logger"))
+        result = pipeline.run_ingestion_pipeline("docs")
+    assert result["status"] == "failed"
+    errors = [c.args[0] for c in logger.error.call_args_list]
+    assert "barrier timed out" in errors[0]
+    assert errors[-1] == "Ingestion pipeline failed: qdrant down"
+
+
+def test_concurrent_ingests_run_one_at_a_time():
+    running, overlapped = threading.Semaphore(1), []
+
+    def ingest(directory):
+        if not running.acquire(blocking=False):
+            overlapped.append(directory)
+            return {"status": "failed"}
+        time.sleep(0.05)
+        running.release()
+        return {"status": "success"}
+
+    with patch("src.pipeline._run_ingestion", side_effect=ingest):
+        threads = [threading.Thread(target=pipeline.run_ingestion_pipeline, args=(f"docs{i}",)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert overlapped == []
@@ -0,0 +1,35 @@
+import copy
+import numpy as np
+from src import clients
+from benchmarks.pipeline import run_benchmark, compare_to_baseline, fake_embedding, make_queries
+
+SMALL = {"documents": 12, "words_per_document": 200, "queries": 5, "dim": 64,
+         "embedding_latency_ms": 0.0, "llm_latency_ms": 2.0, "rerank_latency_ms": 0.0}
+
+
+def test_fake_embeddings_retrieve_the_source_of_a_query():
+    texts = ["w1 w2 w3 w4 w5 w6 w7 w8 w9 w10", "w11 w12 w13 w14 w15 w16 w17 w18 w19 w20"]
+    query = make_queries(texts[:1], 1, words=6)[0]
+    scores = [np.dot(fake_embedding(query, 256), fake_embedding(text, 256)) for text in texts]
+    assert scores[0] > 0.5 > scores[1]
+
+def test_benchmark_runs_both_pipelines_end_to_end_and_restores_state():
+    original_store, registered = clients.config["vector_store"], dict(clients._clients)
+    report = run_benchmark(**SMALL)
+
+    assert report["settings"] == SMALL
+    assert report["ingestion"]["documents"] == 12 and report["ingestion"]["chunks"] > 12
+    assert report["query"]["stages"]["generate"]["count"] == 5
+    assert report["query"]["stages"]["generate"]["p50_ms"] >= 2.0
+    assert {"p50_ms", "p95_ms", "p99_ms"} <= set(report["query"]["stages"]["total"])
+    assert clients.config["vector_store"] is original_store
+    assert clients._clients == registered
+
+    assert compare_to_baseline(report, report, tolerance=0.5) == []
+    faster = copy.deepcopy(report)
+    faster["query"]["stages"]["generate"]["p50_ms"] /= 10
+    faster["query"]["queries_per_second"] *= 10
+    regressions = compare_to_baseline(report, faster, tolerance=0.5)
+    assert any(r.startswith("query.generate p50_ms") for r in regressions)
+    assert any(r.startswith("query queries_per_second") for r in regressions)
+    assert compare_to_baseline(report, {**report, "settings": {**SMALL, "queries": 50}}, 0.5)[0].startswith("Baseline")
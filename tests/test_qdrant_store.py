@@ -0,0 +1,225 @@
+import asyncio
+from unittest.mock import patch, AsyncMock, MagicMock
+import pytest
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+from src.indexing import qdrant_store
+
+
+def _quantization(mode, short_dim=0):
+    qdrant_store._short_dims.clear()
+    return patch.dict(qdrant_store.config["vector_store"], {
+        "quantization": {"mode": mode, "oversampling": 2.0, "rescore": True},
+        "matryoshka": {"enabled": short_dim > 0, "dim": short_dim, "oversampling": 4.0},
+        "on_disk_vectors": True,
+        "on_disk_payload": True,
+    })
+
+
+def test_collection_is_created_with_quantization_and_on_disk_storage():
+    client = MagicMock()
+    client.collection_exists.return_value = False
+    with _quantization("scalar"), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.upsert_points(["1"], np.array([[0.1, 0.2, 0.3]], dtype=np.float32), [{"source": "a.txt"}])
+
+    kwargs = client.create_collection.call_args.kwargs
+    assert kwargs["vectors_config"].size == 3
+    assert kwargs["vectors_config"].on_disk is True
+    assert kwargs["on_disk_payload"] is True
+    assert kwargs["quantization_config"].scalar.always_ram is True
+
+def test_quantized_search_requests_oversampling_and_rescoring():
+    client = MagicMock()
+    client.query_points.return_value.points = []
+    with _quantization("binary"), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.search([0.1, 0.2], 5)
+
+    params = client.query_points.call_args.kwargs["search_params"]
+    assert params.quantization.rescore is True
+    assert params.quantization.oversampling == 2.0
+
+def test_unquantized_collection_searches_without_params():
+    client = MagicMock()
+    client.query_points.return_value.points = []
+    with _quantization("none"), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.search([0.1, 0.2], 5)
+        assert qdrant_store._quantization_config() is None
+
+    assert client.query_points.call_args.kwargs["search_params"] is None
+
+def test_matryoshka_collection_has_short_and_full_named_vectors():
+    client = QdrantClient(":memory:")
+    vectors = np.random.default_rng(0).normal(size=(300, 64))
+    with _quantization("none", short_dim=16), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.upsert_points(list(range(len(vectors))), vectors, [{"source": "a.txt"}] * len(vectors))
+        hits = qdrant_store.search(vectors[7].tolist(), 3)
+
+    params = client.get_collection(qdrant_store._collection()).config.params.vectors
+    assert params["full"].size == 64 and params["short"].size == 16
+    assert hits[0]["id"] == "7"
+    assert abs(hits[0]["score"] - 1.0) < 1e-5
+
+def test_existing_collection_schema_wins_over_the_matryoshka_setting():
+    client = QdrantClient(":memory:")
+    vectors = np.random.default_rng(0).normal(size=(50, 64))
+    for created, toggled in ((0, 16), (16, 0)):
+        with _quantization("none", short_dim=created), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+            qdrant_store.drop_collection()
+            qdrant_store.upsert_points(list(range(25)), vectors[:25], [{"source": "a.txt"}] * 25)
+        with _quantization("none", short_dim=toggled), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+            qdrant_store.upsert_points(list(range(25, 50)), vectors[25:], [{"source": "b.txt"}] * 25)
+            assert qdrant_store.search(vectors[30].tolist(), 1)[0]["id"] == "30"
+            assert [hits[0]["id"] for hits in qdrant_store.search_batch([vectors[3].tolist()], 1)] == ["3"]
+            assert qdrant_store._short_dims[qdrant_store._collection()] == created
+
+def test_async_search_reads_the_collection_schema_once():
+    client = AsyncMock()
+    client.query_points.return_value.points = []
+    client.get_collection.return_value.config.params.vectors = VectorParams(size=64, distance=Distance.COSINE)
+    with _quantization("none", short_dim=16), patch("src.indexing.qdrant_store.get_async_qdrant_client", return_value=client):
+        asyncio.run(qdrant_store.asearch(np.ones(64).tolist(), 5))
+        asyncio.run(qdrant_store.asearch_batch([np.ones(64).tolist()], 5))
+    assert client.get_collection.await_count == 1
+    assert "prefetch" not in client.query_points.call_args.kwargs
+    assert client.query_batch_points.call_args.kwargs["requests"][0].prefetch is None
+
+def test_batch_search_runs_one_request_per_query():
+    client = QdrantClient(":memory:")
+    vectors = np.random.default_rng(0).normal(size=(300, 64))
+    for short_dim in (0, 16):
+        with _quantization("none", short_dim=short_dim), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+            qdrant_store.drop_collection()
+            qdrant_store.upsert_points(list(range(len(vectors))), vectors, [{"source": "a.txt"}] * len(vectors))
+            results = qdrant_store.search_batch([vectors[3].tolist(), vectors[42].tolist()], 2)
+        assert [hits[0]["id"] for hits in results] == ["3", "42"]
+        assert all(len(hits) == 2 for hits in results)
+
+
+def _remote_client():
+    client = MagicMock()
+    client.init_options = {"location": None, "path": None}
+    return client
+
+def _upload(**settings):
+    return patch.dict(qdrant_store.config["vector_store"], {"upload": {
+        "batch_size": 2, "parallel": 3, "max_retries": 2, "backoff_base_seconds": 0.0, "wait": False,
+        "disable_indexing": False, "indexing_threshold": 20000, **settings,
+    }})
+
+def test_points_are_uploaded_in_parallel_batches_with_one_waiting_barrier():
+    client = _remote_client()
+    with _quantization("none"), _upload(), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.begin_bulk_load()
+        qdrant_store.upsert_points([str(i) for i in range(5)], np.eye(5, dtype=np.float32), [{"source": "a.txt"}] * 5)
+        calls = list(client.upsert.call_args_list)
+        qdrant_store.finish_bulk_load()
+
+    assert sorted(len(c.kwargs["points"].ids) for c in calls) == [1, 2, 2]
+    assert all(c.kwargs["wait"] is False for c in calls)
+    barrier = client.upsert.call_args_list[-1].kwargs
+    assert barrier["wait"] is True and barrier["points"].ids == ["4"]
+
+def test_upserts_outside_an_ingest_wait():
+    client = _remote_client()
+    with _quantization("none"), _upload(), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.upsert_points(["1", "2"], np.eye(2, dtype=np.float32), [{"source": "a.txt"}] * 2)
+        qdrant_store.finish_bulk_load()
+    assert client.upsert.call_count == 1
+    assert client.upsert.call_args.kwargs["wait"] is True
+
+def test_only_the_failed_batch_is_retried():
+    client = _remote_client()
+    failures = iter([True])
+
+    def upsert(collection_name, points, wait):
+        if points.ids == ["2", "3"] and next(failures, False):
+            raise ConnectionError("message too large")
+
+    client.upsert.side_effect = upsert
+    with _quantization("none"), _upload(parallel=1), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.upsert_points([str(i) for i in range(6)], np.eye(6, dtype=np.float32), [{"source": "a.txt"}] * 6)
+    assert [c.kwargs["points"].ids for c in client.upsert.call_args_list] == [["0", "1"], ["2", "3"], ["2", "3"], ["4", "5"]]
+
+def test_batch_failing_every_retry_fails_the_upsert():
+    client = _remote_client()
+    client.upsert.side_effect = ConnectionError("down")
+    with _quantization("none"), _upload(), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        with pytest.raises(ConnectionError):
+            qdrant_store.upsert_points(["1"], np.eye(1, dtype=np.float32), [{"source": "a.txt"}])
+    assert client.upsert.call_count == 3
+
+def test_hnsw_indexing_is_paused_during_bulk_load():
+    client = _remote_client()
+    client.collection_exists.return_value = True
+    with _quantization("none"), _upload(disable_indexing=True), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.begin_bulk_load()
+        qdrant_store.finish_bulk_load()
+    thresholds = [c.kwargs["optimizers_config"].indexing_threshold for c in client.update_collection.call_args_list]
+    assert thresholds == [0, 20000]
+
+def test_overlapping_bulk_loads_are_rejected():
+    client = _remote_client()
+    with _quantization("none"), _upload(), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.begin_bulk_load()
+        with pytest.raises(RuntimeError):
+            qdrant_store.begin_bulk_load()
+        qdrant_store.finish_bulk_load()
+        qdrant_store.begin_bulk_load()
+        qdrant_store.finish_bulk_load()
+
+def test_failed_barrier_still_resumes_hnsw_indexing():
+    client = _remote_client()
+    client.collection_exists.return_value = True
+    with _quantization("none"), _upload(disable_indexing=True, max_retries=0), \
+         patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.begin_bulk_load()
+        qdrant_store.upsert_points(["1"], np.eye(1, dtype=np.float32), [{"source": "a.txt"}])
+        client.upsert.side_effect = ConnectionError("timed out")
+        with pytest.raises(ConnectionError):
+            qdrant_store.finish_bulk_load()
+    thresholds = [c.kwargs["optimizers_config"].indexing_threshold for c in client.update_collection.call_args_list]
+    assert thresholds == [0, 20000]
+    assert not qdrant_store._bulk["active"]
+
+def test_filtered_search_sends_payload_filter_and_field_list():
+    client = MagicMock()
+    client.query_points.return_value.points = []
+    client.get_collection.return_value.config.params.vectors = {"full": VectorParams(size=64, distance=Distance.COSINE),
+                                                                "short": VectorParams(size=16, distance=Distance.COSINE)}
+    filters = {"sources": ["a.txt"], "file_types": ["pdf", "md"], "ingested_after": 100.0}
+    with _quantization("none", short_dim=16), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.search(np.ones(64).tolist(), 5, filters, ["content", "source"])
+
+    kwargs = client.query_points.call_args.kwargs
+    conditions = {condition.key: condition for condition in kwargs["query_filter"].must}
+    assert conditions["source"].match.any == ["a.txt"]
+    assert conditions["file_type"].match.any == ["pdf", "md"]
+    assert conditions["ingested_at"].range.gte == 100.0 and conditions["ingested_at"].range.lte is None
+    assert kwargs["prefetch"].filter == kwargs["query_filter"]
+    assert kwargs["with_payload"] == ["content", "source"]
+    assert qdrant_store._query_filter({"sources": [], "file_types": None}) is None
+
+def test_filtered_search_matches_only_selected_points():
+    client = QdrantClient(":memory:")
+    vectors = np.random.default_rng(0).normal(size=(40, 16))
+    payloads = [{"source": f"doc{i % 4}.txt", "file_type": "txt", "ingested_at": float(i), "content": f"chunk {i}"}
+                for i in range(len(vectors))]
+    with _quantization("none"), patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.drop_collection()
+        qdrant_store.upsert_points(list(range(len(vectors))), vectors, payloads)
+        hits = qdrant_store.search_batch([vectors[5].tolist()], 10, {"sources": ["doc1.txt"], "ingested_before": 20.0},
+                                         ["source"])[0]
+    assert [hit["id"] for hit in hits][0] == "5"
+    assert {int(hit["id"]) for hit in hits} == {1, 5, 9, 13, 17}
+    assert all(hit["payload"] == {"source": "doc1.txt"} for hit in hits)
+
+def test_new_remote_collection_gets_payload_indexes():
+    client = _remote_client()
+    client.collection_exists.return_value = False
+    indexes = {"source": "keyword", "file_type": "keyword", "ingested_at": "float"}
+    with _quantization("none"), _upload(), patch.dict(qdrant_store.config["vector_store"], {"payload_indexes": indexes}), \
+         patch("src.indexing.qdrant_store.get_qdrant_client", return_value=client):
+        qdrant_store.upsert_points(["1"], np.eye(1, dtype=np.float32), [{"source": "a.txt"}])
+    created = {c.kwargs["field_name"]: c.kwargs["field_schema"].value for c in client.create_payload_index.call_args_list}
+    assert created == indexes
@@ -0,0 +1,71 @@
+import asyncio
+from unittest.mock import patch, MagicMock
+from src.retrieval import reranker
+from src.retrieval.reranker import rerank_documents, arerank_documents, get_reranker_stats
+
+
+def _settings(**overrides):
+    reranker._score_cache.clear()
+    return patch.dict(reranker.config["reranker"], {
+        "backend": "cross_encoder", "top_n": 2, "batch_size": 8, "cache_size": 100,
+        "skip_when_all_kept": True, "skip_margin": 0.1, **overrides,
+    })
+
+
+def _docs(*scores):
+    return [{"id": f"chunk-{i}", "content": f"chunk {i}", "metadata": {"source": "a.txt"}, "score": score}
+            for i, score in enumerate(scores)]
+
+
+def _cross_encoder(scores_by_content):
+    model = MagicMock()
+    model.predict.side_effect = lambda pairs, batch_size: [scores_by_content[content] for _, content in pairs]
+    return patch("src.retrieval.reranker.get_cross_encoder", return_value=model), model
+
+
+def test_skips_when_every_candidate_is_kept():
+    before = get_reranker_stats()["skipped_all_kept"]
+    with _settings(), patch("src.retrieval.reranker.get_cross_encoder") as get_model:
+        result = rerank_documents("query", _docs(0.5, 0.7))
+    get_model.assert_not_called()
+    assert [doc["id"] for doc in result] == ["chunk-1", "chunk-0"]
+    assert get_reranker_stats()["skipped_all_kept"] == before + 1
+
+def test_skips_when_dense_margin_is_decisive():
+    before = get_reranker_stats()["skipped_margin"]
+    with _settings(), patch("src.retrieval.reranker.get_cross_encoder") as get_model:
+        result = rerank_documents("query", _docs(0.9, 0.6, 0.55))
+    get_model.assert_not_called()
+    assert [doc["id"] for doc in result] == ["chunk-0", "chunk-1"]
+    assert get_reranker_stats()["skipped_margin"] == before + 1
+
+def test_scores_are_cached_per_query_and_chunk():
+    patched, model = _cross_encoder({"chunk 0": 0.1, "chunk 1": 0.9, "chunk 2": 0.5, "chunk 3": 0.7})
+    with _settings(), patched:
+        first = rerank_documents("query", _docs(0.8, 0.75, 0.7))
+        hits_before = get_reranker_stats()["cache_hits"]
+        # overlapping candidates: only the new chunk is scored
+        second = rerank_documents("query", _docs(0.8, 0.75, 0.7, 0.65))
+    assert [doc["id"] for doc in first] == ["chunk-1", "chunk-2"]
+    assert [doc["id"] for doc in second] == ["chunk-1", "chunk-3"]
+    assert [len(call.args[0]) for call in model.predict.call_args_list] == [3, 1]
+    assert get_reranker_stats()["cache_hits"] == hits_before + 3
+    assert second[0]["original_score"] == 0.75
+
+def test_async_rerank_with_cohere_backend():
+    response = MagicMock()
+    response.results = [MagicMock(index=2, relevance_score=0.9), MagicMock(index=0, relevance_score=0.3),
+                        MagicMock(index=1, relevance_score=0.1)]
+    cohere = MagicMock()
+    async def mock_rerank(**kwargs):
+        return response
+    cohere.rerank.side_effect = mock_rerank
+    with _settings(backend="cohere"), patch("src.retrieval.reranker.get_async_cohere_client", return_value=cohere):
+        result = asyncio.run(arerank_documents("query", _docs(0.8, 0.75, 0.7)))
+    assert [doc["id"] for doc in result] == ["chunk-2", "chunk-0"]
+    assert cohere.rerank.call_args.kwargs["top_n"] == 3
+
+def test_scoring_error_returns_documents_unchanged():
+    docs = _docs(0.8, 0.75, 0.7)
+    with _settings(), patch("src.retrieval.reranker.get_cross_encoder", side_effect=ImportError("no sentence_transformers")):
+        assert rerank_documents("query", docs) == docs
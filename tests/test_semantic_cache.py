@@ -0,0 +1,90 @@
+from unittest.mock import patch
+from src.cache import semantic_cache
+from src.cache.semantic_cache import lookup_answer, store_answer, invalidate_cache, get_cache_stats
+
+RESULT = {"answer": "Paris is the capital of France.", "sources": ["doc.pdf"], "model": "gpt-4.1-mini"}
+
+
+def test_similar_query_hits():
+    invalidate_cache()
+    store_answer("What is the capital of France?", [1.0, 0.0, 0.0], RESULT)
+    assert lookup_answer([0.99, 0.05, 0.0]) == RESULT
+
+def test_dissimilar_query_misses():
+    invalidate_cache()
+    store_answer("What is the capital of France?", [1.0, 0.0, 0.0], RESULT)
+    assert lookup_answer([0.0, 1.0, 0.0]) is None
+
+def test_expired_entry_misses():
+    invalidate_cache()
+    store_answer("What is the capital of France?", [1.0, 0.0, 0.0], RESULT)
+    with patch.dict(semantic_cache.config["semantic_cache"], {"ttl_seconds": -1}):
+        assert lookup_answer([1.0, 0.0, 0.0]) is None
+
+def test_lru_eviction():
+    invalidate_cache()
+    with patch.dict(semantic_cache.config["semantic_cache"], {"max_entries": 2}):
+        store_answer("first question here", [1.0, 0.0, 0.0], RESULT)
+        store_answer("second question here", [0.0, 1.0, 0.0], RESULT)
+        lookup_answer([1.0, 0.0, 0.0])
+        store_answer("third question here", [0.0, 0.0, 1.0], RESULT)
+    assert lookup_answer([1.0, 0.0, 0.0]) == RESULT
+    assert lookup_answer([0.0, 1.0, 0.0]) is None
+    assert get_cache_stats()["evictions"] >= 1
+
+def test_invalidate_clears_entries():
+    store_answer("What is the capital of France?", [1.0, 0.0, 0.0], RESULT)
+    invalidate_cache()
+    assert get_cache_stats()["size"] == 0
+    assert lookup_answer([1.0, 0.0, 0.0]) is None
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    settings = {"backend": "sqlite", "path": str(tmp_path / "cache.db")}
+    with patch.dict(semantic_cache.config["semantic_cache"], settings), \
+         patch.object(semantic_cache, "_db", None):
+        invalidate_cache()
+        store_answer("What is the capital of France?", [1.0, 0.0, 0.0], RESULT)
+        # simulate a new process: drop the in-memory state and reload from disk
+        semantic_cache._entries.clear()
+        semantic_cache._matrix = None
+        semantic_cache._loaded = False
+        assert lookup_answer([1.0, 0.0, 0.0]) == RESULT
+        semantic_cache._db.close()
+    semantic_cache._entries.clear()
+    semantic_cache._matrix = None
+
+def test_stores_and_evictions_update_the_matrix_in_place():
+    invalidate_cache()
+    with patch.dict(semantic_cache.config["semantic_cache"], {"max_entries": 2}), \
+         patch("src.cache.semantic_cache.np.stack", wraps=semantic_cache.np.stack) as stack:
+        store_answer("first question here", [1.0, 0.0, 0.0], RESULT)
+        assert lookup_answer([1.0, 0.0, 0.0]) == RESULT
+        store_answer("second question here", [0.0, 1.0, 0.0], {**RESULT, "answer": "second"})
+        store_answer("third question here", [0.0, 0.0, 1.0], {**RESULT, "answer": "third"})
+        store_answer("second question here", [0.6, 0.8, 0.0], {**RESULT, "answer": "second again"})
+        assert lookup_answer([1.0, 0.0, 0.0]) is None
+        assert lookup_answer([0.0, 0.0, 1.0])["answer"] == "third"
+        assert lookup_answer([0.6, 0.8, 0.0])["answer"] == "second again"
+        assert lookup_answer([0.0, 1.0, 0.0]) is None
+    assert stack.call_count == 1
+
+def test_sqlite_hits_are_written_with_the_next_store(tmp_path):
+    settings = {"backend": "sqlite", "path": str(tmp_path / "cache.db"), "max_entries": 2}
+    with patch.dict(semantic_cache.config["semantic_cache"], settings), \
+         patch.object(semantic_cache, "_db", None):
+        invalidate_cache()
+        store_answer("first question here", [1.0, 0.0, 0.0], RESULT)
+        store_answer("second question here", [0.0, 1.0, 0.0], RESULT)
+        changes = semantic_cache._db.total_changes
+        assert lookup_answer([1.0, 0.0, 0.0]) == RESULT
+        assert semantic_cache._db.total_changes == changes
+        store_answer("third question here", [0.0, 0.0, 1.0], RESULT)
+        # restored in last-access order: the hit kept the first entry and the second one was evicted
+        semantic_cache._entries.clear()
+        semantic_cache._matrix = None
+        semantic_cache._loaded = False
+        assert lookup_answer([1.0, 0.0, 0.0]) == RESULT
+        assert lookup_answer([0.0, 1.0, 0.0]) is None
+        semantic_cache._db.close()
+    semantic_cache._entries.clear()
+    semantic_cache._matrix = None
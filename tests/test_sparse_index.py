@@ -0,0 +1,160 @@
+import asyncio
+import sqlite3
+import threading
+from unittest.mock import patch
+from src.indexing import sparse_index
+from src.indexing.vector_store import point_id
+from src.ingestion.chunk_batch import from_chunks
+from src.pipeline import arun_query_pipeline
+from src.retrieval import retriever
+from src.retrieval.retriever import retrieve_documents
+
+
+def _isolated(tmp_path, max_segments=8):
+    sparse_index._indexes.clear()
+    return patch.dict(sparse_index.config["sparse_index"], {
+        "enabled": True, "path": str(tmp_path), "k1": 1.2, "b": 0.75, "max_segments": max_segments,
+    })
+
+
+def _mode(mode):
+    return patch.dict(retriever.config["retriever"], {"mode": mode, "top_k": 3, "similarity_threshold": 0.5, "rrf_k": 60})
+
+
+def _chunk(source, index, content):
+    return {"content": content, "metadata": {"source": source, "chunk_index": index}}
+
+
+CHUNKS = [
+    _chunk("a.txt", 0, "The reranker reorders retrieved chunks by relevance."),
+    _chunk("a.txt", 1, "Error code E1234 means the collection does not exist."),
+    _chunk("b.txt", 0, "Chunks are embedded and stored in the vector store. Chunks chunks chunks."),
+]
+
+
+def _sources(hits):
+    return [(hit["payload"]["source"], hit["payload"]["chunk_index"]) for hit in hits]
+
+
+def test_bm25_ranks_rare_terms_and_returns_payloads(tmp_path):
+    with _isolated(tmp_path):
+        sparse_index.add_documents(from_chunks(CHUNKS))
+        hits = sparse_index.search("what does e1234 mean", 5)
+        assert _sources(hits) == [("a.txt", 1)]
+        assert hits[0]["payload"]["content"].startswith("Error code E1234")
+        assert _sources(sparse_index.search("chunks", 5))[0] == ("b.txt", 0)
+        assert sparse_index.search("nothing matches here", 5) == []
+
+def test_incremental_adds_deletes_and_merges(tmp_path):
+    with _isolated(tmp_path, max_segments=2):
+        for chunk in CHUNKS:
+            sparse_index.add_documents(from_chunks([chunk]))
+        # three same-sized segments are one too many for their tier; the replaced postings are dropped
+        sparse_index.add_documents(from_chunks([CHUNKS[2]]))
+        stats = sparse_index.get_sparse_index_stats()
+        assert (stats["segments"], stats["postings"]) == (2, 7 + 9 + 9)
+
+        sparse_index.delete_sources(["a.txt"])
+        assert _sources(sparse_index.search("reranker e1234 chunks", 5)) == [("b.txt", 0)]
+        assert sparse_index.indexed_sources(["a.txt", "b.txt"]) == {"b.txt"}
+
+        # re-adding the same chunk replaces it rather than duplicating it
+        sparse_index.add_documents(from_chunks([CHUNKS[2]]))
+        assert sparse_index.get_sparse_index_stats()["documents"] == 1
+
+def test_merges_only_similar_sized_segments(tmp_path):
+    with _isolated(tmp_path, max_segments=2):
+        sparse_index.add_documents(from_chunks([_chunk("big.txt", i, f"term{i}") for i in range(27)]))
+        big = sparse_index._get_index()["segments"][0]["number"]
+        for i in range(26):
+            sparse_index.add_documents(from_chunks([_chunk("small.txt", i, f"small{i}")]))
+            numbers = [segment["number"] for segment in sparse_index._get_index()["segments"]]
+            assert big in numbers
+        # 26 single-posting adds leave two segments each of 9, 3 and 1 postings beside the untouched one
+        sizes = sorted(len(segment["docs"]) for segment in sparse_index._get_index()["segments"])
+        assert sizes == [1, 1, 3, 3, 9, 9, 27]
+        sparse_index.add_documents(from_chunks([_chunk("small.txt", 26, "small26")]))
+        assert sparse_index.get_sparse_index_stats()["segments"] == 2
+        assert len(sparse_index.search("small7", 5)) == 1
+
+def test_index_survives_restart(tmp_path):
+    with _isolated(tmp_path):
+        sparse_index.add_documents(from_chunks(CHUNKS[:2]))
+        sparse_index.add_documents(from_chunks(CHUNKS[2:]))
+        sparse_index.delete_sources(["b.txt"])
+        sparse_index._indexes.clear()
+        assert _sources(sparse_index.search("chunks reranker", 5)) == [("a.txt", 0)]
+        sparse_index.add_documents(from_chunks(CHUNKS[2:]))
+        assert len(sparse_index.search("chunks", 5)) == 2
+
+def test_filtered_search_ranks_only_matching_chunks(tmp_path):
+    with _isolated(tmp_path):
+        sparse_index.add_documents(from_chunks(CHUNKS))
+        unfiltered = {hit["id"]: hit["score"] for hit in sparse_index.search("reranker chunks", 5)}
+        hits = sparse_index.search("reranker chunks", 5, {"sources": ["a.txt"]}, ["source", "chunk_index"])
+        assert _sources(hits) == [("a.txt", 0)]
+        assert hits[0]["payload"] == {"source": "a.txt", "chunk_index": 0}
+        # scores don't depend on the filter
+        assert hits[0]["score"] == unfiltered[hits[0]["id"]]
+        assert sparse_index.search("reranker chunks", 5, {"file_types": ["pdf"]}) == []
+
+def test_lexical_mode_skips_embedding(tmp_path):
+    with _isolated(tmp_path), _mode("lexical"), patch("src.retrieval.retriever.embed_query", side_effect=RuntimeError("api down")):
+        sparse_index.add_documents(from_chunks(CHUNKS))
+        docs = retrieve_documents("E1234")
+    assert [doc["metadata"]["source"] for doc in docs] == ["a.txt"]
+
+def test_hybrid_mode_fuses_dense_and_lexical_results(tmp_path):
+    dense_hits = [
+        {"id": point_id(CHUNKS[2]), "score": 0.9, "payload": {"content": CHUNKS[2]["content"], **CHUNKS[2]["metadata"]}},
+        {"id": point_id(CHUNKS[0]), "score": 0.8, "payload": {"content": CHUNKS[0]["content"], **CHUNKS[0]["metadata"]}},
+    ]
+    with _isolated(tmp_path), _mode("hybrid"), patch("src.retrieval.retriever.search_vectors", return_value=dense_hits):
+        sparse_index.add_documents(from_chunks(CHUNKS))
+        docs = retrieve_documents("reranker chunks", query_embedding=[0.1, 0.2])
+
+    # both chunks found by both retrievers come first; the lexical-only match is still included
+    assert [doc["id"] for doc in docs[:2]] == [hit["id"] for hit in dense_hits]
+    assert docs[0]["score"] == 1 / 61 + 1 / 62
+    assert len({doc["id"] for doc in docs}) == len(docs)
+
+def test_query_pipeline_in_lexical_mode_makes_no_embedding_call(tmp_path):
+    response = {"answer": "E1234 means the collection is missing.", "sources": ["a.txt"], "model": "test-model"}
+    with _isolated(tmp_path), _mode("lexical"), \
+         patch("src.pipeline.aembed_query", side_effect=RuntimeError("api down")) as embed, \
+         patch("src.pipeline.arerank_documents", side_effect=lambda query, docs: docs), \
+         patch("src.pipeline.agenerate_response", return_value=response):
+        sparse_index.add_documents(from_chunks(CHUNKS))
+        result = asyncio.run(arun_query_pipeline("What does error E1234 mean?"))
+    assert result == response
+    embed.assert_not_called()
+
+def test_deleting_more_sources_than_sqlite_parameters(tmp_path):
+    chunks = [_chunk(f"doc{i}.txt", 0, f"chunk number {i}") for i in range(1200)]
+    with _isolated(tmp_path):
+        sparse_index.add_documents(from_chunks(chunks))
+        # SQLite's bound-parameter limit before 3.32
+        sparse_index._get_index()["db"].setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        sparse_index.delete_sources([f"doc{i}.txt" for i in range(1200)])
+        assert sparse_index.get_sparse_index_stats()["documents"] == 0
+        assert sparse_index.search("chunk number", 5) == []
+
+def test_adding_more_chunks_than_sqlite_parameters(tmp_path):
+    chunks = [_chunk(f"doc{i}.txt", 0, f"chunk number {i}") for i in range(1200)]
+    with _isolated(tmp_path):
+        sparse_index._get_index()["db"].setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        sparse_index.add_documents(from_chunks(chunks))
+        sparse_index.add_documents(from_chunks(chunks))
+        assert sparse_index.get_sparse_index_stats()["documents"] == 1200
+
+def test_async_lexical_retrieval_runs_off_the_event_loop(tmp_path):
+    threads = []
+
+    def search(*args):
+        threads.append(threading.get_ident())
+        return []
+
+    with _isolated(tmp_path), _mode("lexical"), patch("src.retrieval.retriever.sparse_index.search", side_effect=search):
+        asyncio.run(retriever.aretrieve_documents("E1234"))
+        asyncio.run(retriever.aretrieve_documents_batch(["E1234", "reranker"], [None, None]))
+    assert len(threads) == 3 and threading.get_ident() not in threads
@@ -0,0 +1,31 @@
+import asyncio
+from unittest.mock import patch
+from benchmarks.startup_time import measure_startup
+from src.config_loader import get_config, reload_config
+
+
+def test_api_startup_does_not_load_heavy_dependencies():
+    report = measure_startup("api.main", runs=1)
+    assert report["heavy_modules_loaded"] == []
+
+def test_config_loaded_once():
+    assert get_config() is get_config()
+
+def test_reload_config_updates_shared_object():
+    config = get_config()
+    config["retriever"]["top_k"] = -1
+    reloaded = reload_config()
+    assert reloaded is config
+    assert config["retriever"]["top_k"] != -1
+
+def test_lifespan_builds_clients_only_when_warm_up_is_configured():
+    from api import main
+
+    async def start_and_stop():
+        async with main.app.router.lifespan_context(main.app):
+            pass
+
+    for warm_up in (False, True):
+        with patch.dict(main.config["clients"], {"warm_up": warm_up}), patch("api.main.init_clients") as init:
+            asyncio.run(start_and_stop())
+        assert init.called is warm_up
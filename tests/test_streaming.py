@@ -0,0 +1,65 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from src.ingestion.streaming import iter_chunk_batches, run_in_background
+from src.ingestion.chunk_batch import chunk_count, chunk_texts
+
+
+def _fake_load(file_paths, loader):
+    # one document per file, already split into three chunks by the parse worker
+    for file_path in file_paths:
+        if file_path.startswith("broken"):
+            yield file_path, [], ValueError("corrupt PDF")
+        else:
+            content = f"text of {file_path}"
+            yield file_path, [({"source": file_path}, content, [(0, 4), (0, 7), (5, len(content))])], None
+
+
+def test_batches_are_bounded_and_mark_finished_files():
+    with patch("src.ingestion.streaming.iter_loaded_files", _fake_load):
+        batches = list(iter_chunk_batches(["a.txt", "broken.pdf", "b.txt"], batch_size=4))
+    assert [chunk_count(b["chunks"]) for b in batches] == [4, 2]
+    assert batches[0]["chunks"]["chunk_index"].tolist() == [0, 1, 2, 0]
+    assert chunk_texts(batches[0]["chunks"]) == ["text", "text of", "of a.txt", "text"]
+    # metadata is stored once per document, not per chunk
+    assert [doc["source"] for doc in batches[0]["chunks"]["documents"]] == ["a.txt", "b.txt"]
+    assert batches[0]["files"] == ["a.txt"]
+    assert batches[1]["files"] == ["b.txt"]
+    assert sum(b["documents"] for b in batches) == 2
+    assert batches[0]["failed"] == ["broken.pdf"]
+
+def test_background_stage_preserves_order():
+    assert list(run_in_background(iter(range(50)), max_queued=2)) == list(range(50))
+
+def test_background_stage_applies_backpressure():
+    produced = []
+
+    def producer():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    stage = run_in_background(producer(), max_queued=2)
+    assert next(stage) == 0
+    time.sleep(0.2)
+    # one item handed to the consumer, two queued, one blocked on put
+    assert len(produced) <= 4
+    stage.close()
+
+def test_background_stage_reraises_worker_errors():
+    def failing():
+        yield 1
+        raise ValueError("embedding API down")
+
+    stage = run_in_background(failing(), max_queued=2)
+    assert next(stage) == 1
+    with pytest.raises(ValueError):
+        next(stage)
+
+def test_closing_consumer_stops_worker():
+    before = threading.active_count()
+    stage = run_in_background(iter(range(1000)), max_queued=1)
+    next(stage)
+    stage.close()
+    assert threading.active_count() == before
@@ -1,3 +1,5 @@
+import json
+import time
 import streamlit as st
 import requests
 import pandas as pd
@@ -53,25 +55,41 @@ with query_tab:
         if not query.strip():
             st.error("Please enter a question.")
         else:
-            with st.spinner("Generating answer..."):
-                try:
-                    response = requests.post(f"{API_URL}/query", json={"query": query})
-                    if response.status_code == 200:
-                        result = response.json()
-                        st.success("Answer generated!")
-
-                        st.markdown("### Answer")
-                        st.write(result["answer"])
-
-                        st.markdown("### Sources")
-                        for source in result["sources"]:
-                            st.markdown(f"- `{source}`")
-
-                        st.caption(f"Model: {result['model']}")
-                    else:
+            try:
+                # Stream server-sent events: sources arrive after reranking, then the answer token by token
+                with requests.post(f"{API_URL}/query/stream", json={"query": query}, stream=True) as response:
+                    if response.status_code != 200:
                         st.error(f"Query failed: {response.json().get('detail', 'Unknown error')}")
-                except requests.exceptions.ConnectionError:
-                    st.error("Could not connect to the API. Make sure the FastAPI server is running on port 8000.")
+                    else:
+                        sources_placeholder = st.empty()
+                        st.markdown("### Answer")
+                        answer_placeholder = st.empty()
+                        answer_placeholder.caption("Retrieving documents...")
+                        answer = ""
+                        event = None
+
+                        for line in response.iter_lines(decode_unicode=True):
+                            if line.startswith("event: "):
+                                event = line[len("event: "):]
+                                continue
+                            if not line.startswith("data: "):
+                                continue
+                            data = json.loads(line[len("data: "):])
+
+                            if event == "sources":
+                                sources_md = "### Sources\n" + "\n".join(f"- `{source}`" for source in data["sources"])
+                                sources_placeholder.markdown(sources_md)
+                            elif event == "token":
+                                answer += data["text"]
+                                answer_placeholder.write(answer)
+                            elif event == "done":
+                                if not data["valid"]:
+                                    st.warning(data["reason"])
+                                st.caption(f"Model: {data['model']}")
+                            elif event == "error":
+                                st.error(f"Query failed: {data['detail']}")
+            except requests.exceptions.ConnectionError:
+                st.error("Could not connect to the API. Make sure the FastAPI server is running on port 8000.")
 
 
 # ─────────────────────────────────────────────
@@ -101,13 +119,18 @@ with evaluate_tab:
         else:
             with st.spinner(f"Running RAGAS evaluation on {len(valid_samples)} sample(s)..."):
                 try:
+                    # evaluation runs as a background job on the API; poll it until it finishes
                     response = requests.post(f"{API_URL}/evaluate", json={"eval_dataset": valid_samples})
-                    if response.status_code == 200:
-                        result = response.json()
+                    job = response.json()
+                    while response.status_code in (200, 202) and job["status"] == "running":
+                        time.sleep(2)
+                        response = requests.get(f"{API_URL}/evaluate/{job['job_id']}")
+                        job = response.json()
+                    if response.status_code in (200, 202) and job["status"] == "success":
                         st.success("Evaluation complete!")
                         st.markdown("### RAGAS Scores")
-                        st.json(result["results"])
+                        st.json(job["results"])
                     else:
-                        st.error(f"Evaluation failed: {response.json().get('detail', 'Unknown error')}")
+                        st.error(f"Evaluation failed: {job.get('detail', job.get('status', 'Unknown error'))}")
                 except requests.exceptions.ConnectionError:
                     st.error("Could not connect to the API. Make sure the FastAPI server is running on port 8000.")